@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Análisis por lotes de fotos y videos (relevamientos con dron, grabaciones).
+
+    python analyze_batch.py vuelo_01/ grabacion.mp4 -o vuelo_01.jsonl --every 5
+    python analyze_batch.py vuelo_01/ -o vuelo_01.parquet --workers 4
+
+Si se interrumpe, volver a correr el mismo comando continúa desde el
+último checkpoint.
+"""
+import argparse
+import logging
+import os
+from functools import partial
+
+from config import Config
+from dipia.batch import CheckpointMismatch, jsonl_to_parquet, load_detector, run
+from dipia.engine import find_model_path
+from dipia.log import setup_logging, shutdown_logging
+
+log = logging.getLogger("dipia.batch")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Análisis por lotes de fotos y videos con el detector de DIPIA")
+    parser.add_argument("paths", nargs="+", help="archivos o carpetas (fotos y videos)")
+    parser.add_argument("-o", "--output", required=True, help="archivo de salida (.jsonl o .parquet)")
+    parser.add_argument("--format", choices=("jsonl", "parquet"), default=None,
+                        help="por defecto según la extensión de --output")
+    parser.add_argument("--model", default=Config.DETECTOR_MODEL)
+    parser.add_argument("--conf", type=float, default=None, help="confianza mínima")
+    parser.add_argument("--language", default="es", choices=("es", "en"))
+    parser.add_argument("--backend", default=Config.INFERENCE_BACKEND,
+                        choices=("auto", "torch", "onnx", "openvino"),
+                        help="backend de inferencia (ver export_models.py)")
+    parser.add_argument("--int8", action="store_true", default=Config.INFERENCE_INT8,
+                        help="preferir los exportados INT8")
+    parser.add_argument("--every", type=int, default=1, help="analizar 1 de cada k frames de video")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="procesos (0 = en el proceso actual)")
+    parser.add_argument("--threads", type=int, default=Config.TORCH_THREADS,
+                        help="hilos de PyTorch por proceso (0 = núcleos / workers)")
+    parser.add_argument("--pin-cores", action="store_true", default=Config.PIN_CORES,
+                        help="fijar cada proceso a su propio grupo de núcleos (Linux)")
+    parser.add_argument("--batch-size", type=int, default=Config.BATCH_MAX_SIZE)
+    parser.add_argument("--decode-size", type=int, default=Config.INGEST_DECODE_SIZE,
+                        help="lado mayor mínimo al decodificar fotos reducidas (0 = completas)")
+    parser.add_argument("--checkpoint", default=None, help="por defecto <salida>.checkpoint")
+    parser.add_argument("--restart", action="store_true", help="ignorar el checkpoint y empezar de cero")
+    args = parser.parse_args(argv)
+
+    setup_logging(Config.LOG_LEVEL, Config.LOG_JSON, Config.LOG_FRAME_SAMPLE)
+
+    output_format = args.format or ("parquet" if args.output.endswith(".parquet") else "jsonl")
+    if output_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("la salida Parquet requiere pyarrow (pip install pyarrow)")
+    model_path = find_model_path(args.model)
+    if model_path is None:
+        parser.error(f"modelo {args.model} no encontrado")
+    # Las detecciones siempre se escriben primero en JSONL (reanudable)
+    jsonl_path = args.output if output_format == "jsonl" else f"{args.output}.jsonl"
+
+    try:
+        summary = run(
+            args.paths, jsonl_path,
+            partial(load_detector, args.model, args.conf, args.language, args.backend, args.int8),
+            workers=args.workers, every=args.every, batch_size=args.batch_size,
+            decode_size=args.decode_size, threads=args.threads, pin_cores=args.pin_cores,
+            checkpoint=args.checkpoint or f"{args.output}.checkpoint", restart=args.restart,
+            detector_params={"model": os.path.abspath(model_path), "conf": args.conf,
+                             "language": args.language, "backend": args.backend, "int8": args.int8},
+        )
+    except CheckpointMismatch as e:
+        parser.error(str(e))
+
+    if output_format == "parquet":
+        jsonl_to_parquet(jsonl_path, args.output)
+    log.info("Listo: %d frames en %.1f s (%.1f frames/s), %d detecciones → %s",
+             summary["frames"], summary["seconds"], summary["fps"], summary["detections"], args.output)
+    return summary
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutdown_logging()
@@ -1,9 +1,38 @@
-from flask import Flask, render_template, request, jsonify, Response, session
+from flask import Flask, render_template, request, jsonify, Response, session, g, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
+import atexit
 import sqlite3
 import time
 import hashlib
 import os
+import threading
+import logging
+
+from config import Config
+from dipia.db import SQLitePool
+from dipia.migrations import migrate, current_version
+from dipia.search import recommend_materials
+from dipia.materials import MAX_LIMIT, decode_cursor, list_materials, parse_fields
+from dipia.engine import registry, Detector, MicroBatcher, QueueFullError, TiledDetector
+from dipia import serving, threads
+from dipia.log import REQUEST_ID_HEADER, new_id, request_id_var, setup_logging
+from dipia.stream import DetectionBroadcaster, HubRelay, TooManySubscribers, sse_events
+from dipia.hub import DetectionHub
+from dipia.cache import ResultCache, model_fingerprint, result_key
+from dipia.ingest import ImageRejected, decode_image, read_upload
+from dipia.history import (
+    BUCKETS, SHARED_USER, DetectionRecorder, bucket_counts, confidence_histogram,
+    label_trends, rows_from_batch
+)
+
+setup_logging(Config.LOG_LEVEL, Config.LOG_JSON, Config.LOG_FRAME_SAMPLE)
+log = logging.getLogger("dipia.app")
+# Hilos de PyTorch/OpenCV repartidos entre los workers de la máquina (antes de cargar modelos)
+threads.configure(
+    Config.INFER_WORKERS, 0, Config.TORCH_THREADS, Config.TORCH_INTEROP_THREADS,
+    Config.OPENCV_THREADS, Config.PIN_CORES
+)
 
 app = Flask(__name__)
 CORS(app)
@@ -12,85 +41,229 @@ app.secret_key = 'dipia_secret_key_2025'  # Necesario para sessions
 # Configuración
 DATABASE = 'dipia.db'
 
-# Variable global para almacenar detecciones (solo para recibir de la app de escritorio)
-latest_detections = None
+# Límites de las imágenes subidas para análisis
+MAX_UPLOAD_BYTES = int(Config.INGEST_MAX_MB * 1024 * 1024)
+MAX_UPLOAD_PIXELS = int(Config.INGEST_MAX_MEGAPIXELS * 1_000_000)
+# Werkzeug corta la petición antes de leerla entera (margen para el resto del formulario)
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
+
+# Pool de conexiones SQLite (WAL), compartido por todas las peticiones
+db_pool = None
+_db_pool_lock = threading.Lock()
+
+# Nombre del detector en el registro de modelos del proceso
+DETECTOR = 'detector'
+# ONNX Runtime / OpenVINO si hay un exportado del modelo (export_models.py)
+registry.configure(Config.INFERENCE_BACKEND, Config.INFERENCE_INT8)
+
+# Cola de micro-batching delante del detector (se crea al primer uso)
+detector_batcher = None
+detector_version = None
+# Mismo modelo por mosaicos, para fotos de alta resolución (?tiled=1)
+tiled_detector = None
+tiled_batcher = None
+_batcher_lock = threading.Lock()
+
+# Resultados de imágenes ya analizadas (misma foto, mismo modelo y umbral)
+result_cache = ResultCache(
+    max_bytes=int(Config.RESULT_CACHE_MB * 1024 * 1024),
+    path=Config.RESULT_CACHE_PATH or None,
+    max_disk_bytes=int(Config.RESULT_CACHE_DISK_MB * 1024 * 1024)
+)
+
+# Últimos lotes de detecciones por dispositivo y cámara (de la app de escritorio)
+detection_hub = DetectionHub.from_config(
+    Config.HUB_BACKEND,
+    capacity=Config.HUB_CAPACITY,
+    path=Config.HUB_DATABASE
+)
+
+# Historial de detecciones (escrituras por lotes en segundo plano)
+detection_recorder = None
+_recorder_lock = threading.Lock()
+
+# Difusión en vivo de las detecciones recibidas a los visores (SSE)
+detection_stream = DetectionBroadcaster(
+    queue_size=Config.STREAM_QUEUE_SIZE,
+    max_subscribers=Config.STREAM_MAX_SUBSCRIBERS,
+    min_interval=Config.STREAM_MIN_INTERVAL_MS / 1000
+)
+# Con el concentrador sqlite (varios workers) los visores reciben los lotes
+# desde el concentrador, así les llegan los de cualquier worker
+RELAY_FROM_HUB = Config.HUB_BACKEND == "sqlite"
+stream_relay = None
+_relay_lock = threading.Lock()
+
+def get_db_pool():
+    """Obtener el pool de conexiones, creándolo la primera vez"""
+    global db_pool
+    if db_pool is None or db_pool.path != DATABASE:
+        with _db_pool_lock:
+            if db_pool is None or db_pool.path != DATABASE:
+                db_pool = SQLitePool(
+                    DATABASE,
+                    size=Config.DB_POOL_SIZE,
+                    busy_timeout_ms=Config.DB_BUSY_TIMEOUT_MS,
+                    wal=Config.DB_WAL,
+                    acquire_timeout_ms=Config.DB_POOL_TIMEOUT_MS
+                )
+    return db_pool
+
+def get_db():
+    """Conexión del pool para la petición actual (se devuelve al terminar)"""
+    if 'db' not in g:
+        g.db = get_db_pool().acquire()
+    return g.db
+
+@app.teardown_appcontext
+def release_db(exception):
+    """Devolver la conexión de la petición al pool"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_db_pool().release(conn)
+
+@app.before_request
+def bind_request_id():
+    """ID de correlación de la petición (el del cliente si lo envía)"""
+    g.request_id = request.headers.get(REQUEST_ID_HEADER) or new_id()
+    g.request_id_token = request_id_var.set(g.request_id)
+
+@app.after_request
+def add_request_id(response):
+    """Devolver el ID de correlación al cliente"""
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+@app.teardown_request
+def unbind_request_id(exception):
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        request_id_var.reset(token)
+
+def get_detection_recorder():
+    """Escritor del historial de detecciones, creado y arrancado la primera vez"""
+    global detection_recorder
+    if detection_recorder is None or detection_recorder.pool is not get_db_pool():
+        with _recorder_lock:
+            if detection_recorder is None or detection_recorder.pool is not get_db_pool():
+                detection_recorder = DetectionRecorder(
+                    get_db_pool(),
+                    batch_size=Config.HISTORY_BATCH_SIZE,
+                    flush_interval=Config.HISTORY_FLUSH_INTERVAL
+                ).start()
+    return detection_recorder
+
+def get_stream_relay():
+    """Lector del concentrador para los visores de este proceso, arrancado la primera vez"""
+    global stream_relay
+    if stream_relay is None:
+        with _relay_lock:
+            if stream_relay is None:
+                stream_relay = HubRelay(
+                    detection_hub, detection_stream, Config.STREAM_POLL_MS / 1000
+                ).start()
+    return stream_relay
 
 def init_database():
-    """Inicializar la base de datos"""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    
-    # Crear tabla de usuarios
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            full_name TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Verificar si la columna full_name existe, si no, agregarla
-    cursor.execute("PRAGMA table_info(users)")
-    columns = [column[1] for column in cursor.fetchall()]
+    """Inicializar la base de datos (aplicar migraciones pendientes)"""
+    with get_db_pool().connection() as conn:
+        applied = migrate(conn)
+        version = current_version(conn)
     
-    if 'full_name' not in columns:
-        print("Agregando columna full_name a la tabla users...")
-        cursor.execute("ALTER TABLE users ADD COLUMN full_name TEXT")
-    
-    # Verificar si la tabla materials existe y tiene las columnas correctas
-    try:
-        cursor.execute("PRAGMA table_info(materials)")
-        material_columns = [column[1] for column in cursor.fetchall()]
-    except:
-        material_columns = []
-    
-    print(f"🔍 Columnas actuales en materials: {material_columns}")
-    
-    # Si la tabla no existe, la creamos con todas las columnas
-    if not material_columns:
-        print("🔄 Creando tabla materials con todas las columnas...")
-        cursor.execute('''
-            CREATE TABLE materials (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                supplier TEXT NOT NULL,
-                price REAL NOT NULL,
-                unit TEXT NOT NULL,
-                category TEXT DEFAULT 'General',
-                pathology_related TEXT DEFAULT '',
-                image_url TEXT DEFAULT '',
-                is_favorite INTEGER DEFAULT 0,
-                usage_count INTEGER DEFAULT 0,
-                user_id INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        print("✅ Tabla materials creada con todas las columnas")
-    else:
-        # Si existe, agregar columnas nuevas si no existen
-        if 'category' not in material_columns:
-            print("➕ Agregando columna category...")
-            cursor.execute("ALTER TABLE materials ADD COLUMN category TEXT DEFAULT 'General'")
-        if 'pathology_related' not in material_columns:
-            print("➕ Agregando columna pathology_related...")
-            cursor.execute("ALTER TABLE materials ADD COLUMN pathology_related TEXT DEFAULT ''")
-        if 'image_url' not in material_columns:
-            print("➕ Agregando columna image_url...")
-            cursor.execute("ALTER TABLE materials ADD COLUMN image_url TEXT DEFAULT ''")
-        if 'is_favorite' not in material_columns:
-            print("➕ Agregando columna is_favorite...")
-            cursor.execute("ALTER TABLE materials ADD COLUMN is_favorite INTEGER DEFAULT 0")
-        if 'usage_count' not in material_columns:
-            print("➕ Agregando columna usage_count...")
-            cursor.execute("ALTER TABLE materials ADD COLUMN usage_count INTEGER DEFAULT 0")
-    
-    conn.commit()
-    conn.close()
-    print("✅ Base de datos inicializada")
+    if applied:
+        print(f"🔄 Migraciones aplicadas: {applied}")
+    print(f"✅ Base de datos inicializada (esquema v{version})")
+
+def preload(fork=False):
+    """Inicializar la base de datos y precargar el detector antes de aceptar peticiones
+
+    Con `fork` (maestro de serve.py) solo se cargan los pesos de PyTorch,
+    sin calentar: los workers los heredan copy-on-write. Las sesiones de
+    ONNX Runtime/OpenVINO, la primera inferencia y los hilos del batcher
+    no sobreviven a un fork y se crean en cada worker (`after_fork`).
+    """
+    init_database()
+    if not Config.PRELOAD_MODELS:
+        return
+    if fork:
+        resolved = registry.resolve(DETECTOR, Config.DETECTOR_MODEL)
+        if resolved and resolved[1] == "torch" and registry.preload(DETECTOR, Config.DETECTOR_MODEL, warmup=False):
+            print(f"🧠 Pesos del detector compartidos entre los workers: {resolved[0]}")
+    elif registry.preload(DETECTOR, Config.DETECTOR_MODEL):
+        get_detector_batcher()
+        print(f"🧠 Modelo de IA precargado: {registry.stats()['models'][DETECTOR]}")
+
+def before_fork():
+    """Cerrar las conexiones SQLite del maestro (cada worker abre las suyas)"""
+    serving.close_pools(db_pool, result_cache.pool, getattr(detection_hub.backend, "pool", None))
+
+def after_fork(request_threads=None):
+    """En cada worker: cargar lo que falte, calentar el detector y arrancar el batcher
+
+    Cada visor SSE ocupa uno de los `request_threads` hilos del worker
+    mientras está conectado: se admiten como máximo la mitad, así login,
+    análisis y recepción de detecciones siempre tienen hilos libres.
+    """
+    if request_threads:
+        detection_stream.max_subscribers = min(Config.STREAM_MAX_SUBSCRIBERS, max(1, request_threads // 2))
+    if Config.PRELOAD_MODELS and registry.preload(DETECTOR, Config.DETECTOR_MODEL):
+        get_detector_batcher()
+
+def before_exit():
+    """Al terminar el proceso: detener los batchers y el relay, y escribir el historial pendiente"""
+    for worker in (stream_relay, detector_batcher, tiled_batcher):
+        if worker is not None:
+            worker.stop()
+    if detection_recorder is not None:
+        written = detection_recorder.stop()
+        if written:
+            log.info("Historial pendiente guardado al salir", extra={"rows": written})
+
+def worker_stats():
+    """Métricas propias de la app para /health/workers"""
+    return {
+        "batching": detector_batcher.stats() if detector_batcher else None,
+        "result_cache": result_cache.stats(),
+        "stream_subscribers": detection_stream.stats()["subscribers"],
+    }
+
+def get_detector_batcher(tiled=False):
+    """Obtener el batcher del detector (o el de mosaicos), cargando el modelo si hace falta"""
+    global detector_batcher, detector_version, tiled_detector, tiled_batcher
+    if detector_batcher is None:
+        with _batcher_lock:
+            if detector_batcher is None:
+                detector = Detector.from_registry(DETECTOR, Config.DETECTOR_MODEL, language="es")
+                detector_version = model_fingerprint(registry.stats()["models"][DETECTOR]["path"])
+                tiled_detector = TiledDetector(
+                    detector,
+                    tile_size=Config.TILE_SIZE,
+                    overlap=Config.TILE_OVERLAP,
+                    max_tiles=Config.TILE_MAX,
+                    iou_threshold=Config.TILE_NMS_IOU,
+                    include_full=Config.TILE_INCLUDE_FULL
+                )
+                # Cada imagen ya es un lote de ventanas: se infiere de a una
+                tiled_batcher = MicroBatcher(
+                    tiled_detector.predict_batch,
+                    max_batch_size=1,
+                    max_queue=Config.BATCH_MAX_QUEUE,
+                    name=f"{DETECTOR}-tiled"
+                )
+                detector_batcher = MicroBatcher(
+                    detector.predict_batch,
+                    max_batch_size=Config.BATCH_MAX_SIZE,
+                    max_wait_ms=Config.BATCH_MAX_WAIT_MS,
+                    max_queue=Config.BATCH_MAX_QUEUE,
+                    name=DETECTOR
+                )
+    return tiled_batcher if tiled else detector_batcher
+
+def is_enabled(value):
+    """Interpretar un parámetro booleano de formulario o query string"""
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'on')
 
 def hash_password(password):
     """Hashear contraseña"""
@@ -123,9 +296,23 @@ def health():
     return jsonify({
         "status": "ok",
         "timestamp": time.time(),
-        "message": "Servidor Flask funcionando correctamente"
+        "message": "Servidor Flask funcionando correctamente",
+        "ai": registry.stats(),
+        "threads": threads.settings(),
+        "batching": detector_batcher.stats() if detector_batcher else None,
+        "batching_tiled": tiled_batcher.stats() if tiled_batcher else None,
+        "database": db_pool.stats() if db_pool else None,
+        "stream": detection_stream.stats(),
+        "detection_streams": len(detection_hub.stats()["streams"]),
+        "history": detection_recorder.stats() if detection_recorder else None,
+        "result_cache": result_cache.stats()
     })
 
+@app.route('/health/workers')
+def health_workers():
+    """Métricas de cada worker del servidor de producción (serve.py)"""
+    return jsonify(serving.workers_report())
+
 @app.route('/register', methods=['POST'])
 def register():
     """Registrar nuevo usuario"""
@@ -140,12 +327,11 @@ def register():
             return jsonify({"success": False, "error": "Todos los campos son requeridos"}), 400
         
         # Verificar si el usuario ya existe
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute("SELECT id FROM users WHERE username = ? OR email = ?", (username, email))
         if cursor.fetchone():
-            conn.close()
             return jsonify({"success": False, "error": "Usuario o email ya existe"}), 400
         
         # Crear usuario
@@ -156,7 +342,6 @@ def register():
         )
         
         conn.commit()
-        conn.close()
         
         return jsonify({"success": True, "message": "Usuario registrado exitosamente"})
     
@@ -174,7 +359,7 @@ def login():
         if not username or not password:
             return jsonify({"success": False, "error": "Username y password son requeridos"}), 400
         
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute("SELECT id, password_hash FROM users WHERE username = ?", (username,))
@@ -182,10 +367,8 @@ def login():
         
         if user and verify_password(password, user[1]):
             session['user_id'] = user[0]
-            conn.close()
             return jsonify({"success": True, "message": "Login exitoso"})
         else:
-            conn.close()
             return jsonify({"success": False, "error": "Credenciales inválidas"}), 401
     
     except Exception as e:
@@ -199,77 +382,70 @@ def logout():
 
 @app.route('/materials', methods=['GET'])
 def get_materials():
-    """Obtener materiales del usuario"""
+    """Obtener materiales del usuario (paginados por cursor)
+    
+    Parámetros opcionales: limit, cursor, category, favorite, min_price,
+    max_price y fields (lista separada por comas). Responde 304 si el
+    cliente ya tiene la misma página (If-None-Match).
+    """
     user_id = session.get('user_id')
-    print(f"🔍 GET /materials - User ID: {user_id}")
+    log.debug("GET /materials", extra={"user_id": user_id})
     
     if not user_id:
-        print("❌ Usuario no autenticado")
+        log.info("GET /materials sin autenticar")
         return jsonify({"success": False, "error": "No autenticado"}), 401
     
+    args = request.args
     try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        
-        # Obtener nombres de columnas para mapeo correcto
-        cursor.execute("PRAGMA table_info(materials)")
-        columns_info = cursor.fetchall()
-        column_names = [col[1] for col in columns_info]
-        print(f"🔍 Columnas en materials: {column_names}")
-        
-        # Construir SELECT con nombres explícitos para evitar problemas de orden
-        cursor.execute("""
-            SELECT id, name, supplier, price, unit, category, pathology_related, 
-                   image_url, is_favorite, usage_count, user_id, created_at 
-            FROM materials 
-            WHERE user_id = ? 
-            ORDER BY created_at DESC
-        """, (user_id,))
-        materials = cursor.fetchall()
-        
-        conn.close()
-        
-        materials_list = []
-        for material in materials:
-            material_dict = {
-                "id": material[0],
-                "name": material[1],
-                "supplier": material[2],
-                "price": material[3],
-                "unit": material[4],
-                "category": material[5] if material[5] else 'General',
-                "pathology_related": material[6] if material[6] else '',
-                "image_url": material[7] if material[7] else '',
-                "is_favorite": bool(material[8]) if material[8] is not None else False,
-                "usage_count": material[9] if material[9] is not None else 0,
-                "created_at": material[11] if len(material) > 11 else None
-            }
-            materials_list.append(material_dict)
-            # Debug: imprimir materiales de categoría Impermeabilización
-            if material_dict['category'] == 'Impermeabilización':
-                print(f"🔍 Material Impermeabilización encontrado: {material_dict['name']}, image_url: {material_dict['image_url']}")
+        limit = args.get('limit', type=int)
+        if limit is not None and not 1 <= limit <= MAX_LIMIT:
+            raise ValueError(f"limit debe estar entre 1 y {MAX_LIMIT}")
+        favorite = args.get('favorite')
+        if favorite is not None:
+            favorite = favorite.lower() in ('1', 'true', 'yes')
+        filters = {
+            "limit": limit,
+            "cursor": args.get('cursor') or None,
+            "category": args.get('category') or None,
+            "favorite": favorite,
+            "min_price": args.get('min_price', type=float),
+            "max_price": args.get('max_price', type=float),
+            "fields": parse_fields(args.get('fields')),
+        }
+        if filters["cursor"]:
+            decode_cursor(filters["cursor"])
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    try:
+        materials_list, next_cursor = list_materials(get_db(), user_id, **filters)
         
-        print(f"✅ Materiales encontrados: {len(materials_list)}")
-        print(f"🔍 Categorías presentes: {set(m['category'] for m in materials_list)}")
-        return jsonify({"success": True, "materials": materials_list})
+        response = jsonify({
+            "success": True,
+            "materials": materials_list,
+            "next_cursor": next_cursor
+        })
+        # ETag del contenido: si no cambió, el navegador recibe 304 sin cuerpo
+        response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
     
     except Exception as e:
-        print(f"❌ Error al obtener materiales: {e}")
+        log.exception("Error al obtener materiales")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/materials', methods=['POST'])
 def add_material():
     """Agregar nuevo material"""
     user_id = session.get('user_id')
-    print(f"🔍 POST /materials - User ID: {user_id}")
+    log.debug("POST /materials", extra={"user_id": user_id})
     
     if not user_id:
-        print("❌ Usuario no autenticado")
+        log.info("POST /materials sin autenticar")
         return jsonify({"success": False, "error": "No autenticado"}), 401
     
     try:
         data = request.get_json()
-        print(f"�� Datos recibidos: {data}")
         
         name = data.get('name')
         supplier = data.get('supplier')
@@ -279,23 +455,19 @@ def add_material():
         pathology_related = data.get('pathology_related', '')
         image_url = data.get('image_url', '')
         
-        print(f"🔍 Campos extraídos:")
-        print(f"  - name: {name}")
-        print(f"  - supplier: {supplier}")
-        print(f"  - price: {price}")
-        print(f"  - unit: {unit}")
-        print(f"  - category: {category}")
-        print(f"  - pathology_related: {pathology_related}")
-        print(f"  - image_url: {image_url}")
+        log.debug("Material recibido", extra={
+            "user_id": user_id, "material": name, "supplier": supplier, "price": price,
+            "unit": unit, "category": category, "pathology_related": pathology_related,
+        })
         
         # Validar campos requeridos
         if not name or not supplier or not price or not unit:
-            print("❌ Faltan campos requeridos")
             missing = []
             if not name: missing.append('name')
             if not supplier: missing.append('supplier')
             if not price: missing.append('price')
             if not unit: missing.append('unit')
+            log.info("Faltan campos requeridos", extra={"missing": missing})
             return jsonify({"success": False, "error": f"Faltan campos requeridos: {', '.join(missing)}"}), 400
         
         # Validar que price sea un número válido
@@ -306,7 +478,7 @@ def add_material():
         except (ValueError, TypeError):
             return jsonify({"success": False, "error": "El precio debe ser un número válido"}), 400
         
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         
         try:
@@ -317,17 +489,15 @@ def add_material():
             
             conn.commit()
             material_id = cursor.lastrowid
-            print(f"✅ Material guardado en la base de datos: {name} (ID: {material_id})")
+            log.info("Material guardado", extra={"user_id": user_id, "material_id": material_id})
             return jsonify({"success": True, "message": "Material agregado exitosamente", "id": material_id})
         except sqlite3.Error as e:
             conn.rollback()
-            print(f"❌ Error de base de datos: {e}")
+            log.error("Error de base de datos al guardar material: %s", e)
             return jsonify({"success": False, "error": f"Error al guardar en la base de datos: {str(e)}"}), 500
-        finally:
-            conn.close()
     
     except Exception as e:
-        print(f"❌ Error al guardar material: {e}")
+        log.exception("Error al guardar material")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/materials/<int:material_id>', methods=['PUT'])
@@ -347,7 +517,7 @@ def update_material(material_id):
         pathology_related = data.get('pathology_related', '')
         image_url = data.get('image_url', '')
         
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute(
@@ -357,10 +527,8 @@ def update_material(material_id):
         
         if cursor.rowcount > 0:
             conn.commit()
-            conn.close()
             return jsonify({"success": True, "message": "Material actualizado exitosamente"})
         else:
-            conn.close()
             return jsonify({"success": False, "error": "Material no encontrado"}), 404
     
     except Exception as e:
@@ -374,17 +542,15 @@ def delete_material(material_id):
         return jsonify({"success": False, "error": "No autenticado"}), 401
     
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute("DELETE FROM materials WHERE id = ? AND user_id = ?", (material_id, user_id))
         
         if cursor.rowcount > 0:
             conn.commit()
-            conn.close()
             return jsonify({"success": True, "message": "Material eliminado exitosamente"})
         else:
-            conn.close()
             return jsonify({"success": False, "error": "Material no encontrado"}), 404
     
     except Exception as e:
@@ -398,7 +564,7 @@ def get_most_used_materials():
         return jsonify({"success": False, "error": "No autenticado"}), 401
     
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -411,7 +577,6 @@ def get_most_used_materials():
         """, (user_id,))
         
         materials = cursor.fetchall()
-        conn.close()
         
         materials_list = []
         for material in materials:
@@ -433,7 +598,7 @@ def get_recent_materials():
         return jsonify({"success": False, "error": "No autenticado"}), 401
     
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -444,7 +609,6 @@ def get_recent_materials():
         """, (user_id,))
         
         materials = cursor.fetchall()
-        conn.close()
         
         materials_list = []
         for material in materials:
@@ -470,18 +634,16 @@ def use_material(material_id):
         return jsonify({"success": False, "error": "No autenticado"}), 401
     
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         
         # Verificar que el material existe y pertenece al usuario
         cursor.execute("SELECT id FROM materials WHERE id = ? AND user_id = ?", (material_id, user_id))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({"success": False, "error": "Material no encontrado"}), 404
         
         # Aquí podrías agregar lógica para incrementar un contador de uso
         # Por ahora solo devolvemos éxito
-        conn.close()
         
         return jsonify({"success": True, "message": "Material usado exitosamente"})
     
@@ -509,63 +671,67 @@ def analyze_image():
         if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
             return jsonify({"success": False, "error": "Formato de imagen no soportado"}), 400
         
-        # Cargar modelo YOLOv8
+        # Modo por mosaicos: grietas finas en fotos de alta resolución
+        tiled = is_enabled(request.values.get('tiled'))
+        
+        # Obtener modelo YOLOv8 (se carga una sola vez por proceso)
         try:
-            from ultralytics import YOLO
-            model = YOLO("master_model.pt")
+            batcher = get_detector_batcher(tiled)
         except Exception as e:
             return jsonify({"success": False, "error": f"Error al cargar modelo: {str(e)}"}), 500
         
-        # Leer imagen
-        import cv2
-        import numpy as np
-        from PIL import Image
-        
-        # Convertir a formato OpenCV
-        image = Image.open(file.stream)
-        image_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        
-        # Realizar predicción
-        results = model.predict(image_cv, verbose=False)
-        
-        # Procesar resultados
-        detections = []
-        for result in results:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    confidence = box.conf[0].cpu().numpy()
-                    class_id = int(box.cls[0].cpu().numpy())
-                    
-                    # Mapear clases correctamente (ajustado a tu modelo .pt)
-                    # Según tu feedback: 0=Humedad, 1=Crack, 2=Persona
-                    if class_id == 0:
-                        label = "Humedad"
-                    elif class_id == 1:
-                        label = "Crack"
-                    elif class_id == 2:
-                        label = "Persona"
-                    else:
-                        label = f"Clase_{class_id}"
-                    
-                    detection = {
-                        "label": label,
-                        "confidence": float(confidence),
-                        "bbox": [int(x1), int(y1), int(x2), int(y2)],
-                        "class_id": class_id
-                    }
-                    detections.append(detection)
+        image_bytes = read_upload(file.stream, MAX_UPLOAD_BYTES)
+        
+        def analyze():
+            # Una sola decodificación a BGR, reducida si sobra resolución
+            decoded = decode_image(image_bytes, MAX_UPLOAD_PIXELS, decode_size)
+            
+            # Realizar predicción (agrupada con otras peticiones concurrentes)
+            detections = decoded.to_original(batcher.submit(decoded.image))
+            result = {
+                "detections": detections.to_list(),
+                "image_size": list(decoded.original_size)
+            }
+            if tiled:
+                result["tiles"] = len(tiled_detector.tiles(decoded.image))
+            return result
+        
+        # La misma foto con el mismo modelo no se vuelve a analizar
+        if tiled:
+            decode_size = tiled_detector.decode_size
+            key = result_key(image_bytes, "detect-tiled", detector_version, language="es",
+                             **tiled_detector.params())
+        else:
+            decode_size = Config.INGEST_DECODE_SIZE
+            key = result_key(image_bytes, "detect", detector_version, language="es", decode=decode_size)
+        try:
+            result, cached = result_cache.get_or_compute(key, analyze)
+        except QueueFullError as e:
+            return jsonify({"success": False, "error": str(e)}), 503
+        detections = result["detections"]
+        
+        # Una foto repetida (p. ej. una subida reintentada) no se vuelve a contar en el historial
+        if not cached:
+            get_detection_recorder().record(rows_from_batch(
+                {"detections": detections, "device_id": "web"}, user_id, source="analyze"
+            ))
         
         return jsonify({
             "success": True,
             "detections": detections,
-            "image_size": [image_cv.shape[1], image_cv.shape[0]],
-            "total_detections": len(detections)
+            "image_size": result["image_size"],
+            "total_detections": len(detections),
+            "mode": "tiled" if tiled else "single",
+            "tiles": result.get("tiles", 1),
+            "cached": cached
         })
     
+    except RequestEntityTooLarge:
+        return jsonify({"success": False, "error": "La imagen supera el tamaño máximo permitido"}), 413
+    except ImageRejected as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
     except Exception as e:
-        print(f"❌ Error al analizar imagen: {e}")
+        log.exception("Error al analizar imagen")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/materials/recommendations', methods=['POST'])
@@ -582,79 +748,13 @@ def get_material_recommendations():
         if not pathologies:
             return jsonify({"success": True, "materials": []})
         
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
+        # Una sola consulta FTS5 para todas las patologías (con sinónimos)
+        recommendations = recommend_materials(get_db(), user_id, pathologies)
         
-        # Buscar materiales relacionados con las patologías detectadas
-        recommendations = []
-        for pathology in pathologies:
-            # Normalizar nombres de patologías
-            pathology_normalized = pathology.lower()
-            if pathology_normalized == 'crack':
-                pathology_normalized = 'grieta'
-            elif pathology_normalized == 'humedad':
-                pathology_normalized = 'humedad'
-            
-            # Buscar materiales que tengan esta patología en pathology_related
-            cursor.execute("""
-                SELECT * FROM materials 
-                WHERE user_id = ? 
-                AND (pathology_related LIKE ? OR pathology_related LIKE ? OR category LIKE ?)
-            """, (user_id, f'%{pathology}%', f'%{pathology_normalized}%', f'%{pathology_normalized}%'))
-            
-            materials = cursor.fetchall()
-            for material in materials:
-                recommendations.append({
-                    "id": material[0],
-                    "name": material[1],
-                    "supplier": material[2],
-                    "price": material[3],
-                    "unit": material[4],
-                    "category": material[5] if len(material) > 5 else 'General',
-                    "pathology_related": material[6] if len(material) > 6 else '',
-                    "image_url": material[7] if len(material) > 7 else '',
-                    "is_favorite": bool(material[8]) if len(material) > 8 else False,
-                    "usage_count": material[9] if len(material) > 9 else 0,
-                    "match_reason": pathology,
-                    "score": 0  # Score para priorización
-                })
-        
-        # Eliminar duplicados por ID y calcular score de priorización
-        seen = {}
-        for rec in recommendations:
-            if rec['id'] not in seen:
-                seen[rec['id']] = rec
-            else:
-                # Si ya existe, combinar match_reason
-                seen[rec['id']]['match_reason'] += f", {rec['match_reason']}"
-        
-        unique_recommendations = list(seen.values())
-        
-        # Algoritmo de priorización mejorado
-        for rec in unique_recommendations:
-            score = 0
-            # Priorizar favoritos (+50 puntos)
-            if rec.get('is_favorite'):
-                score += 50
-            # Priorizar por uso frecuente (+30 puntos por cada 10 usos)
-            score += (rec.get('usage_count', 0) // 10) * 30
-            # Priorizar por precio bajo (más económico = mejor, +20 puntos si precio < 100)
-            if rec.get('price', 999999) < 100:
-                score += 20
-            elif rec.get('price', 999999) < 500:
-                score += 10
-            # Priorizar materiales recientes (+5 puntos si es nuevo)
-            rec['score'] = score
-        
-        # Ordenar por score (mayor a menor), luego por precio (menor a mayor)
-        unique_recommendations.sort(key=lambda x: (-x['score'], x.get('price', 999999)))
-        
-        conn.close()
-        
-        return jsonify({"success": True, "materials": unique_recommendations})
+        return jsonify({"success": True, "materials": recommendations})
     
     except Exception as e:
-        print(f"❌ Error al obtener recomendaciones: {e}")
+        log.exception("Error al obtener recomendaciones")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/materials/<int:material_id>/favorite', methods=['POST'])
@@ -668,7 +768,7 @@ def toggle_favorite(material_id):
         data = request.get_json()
         is_favorite = data.get('is_favorite', False)
         
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute(
@@ -678,10 +778,8 @@ def toggle_favorite(material_id):
         
         if cursor.rowcount > 0:
             conn.commit()
-            conn.close()
             return jsonify({"success": True, "message": "Favorito actualizado"})
         else:
-            conn.close()
             return jsonify({"success": False, "error": "Material no encontrado"}), 404
     
     except Exception as e:
@@ -695,7 +793,7 @@ def increment_usage(material_id):
         return jsonify({"success": False, "error": "No autenticado"}), 401
     
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute(
@@ -707,56 +805,233 @@ def increment_usage(material_id):
             cursor.execute("SELECT usage_count FROM materials WHERE id = ?", (material_id,))
             usage_count = cursor.fetchone()[0]
             conn.commit()
-            conn.close()
             return jsonify({"success": True, "usage_count": usage_count})
         else:
-            conn.close()
             return jsonify({"success": False, "error": "Material no encontrado"}), 404
     
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 # Ruta para recibir detecciones de la aplicación de escritorio
+def parse_detections(data):
+    """Validar un lote de la app de escritorio sin guardar nada
+
+    Devuelve (lote, filas del historial). ValueError si está mal formado:
+    se responde 400, que el publicador no reintenta (un 5xx lo reenviaría
+    y los lotes ya guardados se duplicarían).
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Se esperaba un objeto con 'detections'")
+    detections = data.get('detections') or []
+    events = data.get('events') or []
+    if not isinstance(detections, list) or not isinstance(events, list):
+        raise ValueError("'detections' y 'events' deben ser listas")
+    try:
+        camera_index = int(data.get('camera_index') or 0)
+        timestamp = float(data.get('timestamp') or time.time())
+    except (TypeError, ValueError):
+        raise ValueError("'camera_index' o 'timestamp' inválido")
+    batch = {
+        'device_id': data.get('device_id'),
+        'camera_index': camera_index,
+        'detections': detections,
+        'timestamp': timestamp,
+        # Eventos por objeto seguido ("appeared"/"ended"), sin repetir frames
+        'events': events
+    }
+    try:
+        rows = rows_from_batch(batch)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Detección inválida ({type(e).__name__}: {e})")
+    return batch, rows
+
+def store_detections(batch, rows, frame_id=None):
+    """Guardar un lote ya validado y difundirlo a los visores"""
+    batch = detection_hub.publish(batch)
+    if not RELAY_FROM_HUB:
+        detection_stream.publish(batch)
+    get_detection_recorder().record(rows)
+    # Muestreado: el cliente de escritorio envía varias veces por segundo
+    log.debug("Detecciones recibidas", extra={
+        "sample": "receive_detections", "frame_id": frame_id,
+        "device_id": batch['device_id'], "camera_index": batch['camera_index'],
+        "seq": batch['seq'], "count": len(batch['detections']),
+    })
+
 @app.route('/receive_detections', methods=['POST'])
 def receive_detections():
     """Recibir detecciones de la aplicación de escritorio"""
+    data = request.get_json(silent=True)
     try:
-        data = request.get_json()
-        detections = data.get('detections', [])
-        timestamp = data.get('timestamp', time.time())
-        camera_index = data.get('camera_index', 0)
-        
-        # Guardar en variable global para que la web pueda acceder
-        global latest_detections
-        latest_detections = {
-            'detections': detections,
-            'timestamp': timestamp,
-            'camera_index': camera_index
-        }
-        
-
-
+        batch, rows = parse_detections(data)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    try:
+        store_detections(batch, rows, data.get('frame_id'))
         return jsonify({"success": True, "message": "Detecciones recibidas"})
     except Exception as e:
+        log.exception("Error al recibir detecciones")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/receive_detections/bulk', methods=['POST'])
+def receive_detections_bulk():
+    """Recibir varios lotes de detecciones en un solo POST ({"batches": [...]})"""
+    data = request.get_json(silent=True) or {}
+    batches = data.get('batches')
+    if not isinstance(batches, list):
+        return jsonify({"success": False, "error": "Se esperaba una lista 'batches'"}), 400
+    
+    # Validar todos antes de guardar alguno: un lote malo no deja la mitad guardada
+    parsed = []
+    for i, data in enumerate(batches):
+        try:
+            parsed.append((*parse_detections(data), data.get('frame_id')))
+        except ValueError as e:
+            return jsonify({"success": False, "error": f"Lote {i}: {e}"}), 400
+    
+    try:
+        # En orden: el último lote queda como el más reciente
+        for batch, rows, frame_id in parsed:
+            store_detections(batch, rows, frame_id)
+        return jsonify({"success": True, "received": len(batches)})
+    except Exception as e:
+        log.exception("Error al recibir detecciones")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/stream_detections', methods=['GET'])
+def stream_detections():
+    """Detecciones en vivo por Server-Sent Events
+    
+    Parámetros opcionales: device y camera (solo ese stream) y throttle_ms
+    (máximo un mensaje cada tantos ms; los lotes intermedios se agrupan).
+    """
+    camera = request.args.get('camera', type=int)
+    device = request.args.get('device') or None
+    throttle_ms = request.args.get('throttle_ms', default=0, type=int)
+    if RELAY_FROM_HUB:
+        get_stream_relay()
+    try:
+        subscription = detection_stream.subscribe(camera, max(throttle_ms, 0) / 1000, device)
+    except TooManySubscribers as e:
+        return jsonify({"success": False, "error": str(e)}), 503
+    
+    response = Response(
+        stream_with_context(sse_events(subscription, Config.STREAM_HEARTBEAT_S)),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Sin buffer en proxies (nginx)
+    return response
+
+def history_range():
+    """(user_ids, desde, hasta) de una consulta del historial (últimas 24 h por defecto)"""
+    now = time.time()
+    end = request.args.get('to', default=now, type=float)
+    start = request.args.get('from', default=end - 86400, type=float)
+    if start >= end:
+        raise ValueError("'from' debe ser anterior a 'to'")
+    # Las detecciones de la cámara no tienen usuario: las ve cualquier usuario
+    return [SHARED_USER, session['user_id']], start, end
+
+@app.route('/detections/history/counts', methods=['GET'])
+def detection_history_counts():
+    """Detecciones por intervalo (?bucket=minute|hour|day) y etiqueta"""
+    if not session.get('user_id'):
+        return jsonify({"success": False, "error": "No autenticado"}), 401
+    
+    bucket = request.args.get('bucket', 'hour')
+    try:
+        if bucket not in BUCKETS:
+            raise ValueError(f"bucket debe ser uno de: {', '.join(BUCKETS)}")
+        user_ids, start, end = history_range()
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    counts = bucket_counts(
+        get_db(), user_ids, start, end, bucket,
+        label=request.args.get('label') or None,
+        device_id=request.args.get('device') or None,
+        camera_index=request.args.get('camera', type=int)
+    )
+    return jsonify({"success": True, "bucket": bucket, "from": start, "to": end, "counts": counts})
+
+@app.route('/detections/history/confidence', methods=['GET'])
+def detection_history_confidence():
+    """Histograma de confianza por etiqueta (10 intervalos de 0.1)"""
+    if not session.get('user_id'):
+        return jsonify({"success": False, "error": "No autenticado"}), 401
+    
+    try:
+        user_ids, start, end = history_range()
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    histograms = confidence_histogram(get_db(), user_ids, start, end, request.args.get('label') or None)
+    return jsonify({"success": True, "from": start, "to": end, "histograms": histograms})
+
+@app.route('/detections/history/trends', methods=['GET'])
+def detection_history_trends():
+    """Detecciones por día y etiqueta en los últimos ?days= días, con variación"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"success": False, "error": "No autenticado"}), 401
+    
+    days = request.args.get('days', default=7, type=int)
+    if not 1 <= days <= 365:
+        return jsonify({"success": False, "error": "days debe estar entre 1 y 365"}), 400
+    
+    trends = label_trends(get_db(), [SHARED_USER, user_id], days)
+    return jsonify({"success": True, "days": days, "trends": trends})
+
 # Ruta para obtener las últimas detecciones
 @app.route('/get_latest_detections', methods=['GET'])
 def get_latest_detections():
-    """Obtener las últimas detecciones para la web"""
-    global latest_detections
-    if latest_detections:
-        return jsonify(latest_detections)
+    """Obtener las últimas detecciones para la web (opcional: ?device=&camera=)"""
+    latest = detection_hub.latest(
+        request.args.get('device') or None,
+        request.args.get('camera', type=int)
+    )
+    if latest:
+        return jsonify(latest)
     else:
         return jsonify({"detections": [], "timestamp": 0, "camera_index": 0})
 
+@app.route('/detections/streams', methods=['GET'])
+def detection_streams():
+    """Streams de detecciones conocidos y sus estadísticas"""
+    return jsonify({"success": True, **detection_hub.stats()})
+
+@app.route('/detections/<device_id>/<int:camera_index>', methods=['GET'])
+def detections_since(device_id, camera_index):
+    """Lotes de un stream posteriores a ?since=<seq> (máximo ?limit=)"""
+    since = request.args.get('since', default=0, type=int)
+    limit = request.args.get('limit', default=Config.HUB_CAPACITY, type=int)
+    batches = detection_hub.since(device_id, camera_index, since, max(1, min(limit, Config.HUB_CAPACITY)))
+    return jsonify({
+        "success": True,
+        "device_id": device_id,
+        "camera_index": camera_index,
+        "batches": batches,
+        # El cliente pide la próxima vez desde aquí
+        "last_seq": batches[-1]["seq"] if batches else since
+    })
+
 if __name__ == "__main__":
-    # Inicializar base de datos
-    init_database()
+    import sys
+    
+    # Producción por defecto (serve.py); el servidor de desarrollo solo con --dev
+    if "--dev" not in sys.argv[1:]:
+        serve = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py")
+        os.execv(sys.executable, [sys.executable, serve, "app", *sys.argv[1:]])
+    
+    preload()
+    atexit.register(before_exit)
     
-    print("🚀 Servidor Flask iniciado")
+    print("🚀 Servidor Flask iniciado (desarrollo)")
     print("📊 Solo funciones de web (registro, login, materiales)")
     print("📹 La cámara es independiente (camara_app.py)")
     print("🖼️ Análisis de imágenes con IA disponible")
     
-    app.run(debug=True, host='127.0.0.1', port=5000)
\ No newline at end of file
+    # Sin el recargador: volvería a cargar el modelo en un segundo proceso
+    app.run(debug=True, use_reloader=False, host='127.0.0.1', port=5000)
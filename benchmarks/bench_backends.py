@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Latencia del detector por backend: PyTorch vs ONNX Runtime vs OpenVINO (y INT8).
+
+El modelo se copia a una carpeta temporal y se exporta ahí (no toca los
+exportados del proyecto). Sin master_model.pt se usa un YOLOv8n con pesos
+aleatorios: la latencia es representativa, la coincidencia no.
+
+    python benchmarks/bench_backends.py [--model master_model.pt] [--repeat 20]
+    python benchmarks/bench_backends.py --data dataset.yaml   # incluye ONNX INT8
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from config import Config  # noqa: E402
+from dipia.engine import Detector, find_model_path  # noqa: E402
+from dipia.engine.backends import export_model, load_model, runtime_available  # noqa: E402
+from dipia.engine.tiling import box_iou  # noqa: E402
+
+
+def prepare_model(model, folder):
+    """Copia del .pt en `folder` (o un YOLOv8n aleatorio si no existe)"""
+    target = os.path.join(folder, "modelo.pt")
+    path = find_model_path(model)
+    if path:
+        shutil.copy(path, target)
+        return target, os.path.basename(path)
+    from ultralytics import YOLO
+    YOLO("yolov8n.yaml").save(target)
+    return target, "yolov8n (pesos aleatorios)"
+
+
+def agreement(reference, detections):
+    """Fracción de cajas de referencia con par (misma clase, IoU >= 0.5)"""
+    total = matched = 0
+    for want, got in zip(reference, detections):
+        for box, cls in zip(want.boxes, want.class_ids):
+            total += 1
+            same = got.boxes[got.class_ids == cls]
+            matched += bool(len(same)) and box_iou(box, same).max() >= 0.5
+    return matched / total if total else None
+
+
+def measure(detector, images, batch_size, repeat):
+    """Latencia p50 y p99 (ms por imagen) con lotes de `batch_size`"""
+    batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+    detector.predict_batch(batches[0])  # calentar
+    samples = []
+    for _ in range(repeat):
+        for batch in batches:
+            start = time.perf_counter()
+            detector.predict_batch(batch)
+            samples.append((time.perf_counter() - start) * 1000 / len(batch))
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model", default=Config.DETECTOR_MODEL)
+    parser.add_argument("--data", default=None, help="calibración INT8 (YAML del dataset o carpeta)")
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--batch", type=int, default=Config.BATCH_MAX_SIZE)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--conf", type=float, default=0.25)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) for _ in range(args.images)]
+
+    with tempfile.TemporaryDirectory() as folder:
+        pt, name = prepare_model(args.model, folder)
+        variants = [("torch", False)]
+        formats = [f for f in ("onnx", "openvino") if runtime_available(f)]
+        if formats:
+            export_model(pt, formats, batch=args.batch)
+            variants += [(f, False) for f in formats]
+        if args.data and "onnx" in formats:
+            export_model(pt, ("onnx",), int8=True, batch=args.batch, data=args.data)
+            variants.append(("onnx", True))
+
+        print(f"{name}, {args.images} imágenes 1280x720, lotes de 1 y {args.batch}")
+        print(f"{'backend':>14} {'p50 b1':>8} {'p99 b1':>8} {f'p50 b{args.batch}':>8} "
+              f"{f'p99 b{args.batch}':>8} {'coincide':>9}   (ms por imagen)")
+        reference = None
+        for backend, int8 in variants:
+            model, _, loaded = load_model(pt, backend, int8, task="detect")
+            detector = Detector(model, conf=args.conf)
+            results = detector.predict_batch(images)
+            if reference is None:
+                reference = results
+            single = measure(detector, images, 1, args.repeat)
+            batched = measure(detector, images, args.batch, args.repeat)
+            match = agreement(reference, results)
+            label = f"{loaded}{' int8' if int8 else ''}"
+            shown = f"{match:>9.1%}" if match is not None else f"{'-':>9}"
+            print(f"{label:>14} {single[0]:>8.1f} {single[1]:>8.1f} {batched[0]:>8.1f} {batched[1]:>8.1f} {shown}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: post-procesado por caja (código anterior) vs `Detections`.
+
+Usa resultados sintéticos de ultralytics, así que no necesita master_model.pt.
+
+    python benchmarks/bench_detector.py [--device cuda] [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+from ultralytics.engine.results import Boxes
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dipia.engine import Detections, build_class_map  # noqa: E402
+
+NAMES = {0: "person", 1: "crack", 2: "humidity"}
+
+
+def make_boxes(count, device):
+    """Cajas aleatorias [x1, y1, x2, y2, conf, cls] en el dispositivo"""
+    xy = torch.rand(count, 2, device=device) * 600
+    wh = torch.rand(count, 2, device=device) * 200 + 10
+    conf = torch.rand(count, 1, device=device)
+    cls = torch.randint(0, 3, (count, 1), device=device).float()
+    data = torch.cat([xy, xy + wh, conf, cls], dim=1)
+    return Boxes(data, (1080, 1920))
+
+
+def per_box_loop(boxes):
+    """Copia del bucle original de analyze_image"""
+    detections = []
+    for box in boxes:
+        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+        confidence = box.conf[0].cpu().numpy()
+        class_id = int(box.cls[0].cpu().numpy())
+        if class_id == 0:
+            label = "Person"
+        elif class_id == 1:
+            label = "Crack"
+        elif class_id == 2:
+            label = "Humidity"
+        else:
+            label = f"Class_{class_id}"
+        detections.append({
+            "label": label,
+            "confidence": float(confidence),
+            "bbox": [int(x1), int(y1), int(x2), int(y2)],
+            "class_id": class_id,
+        })
+    return detections
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+def vectorized(boxes, class_map):
+    return Detections.from_result(_Result(boxes), class_map).to_list()
+
+
+def bench(fn, repeat):
+    fn()  # calentamiento
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    class_map = build_class_map(NAMES, "en")
+    print(f"Dispositivo: {args.device}")
+    print(f"{'detecciones':>12} {'por caja (ms)':>15} {'vectorizado (ms)':>17} {'speedup':>8}")
+    for count in (1, 10, 100):
+        boxes = make_boxes(count, args.device)
+        assert per_box_loop(boxes) == vectorized(boxes, class_map)
+        legacy_ms = bench(lambda: per_box_loop(boxes), args.repeat)
+        fast_ms = bench(lambda: vectorized(boxes, class_map), args.repeat)
+        print(f"{count:>12} {legacy_ms:>15.3f} {fast_ms:>17.3f} {legacy_ms / fast_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
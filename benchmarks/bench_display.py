@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Costo por frame (ms) de mostrar video en Tk a 480p, HD y FHD.
+
+Compara la ruta anterior de CameraApp.display_frame (resize, BGR→RGB,
+PNG y tk.PhotoImage nuevo por frame) con FrameRenderer: buffers
+reutilizados y copia de píxeles a una PhotoImage persistente, con PIL
+(paste) o con PPM sin comprimir. Sin display (p. ej. en un servidor)
+solo se mide la preparación del frame, sin la copia a Tk.
+
+    python benchmarks/bench_display.py [--repeat 100]
+"""
+import argparse
+import os
+import sys
+import time
+import tkinter as tk
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dipia.display import FrameRenderer, ImageTk, ppm_bytes  # noqa: E402
+
+RESOLUTIONS = {"480p": (640, 480), "HD": (1280, 720), "FHD": (1920, 1080)}
+MAX_WIDTH, MAX_HEIGHT = 800, 450
+
+
+def legacy(frame, label):
+    """display_frame antes de FrameRenderer"""
+    height, width = frame.shape[:2]
+    if width > MAX_WIDTH or height > MAX_HEIGHT:
+        scale = min(MAX_WIDTH / width, MAX_HEIGHT / height)
+        frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_LINEAR)
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    data = cv2.imencode('.png', frame_rgb)[1].tobytes()
+    if label is not None:
+        photo = tk.PhotoImage(data=data)
+        label.config(image=photo)
+        label.image = photo
+
+
+def renderer_path(renderer, frame, label):
+    rgb = renderer.prepare(frame)
+    if label is not None:
+        renderer.show(label, rgb)
+    elif not renderer.use_pil:
+        ppm_bytes(rgb)
+
+
+def bench(fn, repeat, root):
+    fn()  # calentamiento
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+        if root is not None:
+            root.update_idletasks()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+        label = tk.Label(root)
+        label.pack()
+    except tk.TclError:
+        root = label = None
+        print("Sin display: se mide solo la preparación del frame (sin copia a Tk)")
+
+    paths = {"png (anterior)": None, "ppm": False}
+    if ImageTk is not None:
+        paths["pil paste"] = True
+
+    print(f"{'resolución':>10} " + " ".join(f"{name:>15}" for name in paths))
+    for name, (width, height) in RESOLUTIONS.items():
+        frame = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+        # Un frame de cámara real comprime mejor que ruido: suavizarlo
+        frame = cv2.GaussianBlur(frame, (15, 15), 0)
+        results = []
+        for use_pil in paths.values():
+            if use_pil is None:
+                results.append(bench(lambda: legacy(frame, label), args.repeat, root))
+            else:
+                renderer = FrameRenderer(MAX_WIDTH, MAX_HEIGHT, use_pil=use_pil)
+                results.append(bench(lambda: renderer_path(renderer, frame, label), args.repeat, root))
+        print(f"{name:>10} " + " ".join(f"{ms:>12.2f} ms" for ms in results))
+
+    if root is not None:
+        root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Consultas del historial de detecciones sobre millones de filas.
+
+Llena una base temporal con detecciones repartidas en 90 días (inserción
+por lotes, como DetectionRecorder) y mide las consultas del dashboard
+sobre los agregados contra la misma consulta con GROUP BY sobre
+detection_log.
+
+    python benchmarks/bench_history.py [--rows 2000000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dipia.history import bucket_counts, confidence_histogram, label_trends, write_rows  # noqa: E402
+from dipia.migrations import migrate  # noqa: E402
+
+DAY = 86400
+LABELS = ("Persona", "Crack", "Humedad")
+USERS = [0, 1]
+
+
+def fill(conn, rows, now, batch=5000):
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for offset in range(0, rows, batch):
+        chunk = []
+        for _ in range(min(batch, rows - offset)):
+            ts = now - rng.random() * 90 * DAY
+            chunk.append((ts, rng.choice(USERS), f"pc-{rng.randrange(3)}", rng.randrange(2), "camera",
+                          rng.choice(LABELS), rng.random(), 0, 0, 10, 10, None))
+        write_rows(conn, chunk)
+    return time.perf_counter() - start
+
+
+def raw_daily_counts(conn, start, end):
+    return conn.execute(
+        """
+        SELECT CAST(ts / 86400 AS INTEGER) * 86400 AS day, label, COUNT(*), AVG(confidence)
+        FROM detection_log WHERE user_id IN (0, 1) AND ts >= ? AND ts < ?
+        GROUP BY day, label
+        """,
+        (start, end)
+    ).fetchall()
+
+
+def bench(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "history.db"))
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        migrate(conn)
+
+        elapsed = fill(conn, args.rows, now)
+        print(f"{args.rows} detecciones insertadas en {elapsed:.1f} s ({args.rows / elapsed:,.0f} filas/s)")
+
+        queries = {
+            "conteo por hora, 7 días": lambda: bucket_counts(conn, USERS, now - 7 * DAY, now, "hour"),
+            "conteo por día, 90 días": lambda: bucket_counts(conn, USERS, now - 90 * DAY, now, "day"),
+            "conteo por minuto, 6 h": lambda: bucket_counts(conn, USERS, now - 6 * 3600, now, "minute"),
+            "histograma, 30 días": lambda: confidence_histogram(conn, USERS, now - 30 * DAY, now),
+            "tendencias, 7 días": lambda: label_trends(conn, USERS, 7, now),
+            "por día, 90 días (sin agregados)": lambda: raw_daily_counts(conn, now - 90 * DAY, now),
+        }
+        print(f"{'consulta':>34} {'ms':>10}")
+        for name, query in queries.items():
+            print(f"{name:>34} {bench(query, args.repeat):>10.1f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
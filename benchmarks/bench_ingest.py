@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Decodificación de una foto de dron grande: ruta anterior vs dipia.ingest.
+
+Anterior: PIL.Image.open → np.array → cv2.cvtColor (varias copias a
+resolución completa). Nueva: una sola cv2.imdecode a BGR, reducida con
+IMREAD_REDUCED_* cuando sobra resolución. Cada variante corre en un
+proceso nuevo para medir su pico de memoria residente.
+
+    python benchmarks/bench_ingest.py [--width 7680] [--height 5120] [--repeat 5]
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+
+def make_jpeg(width, height):
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def decode_previous(data):
+    from PIL import Image
+    image = Image.open(io.BytesIO(data))
+    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+
+def decode_ingest(data, target_size):
+    from dipia.ingest import decode_image
+    return decode_image(data, target_size=target_size).image
+
+
+def run(name, data, repeat, target_size, results):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    decode = decode_previous if name == "anterior" else lambda d: decode_ingest(d, target_size)
+    shape = decode(data).shape
+    start = time.perf_counter()
+    for _ in range(repeat):
+        decode(data)
+    elapsed = (time.perf_counter() - start) / repeat * 1000
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    results.put((name, elapsed, peak / 1024, shape))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--width", type=int, default=7680)
+    parser.add_argument("--height", type=int, default=5120)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--target", type=int, default=1280, help="lado mayor mínimo al reducir")
+    args = parser.parse_args()
+
+    data = make_jpeg(args.width, args.height)
+    print(f"JPEG {args.width}x{args.height} ({args.width * args.height / 1e6:.0f} MP, "
+          f"{len(data) / 1024 / 1024:.1f} MB)")
+    print(f"{'ruta':>10} {'ms':>8} {'pico MB':>9}  decodificada")
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    variants = [("anterior", 0), ("completa", 0), ("reducida", args.target)]
+    for name, target in variants:
+        process = ctx.Process(target=run, args=(name, data, args.repeat, target, results))
+        process.start()
+        name, elapsed, peak, shape = results.get()
+        process.join()
+        print(f"{name:>10} {elapsed:>8.1f} {peak:>9.1f}  {shape[1]}x{shape[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Costo de post-procesado por frame con 10, 100 y 300 detecciones.
+
+Compara el bucle original de CameraApp.process_with_ai (tres copias al
+host por caja, reescalado, filtro y etiquetas en Python) con la ruta
+vectorizada de `Detections`. Ambas terminan serializando a JSON, como
+hace send_to_web.
+
+    python benchmarks/bench_postprocess.py [--device cuda] [--repeat 200]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import torch
+from ultralytics.engine.results import Boxes
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dipia.engine import Detections, build_class_map  # noqa: E402
+from dipia.engine.postprocess import label_table  # noqa: E402
+
+NAMES = {0: "person", 1: "crack", 2: "humidity"}
+FRAME_SHAPE = (1080, 1920)
+SCALE = 640 / FRAME_SHAPE[1]
+MIN_CONF = 0.3
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+def make_result(count, device):
+    """Resultado sintético sobre un frame reducido a 640 de ancho"""
+    height, width = int(FRAME_SHAPE[0] * SCALE), 640
+    xy = torch.rand(count, 2, device=device) * torch.tensor([width - 60, height - 60], device=device)
+    wh = torch.rand(count, 2, device=device) * 50 + 5
+    conf = torch.rand(count, 1, device=device)
+    cls = torch.randint(0, 3, (count, 1), device=device).float()
+    data = torch.cat([xy, xy + wh, conf, cls], dim=1)
+    return _Result(Boxes(data, (height, width)))
+
+
+def legacy(result):
+    """Bucle por caja de process_with_ai antes del motor compartido"""
+    detections = []
+    for box in result.boxes:
+        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+        confidence = box.conf[0].cpu().numpy()
+        class_id = int(box.cls[0].cpu().numpy())
+        x1 = int(x1 / SCALE)
+        y1 = int(y1 / SCALE)
+        x2 = int(x2 / SCALE)
+        y2 = int(y2 / SCALE)
+        if class_id == 0:
+            label = "Person"
+        elif class_id == 1:
+            label = "Crack"
+        elif class_id == 2:
+            label = "Humidity"
+        else:
+            label = f"Class_{class_id}"
+        if confidence < MIN_CONF:
+            continue
+        detections.append({
+            "label": label,
+            "confidence": float(confidence),
+            "bbox": [int(x1), int(y1), int(x2), int(y2)],
+            "class_id": class_id,
+        })
+    return json.dumps(detections)
+
+
+def vectorized(result, class_map, table):
+    detections = Detections.from_result(result, class_map, SCALE, table, FRAME_SHAPE)
+    return json.dumps(detections.filter(MIN_CONF).to_list())
+
+
+def bench(fn, repeat):
+    fn()  # calentamiento
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    class_map = build_class_map(NAMES, "en")
+    table = label_table(class_map)
+
+    print(f"Dispositivo: {args.device}")
+    print(f"{'detecciones':>12} {'por caja (ms)':>15} {'vectorizado (ms)':>17} {'speedup':>8}")
+    for count in (10, 100, 300):
+        result = make_result(count, args.device)
+        legacy_ms = bench(lambda: legacy(result), args.repeat)
+        fast_ms = bench(lambda: vectorized(result, class_map, table), args.repeat)
+        print(f"{count:>12} {legacy_ms:>15.3f} {fast_ms:>17.3f} {legacy_ms / fast_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Barrido de hilos, workers y afinidad: latencia p50/p99 y throughput.
+
+Cada configuración levanta `workers` procesos con el detector cargado y
+mide (1) peticiones de a una y (2) `--clients` clientes concurrentes. La
+fila "defecto" no llama a dipia.threads.configure (cada proceso usa un
+hilo de PyTorch por núcleo), que es lo que pasaba antes.
+
+Sin master_model.pt se usa un YOLOv8n con pesos aleatorios (misma carga
+de cómputo).
+
+    python benchmarks/bench_threads.py [--workers 1 2 4] [--threads 0 1 2] [--pin]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from config import Config  # noqa: E402
+from dipia.engine import find_model_path  # noqa: E402
+from dipia.threads import available_cores  # noqa: E402
+
+_detector = None
+_image = None
+
+
+def _init(model_path, workers, threads, pin, counter):
+    global _detector, _image
+    from dipia.engine import Detector
+    from dipia.engine.backends import load_model
+    from dipia.threads import configure
+
+    if threads is not None:
+        with counter.get_lock():
+            index, counter.value = counter.value, counter.value + 1
+        configure(workers, index, threads, 1, 0, pin)
+    _detector = Detector(load_model(model_path, "torch", task="detect")[0])
+    _image = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+    _detector.predict(_image)  # calentar
+
+
+def _infer(_):
+    _detector.predict(_image)
+    return os.getpid()
+
+
+def percentiles(samples):
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def run_config(model_path, workers, threads, pin, requests, clients):
+    context = get_context("spawn")
+    counter = context.Value("i", 0)
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init,
+                             initargs=(model_path, workers, threads, pin, counter)) as pool:
+        # Arrancar y calentar todos los procesos antes de medir
+        while len(set(pool.map(_infer, range(workers * 2)))) < workers:
+            pass
+
+        single = []
+        for i in range(requests):
+            start = time.perf_counter()
+            pool.submit(_infer, i).result()
+            single.append((time.perf_counter() - start) * 1000)
+
+        concurrent, lock = [], threading.Lock()
+        remaining = iter(range(requests * 2))
+
+        def client():
+            while True:
+                with lock:
+                    item = next(remaining, None)
+                if item is None:
+                    return
+                start = time.perf_counter()
+                pool.submit(_infer, item).result()
+                with lock:
+                    concurrent.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        running = [threading.Thread(target=client) for _ in range(clients)]
+        for t in running:
+            t.start()
+        for t in running:
+            t.join()
+        throughput = len(concurrent) / (time.perf_counter() - started)
+    return percentiles(single), percentiles(concurrent), throughput
+
+
+def main():
+    cores = len(available_cores())
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model", default=Config.DETECTOR_MODEL)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, max(1, cores // 2), cores}))
+    parser.add_argument("--threads", type=int, nargs="+", default=[0, 1],
+                        help="hilos de PyTorch por worker (0 = núcleos / workers)")
+    parser.add_argument("--pin", action="store_true", help="agregar las variantes con afinidad")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=None, help="clientes concurrentes (por defecto 2 x núcleos)")
+    args = parser.parse_args()
+    clients = args.clients or 2 * cores
+
+    with tempfile.TemporaryDirectory() as folder:
+        model_path = find_model_path(args.model)
+        if model_path is None:
+            from ultralytics import YOLO
+            model_path = os.path.join(folder, "yolov8n.pt")
+            YOLO("yolov8n.yaml").save(model_path)
+            print("Modelo: yolov8n (pesos aleatorios)")
+
+        print(f"{cores} núcleos, imágenes 1280x720, {args.requests} peticiones de a una, "
+              f"{args.requests * 2} con {clients} clientes concurrentes")
+        print(f"{'workers':>7} {'hilos':>7} {'fijar':>5} | {'p50':>7} {'p99':>7} | "
+              f"{'p50':>7} {'p99':>7} {'img/s':>6}   (ms)")
+        for workers in args.workers:
+            configs = [(None, False)] + [(t, False) for t in args.threads]
+            if args.pin:
+                configs += [(t, True) for t in args.threads]
+            for threads, pin in configs:
+                (s50, s99), (c50, c99), rate = run_config(
+                    model_path, workers, threads, pin, args.requests, clients
+                )
+                label = "defecto" if threads is None else (threads or f"auto={max(1, cores // workers)}")
+                print(f"{workers:>7} {label:>7} {'sí' if pin else 'no':>5} | {s50:>7.1f} {s99:>7.1f} | "
+                      f"{c50:>7.1f} {c99:>7.1f} {rate:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Recall y latencia en fotos de alta resolución: una pasada vs mosaicos.
+
+Las fotos son sintéticas, con grietas finas (1-2 px) de posición conocida.
+El "modelo" sintético imita a un YOLO con entrada de 640: reduce la imagen
+a 640 de lado mayor, umbraliza los píxeles oscuros y devuelve una caja por
+componente conexa. Al reducir una foto 4K las grietas finas se aclaran y
+se pierden; en las ventanas de 640 se conservan.
+
+Con --model se mide además la latencia del modelo real (sin recall: las
+fotos sintéticas no tienen etiquetas reales).
+
+    python benchmarks/bench_tiling.py [--width 4000] [--height 3000] [--images 5]
+    python benchmarks/bench_tiling.py --model master_model.pt
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from dipia.engine import Detector, TiledDetector  # noqa: E402
+from dipia.engine.tiling import box_iou  # noqa: E402
+
+INPUT_SIZE = 640
+
+
+class _Boxes:
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+
+class _Result:
+    def __init__(self, data):
+        self.boxes = _Boxes(data)
+
+
+class SyntheticModel:
+    """Detector de trazos oscuros con la resolución de entrada de un YOLO de 640"""
+
+    names = {0: "crack"}
+
+    def predict(self, images, verbose=False, **kwargs):
+        return [_Result(self._detect(image)) for image in images]
+
+    def _detect(self, image):
+        height, width = image.shape[:2]
+        scale = min(1.0, INPUT_SIZE / max(height, width))
+        small = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        mask = (gray < 110).astype(np.uint8)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        rows = []
+        for x, y, w, h, area in stats[1:count]:
+            if area >= 4:
+                rows.append([x / scale, y / scale, (x + w) / scale, (y + h) / scale, 0.8, 0])
+        return np.array(rows, dtype=np.float32).reshape(-1, 6)
+
+
+def make_photo(width, height, cracks, rng):
+    """Fondo con textura y `cracks` trazos finos; devuelve (imagen, cajas reales)"""
+    small = rng.integers(150, 230, (height // 32 + 1, width // 32 + 1, 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+    truth = []
+    for _ in range(cracks):
+        length = int(rng.integers(120, 400))
+        angle = rng.uniform(0, np.pi)
+        x1 = int(rng.integers(0, width - length))
+        y1 = int(rng.integers(length, height - length))
+        x2 = int(x1 + length * np.cos(angle))
+        y2 = int(y1 + length * np.sin(angle) * rng.choice([-1, 1]))
+        cv2.line(image, (x1, y1), (x2, y2), (40, 40, 40), int(rng.integers(1, 3)))
+        truth.append([min(x1, x2), min(y1, y2), max(x1, x2) + 1, max(y1, y2) + 1])
+    return image, np.array(truth, dtype=np.float32)
+
+
+def recall(truth, boxes, threshold):
+    """Fracción de grietas reales con alguna caja de IoU >= threshold"""
+    if len(boxes) == 0:
+        return 0.0
+    found = sum(box_iou(box, boxes).max() >= threshold for box in truth)
+    return found / len(truth)
+
+
+def measure(detector, photos, threshold):
+    recalls, latencies, counts = [], [], []
+    for image, truth in photos:
+        start = time.perf_counter()
+        detections = detector.predict(image)
+        latencies.append((time.perf_counter() - start) * 1000)
+        counts.append(len(detections))
+        if truth is not None:
+            recalls.append(recall(truth, detections.boxes, threshold))
+    return (np.mean(recalls) if recalls else None), np.median(latencies), np.mean(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--cracks", type=int, default=20, help="grietas por foto")
+    parser.add_argument("--iou", type=float, default=0.3, help="IoU mínima para contar una grieta encontrada")
+    parser.add_argument("--tile", type=int, default=640)
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--max-tiles", type=int, default=16)
+    parser.add_argument("--model", default=None, help="modelo YOLO real para medir solo latencia")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    photos = [make_photo(args.width, args.height, args.cracks, rng) for _ in range(args.images)]
+
+    if args.model:
+        from ultralytics import YOLO
+        model, photos = YOLO(args.model), [(image, None) for image, _ in photos]
+    else:
+        model = SyntheticModel()
+
+    single = Detector(model)
+    tiled = TiledDetector(single, tile_size=args.tile, overlap=args.overlap, max_tiles=args.max_tiles)
+    tiles = len(tiled.tiles(photos[0][0]))
+    print(f"{args.images} fotos {args.width}x{args.height}, {args.cracks} grietas c/u, "
+          f"{tiles} ventanas (incluida la imagen completa)")
+    print(f"{'modo':>10} {'recall':>8} {'ms p50':>8} {'cajas':>7}")
+
+    single.predict(photos[0][0])  # calentar
+    for name, detector in [("una pasada", single), ("mosaicos", tiled)]:
+        value, latency, count = measure(detector, photos, args.iou)
+        shown = f"{value:>8.2f}" if value is not None else f"{'-':>8}"
+        print(f"{name:>10} {shown} {latency:>8.1f} {count:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga de la API de materiales: peticiones/segundo con tráfico
+mixto de lecturas (GET /materials) y escrituras (POST /materials).
+
+Levanta app.py en un hilo con una base de datos temporal y la mide dos
+veces: sin pool ni WAL (conexión nueva por petición, como antes) y con
+el pool de conexiones en modo WAL.
+
+    python benchmarks/load_materials.py [--clients 16] [--seconds 10] [--write-ratio 0.2]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as dipia_app  # noqa: E402
+from config import Config  # noqa: E402
+
+
+def start_server(database, pool_size, wal):
+    """Arrancar app.py sobre `database` con la configuración indicada"""
+    Config.DB_POOL_SIZE = pool_size
+    Config.DB_WAL = wal
+    dipia_app.DATABASE = database
+    dipia_app.db_pool = None
+    dipia_app.init_database()
+
+    server = make_server("127.0.0.1", 0, dipia_app.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def logged_in_session(base_url, index):
+    session = requests.Session()
+    user = {
+        "username": f"load_{index}",
+        "email": f"load_{index}@example.com",
+        "password": "load",
+        "full_name": f"Load {index}",
+    }
+    session.post(f"{base_url}/register", json=user)
+    session.post(f"{base_url}/login", json={"username": user["username"], "password": "load"})
+    return session
+
+
+def client(base_url, index, seconds, write_ratio, counters, lock):
+    session = logged_in_session(base_url, index)
+    rng = random.Random(index)
+    ok = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        if rng.random() < write_ratio:
+            response = session.post(f"{base_url}/materials", json={
+                "name": f"Material {rng.randint(0, 10**6)}",
+                "supplier": "Proveedor",
+                "price": rng.uniform(1, 500),
+                "unit": "KG",
+                "category": rng.choice(["General", "Impermeabilización", "Reparación"]),
+            })
+        else:
+            response = session.get(f"{base_url}/materials")
+        if response.status_code == 200:
+            ok += 1
+        else:
+            errors += 1
+    with lock:
+        counters["ok"] += ok
+        counters["errors"] += errors
+
+
+def run(label, pool_size, wal, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        server, base_url = start_server(os.path.join(tmp, "load.db"), pool_size, wal)
+        counters = {"ok": 0, "errors": 0}
+        lock = threading.Lock()
+        threads = [
+            threading.Thread(
+                target=client,
+                args=(base_url, i, args.seconds, args.write_ratio, counters, lock),
+            )
+            for i in range(args.clients)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        dipia_app.db_pool.close()
+
+    print(f"{label:<22} {counters['ok'] / elapsed:>10.1f} req/s   errores: {counters['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"{args.clients} clientes, {args.seconds:.0f} s, {args.write_ratio:.0%} escrituras")
+    run("antes (sin pool)", 0, False, args)
+    run("después (pool + WAL)", 8, True, args)
+
+
+if __name__ == "__main__":
+    main()
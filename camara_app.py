@@ -3,11 +3,31 @@ import cv2
 import tkinter as tk
 from tkinter import ttk, messagebox
 import threading
-import requests
 import json
 import time
-from ultralytics import YOLO
 import numpy as np
+import logging
+
+from config import Config
+from dipia.engine import Detector, registry
+from dipia import threads
+from dipia.log import frame_id_var, new_id, setup_logging
+from dipia.publisher import DetectionPublisher
+from dipia.pipeline import DropOldestQueue, FramePacket, StageStats
+from dipia.scheduler import InferenceScheduler
+from dipia.tracker import Tracker
+from dipia.display import FrameRenderer
+
+log = logging.getLogger("dipia.camera")
+
+# Etapas del pipeline de video (en orden)
+STAGES = ("capture", "inference", "render", "publish")
+# Espera máxima (s) de cada etapa por un frame antes de revisar si debe terminar
+STAGE_TIMEOUT = 0.1
+# Cada cuánto (ms) el hilo de Tk busca un frame nuevo para mostrar
+DISPLAY_POLL_MS = 10
+# Cada cuánto (s) se actualiza la barra de estado
+STATUS_INTERVAL = 0.5
 
 class CameraApp:
     def __init__(self):
@@ -19,11 +39,34 @@ class CameraApp:
         # Variables
         self.camera = None
         self.is_running = False
-        self.model = None
+        self.detector = None
         self.camera_index = 0
-        self.fps_counter = 0
-        self.fps_start_time = time.time()
-        self.current_fps = 0
+        
+        # Pipeline: colas acotadas entre etapas (descartan el frame más viejo)
+        self.infer_queue = DropOldestQueue(1)
+        self.render_queue = DropOldestQueue(2)
+        self.display_queue = DropOldestQueue(1)
+        self.threads = []
+        # after() pendiente de poll_display: una sola cadena aunque se reinicie rápido
+        self.display_after_id = None
+        self.stats = {name: StageStats(name) for name in STAGES}
+        self.latest_detections = []
+        self.last_status_update = 0
+        self.scheduler = self.create_scheduler()
+        self.tracker = self.create_tracker()
+        self.last_publish = 0
+        # Envío a la web en segundo plano (agrupado, con reintentos)
+        self.publisher = DetectionPublisher(
+            Config.PUBLISH_URL,
+            max_queue=Config.PUBLISH_MAX_QUEUE,
+            max_batch=Config.PUBLISH_MAX_BATCH,
+            linger_ms=Config.PUBLISH_LINGER_MS,
+            max_retries=Config.PUBLISH_MAX_RETRIES
+        )
+        # Frames a Tk sin codificar (el tamaño sigue al de la ventana)
+        self.renderer = FrameRenderer(max_width=800, max_height=450)
+        # Prefijo de los IDs de frame de esta sesión (correlación con el servidor)
+        self.session_id = new_id()
         
         # Cargar modelo IA
         self.load_model()
@@ -37,8 +80,19 @@ class CameraApp:
     def load_model(self):
         """Cargar el modelo de IA"""
         try:
-            self.model = YOLO("master_model.pt")
-            print("✅ Modelo de IA cargado correctamente")
+            # ONNX Runtime / OpenVINO si hay un exportado del modelo (más rápido en CPU)
+            registry.configure(Config.INFERENCE_BACKEND, Config.INFERENCE_INT8)
+            self.detector = Detector.from_registry(
+                "detector",
+                Config.DETECTOR_MODEL,
+                language="en",
+                max_width=640,  # Redimensionar a 640 de ancho (mejor rendimiento)
+                conf=0.3,       # Bajar confianza para más detecciones
+                iou=0.45,       # Non-maximum suppression
+                max_det=10,     # Máximo 10 detecciones por frame
+                device='cpu'    # Usar CPU para estabilidad
+            )
+            print(f"✅ Modelo de IA cargado correctamente ({registry.stats()['models']['detector']['backend']})")
         except Exception as e:
             print(f"❌ Error al cargar el modelo: {e}")
             messagebox.showerror("Error", f"No se pudo cargar el modelo de IA: {e}")
@@ -105,6 +159,7 @@ class CameraApp:
         # Label para mostrar video
         self.video_label = tk.Label(self.video_frame, bg="#000000")
         self.video_label.pack(expand=True)
+        self.video_frame.bind("<Configure>", self.on_video_resize)
         
         # Frame para informacion
         info_frame = tk.Frame(self.root, bg="#000000")
@@ -139,6 +194,16 @@ class CameraApp:
             font=("Arial", 10)
         )
         self.detection_label.pack(side=tk.RIGHT)
+        
+        # FPS y latencia de cada etapa del pipeline
+        self.stages_label = tk.Label(
+            self.root, 
+            text="", 
+            fg="#AAAAAA", 
+            bg="#000000",
+            font=("Arial", 9)
+        )
+        self.stages_label.pack(pady=(0, 5), fill=tk.X)
     
     def detect_cameras(self):
         """Detectar cámaras disponibles"""
@@ -250,174 +315,193 @@ class CameraApp:
             self.stop_btn.config(state="normal")
             self.status_label.config(text="Status: Recording...")
             
-            # Iniciar hilo de video
-            self.video_thread = threading.Thread(target=self.video_loop)
-            self.video_thread.daemon = True
-            self.video_thread.start()
+            # Vaciar colas y contadores de una sesión anterior
+            for stage_queue in (self.infer_queue, self.render_queue, self.display_queue):
+                stage_queue.clear()
+            self.stats = {name: StageStats(name) for name in STAGES}
+            self.stats["publish"] = self.publisher.timing
+            self.latest_detections = []
+            self.scheduler = self.create_scheduler()
+            self.tracker = self.create_tracker()
+            
+            # Una etapa por hilo: captura, IA y render (el envío lo hace el publicador)
+            self.threads = []
+            for target in (self.capture_loop, self.inference_loop, self.render_loop):
+                thread = threading.Thread(target=target, name=target.__name__, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            
+            # El frame se muestra desde el hilo principal de Tk
+            self.cancel_display_poll()
+            self.display_after_id = self.root.after(DISPLAY_POLL_MS, self.poll_display)
         else:
             messagebox.showerror("Error", "No se pudo inicializar la camara")
     
     def stop_camera(self):
         """Detener la camara"""
         self.is_running = False
+        self.cancel_display_poll()
         self.start_btn.config(state="normal")
         self.stop_btn.config(state="disabled")
         self.status_label.config(text="Status: Stopped")
         self.detection_label.config(text="Detections: 0")
         
+        # Esperar a que las etapas terminen antes de liberar la cámara
+        for thread in self.threads:
+            thread.join(timeout=1)
+        self.threads = []
+        
         # Liberar la cámara cuando se detiene
         if self.camera:
             self.camera.release()
             self.camera = None
             print("✅ Cámara liberada")
     
-    def video_loop(self):
-        """Loop principal de video optimizado"""
+    def create_scheduler(self):
+        """Planificador de la IA según la configuración"""
+        return InferenceScheduler(
+            target_fps=Config.INFER_TARGET_FPS,
+            max_busy=Config.INFER_MAX_BUSY,
+            max_interval=Config.INFER_MAX_INTERVAL,
+            diff_threshold=Config.INFER_DIFF_THRESHOLD
+        )
+    
+    def create_tracker(self):
+        """Tracker de objetos según la configuración"""
+        return Tracker(
+            iou_threshold=Config.TRACK_IOU_THRESHOLD,
+            max_age=Config.TRACK_MAX_AGE,
+            min_hits=Config.TRACK_MIN_HITS
+        )
+    
+    def capture_loop(self):
+        """Etapa 1: leer frames al ritmo de la cámara"""
         frame_count = 0
-        last_ai_process = 0
-        ai_process_interval = 2  # Procesar IA cada 2 frames para mejor FPS
-        last_display_time = 0
-        min_display_interval = 1/30  # Máximo 30 FPS para display
         
         while self.is_running and self.camera and self.camera.isOpened():
             ret, frame = self.camera.read()
             if not ret:
-                print("❌ No se pudo leer frame de la camara")
+                log.error("No se pudo leer frame de la camara", extra={"camera_index": self.camera_index})
+                self.is_running = False
                 break
             
-            frame_count += 1
-            
-            # Calcular FPS cada 30 frames
-            if frame_count % 30 == 0:
-                current_time = time.time()
-                elapsed_time = current_time - self.fps_start_time
-                self.current_fps = 30 / elapsed_time
-                self.fps_start_time = current_time
-                self.fps_label.config(text=f"FPS: {self.current_fps:.1f}")
-            
             # Verificar que el frame no esté vacío o corrupto
             if frame is None or frame.size == 0:
-                print("❌ Frame vacío o corrupto")
+                log.warning("Frame vacío o corrupto", extra={"sample": "bad_frame"})
                 continue
             
             # Validar dimensiones del frame
             if len(frame.shape) != 3 or frame.shape[2] != 3:
-                print("❌ Frame con formato incorrecto")
+                log.warning("Frame con formato incorrecto", extra={"sample": "bad_frame"})
                 continue
             
-            # Procesar con IA solo cada ciertos frames para mejor rendimiento
-            detections = []
-            if frame_count % ai_process_interval == 0:
-                detections = self.process_with_ai(frame)
-                last_ai_process = frame_count
-                
-                # Mostrar información de detección en consola
-                if detections:
-                    print(f"🔍 Detected {len(detections)} objects: {[d['label'] for d in detections]}")
-                    # Debug: mostrar información detallada
-                    for det in detections:
-                        print(f"   - {det['label']} (class_id: {det['class_id']}, confidence: {det['confidence']:.2f})")
-                else:
-                    print(f"🔍 No detections in frame {frame_count}")
+            frame_count += 1
+            packet = FramePacket(f"{self.session_id}-{frame_count}", frame_count, frame)
+            self.stats["capture"].record()
             
-            # Dibujar detecciones (usar las últimas detecciones si no procesamos IA este frame)
-            if detections or last_ai_process > 0:
-                frame_with_detections = self.draw_detections(frame, detections if detections else [])
-            else:
-                frame_with_detections = frame
+            # La IA toma siempre el frame más reciente; el render muestra todos los que alcance
+            self.infer_queue.put(packet)
+            self.render_queue.put(packet)
+    
+    def inference_loop(self):
+        """Etapa 2: IA sobre el frame más reciente, cuando el planificador lo indique"""
+        last_index = 0
+        while self.is_running:
+            packet = self.infer_queue.get(timeout=STAGE_TIMEOUT)
+            if packet is None:
+                continue
+            
+            # Los frames descartados por la cola también cuentan para el intervalo
+            elapsed, last_index = packet.index - last_index, packet.index
+            if not self.scheduler.should_infer(packet.frame, elapsed):
+                continue
+            
+            frame_id_var.set(packet.frame_id)
+            start = time.perf_counter()
+            detections = self.process_with_ai(packet.frame)
+            latency_ms = (time.perf_counter() - start) * 1000
+            self.stats["inference"].record(latency_ms)
+            self.scheduler.record_inference(latency_ms)
             
-            # Mostrar en la interfaz (con control de velocidad)
-            current_time = time.time()
-            if current_time - last_display_time >= min_display_interval:
-                self.display_frame(frame_with_detections)
-                last_display_time = current_time
+            # El tracker mantiene las cajas (con ID estable) entre inferencias
+            self.tracker.update(detections, packet.index)
+            self.latest_detections = detections
             
-            # Enviar datos a la web solo si hay detecciones
-            if detections:
-                self.send_to_web(detections)
+            # A la web: los eventos por objeto y, como mucho cada
+            # TRACK_PUBLISH_INTERVAL, el estado actual de los objetos seguidos
+            events = self.tracker.pop_events()
+            tracks = self.tracker.tracks_at(packet.index)
+            now = time.time()
+            if events or (tracks and now - self.last_publish >= Config.TRACK_PUBLISH_INTERVAL):
+                self.last_publish = now
+                self.send_to_web(tracks, events)
+    
+    def render_loop(self):
+        """Etapa 3: dibujar detecciones y preparar la imagen para Tk"""
+        while self.is_running:
+            packet = self.render_queue.get(timeout=STAGE_TIMEOUT)
+            if packet is None:
+                continue
             
-            # Pequeña pausa para evitar sobrecarga del CPU
-            time.sleep(0.01)
+            # Copia: la etapa de IA puede estar leyendo el mismo frame
+            height, width = packet.frame.shape[:2]
+            tracks = self.tracker.tracks_at(packet.index, width, height)
+            frame = self.draw_detections(packet.frame.copy(), tracks)
+            image = self.renderer.prepare(frame)
+            if image is not None:
+                # El frame que Tk no llegó a mostrar devuelve su buffer
+                self.renderer.release(self.display_queue.put(image))
+            # Latencia de punta a punta: desde la captura hasta tener la imagen lista
+            self.stats["render"].record((time.perf_counter() - packet.captured_at) * 1000)
+    
+    def cancel_display_poll(self):
+        """Cancelar el poll_display programado, si hay uno"""
+        if self.display_after_id is not None:
+            self.root.after_cancel(self.display_after_id)
+            self.display_after_id = None
+    
+    def poll_display(self):
+        """Mostrar el último frame listo y actualizar la barra de estado (hilo de Tk)"""
+        self.display_after_id = None
+        image = self.display_queue.get(timeout=0)
+        if image is not None:
+            self.display_frame(image)
+        
+        now = time.perf_counter()
+        if now - self.last_status_update >= STATUS_INTERVAL:
+            self.last_status_update = now
+            display_fps = self.stats["render"].fps()
+            self.scheduler.observe_display_fps(display_fps)
+            self.fps_label.config(text=f"FPS: {display_fps:.1f}")
+            self.detection_label.config(text=f"Detections: {len(self.latest_detections)}")
+            stages = [self.stats[name].summary() for name in STAGES]
+            sent = self.publisher.stats()
+            stages.append(self.scheduler.summary())
+            stages.append(f"sent {sent['sent']} drop {sent['dropped']} fail {sent['failed']}")
+            self.stages_label.config(text=" | ".join(stages))
+        
+        if self.is_running:
+            self.display_after_id = self.root.after(DISPLAY_POLL_MS, self.poll_display)
     
     def process_with_ai(self, frame):
         """Procesar frame con IA optimizado"""
-        if not self.model:
+        if not self.detector:
             return []
         
         try:
-            # Redimensionar frame para IA si es muy grande (mejor rendimiento)
-            height, width = frame.shape[:2]
-            if width > 640:
-                scale = 640 / width
-                new_width = 640
-                new_height = int(height * scale)
-                frame_resized = cv2.resize(frame, (new_width, new_height))
-            else:
-                frame_resized = frame
-                scale = 1.0
-            
-            # Procesar con IA (configuración optimizada)
-            print(f"🔍 Procesando frame {width}x{height} -> {new_width}x{new_height}")
-            results = self.model.predict(
-                frame_resized, 
-                verbose=False,
-                conf=0.3,  # Bajar confianza para más detecciones
-                iou=0.45,  # Non-maximum suppression
-                max_det=10,  # Máximo 10 detecciones por frame
-                device='cpu'  # Usar CPU para estabilidad
-            )
-            
-            detections = []
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None and len(boxes) > 0:
-                    print(f"🔍 YOLO detectó {len(boxes)} objetos")
-                    for box in boxes:
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        confidence = box.conf[0].cpu().numpy()
-                        class_id = int(box.cls[0].cpu().numpy())
-                        
-                        print(f"   - Objeto: class_id={class_id}, conf={confidence:.2f}")
-                        
-                        # Escalar coordenadas de vuelta al frame original
-                        if scale != 1.0:
-                            x1 = int(x1 / scale)
-                            y1 = int(y1 / scale)
-                            x2 = int(x2 / scale)
-                            y2 = int(y2 / scale)
-                        
-                        # Mapear clases correctamente
-                        # Ajustar según lo que realmente detecta el modelo
-                        if class_id == 0:
-                            label = "Person"     # Clase 0 = Persona
-                        elif class_id == 1:
-                            label = "Crack"      # Clase 1 = Grieta
-                        elif class_id == 2:
-                            label = "Humidity"   # Clase 2 = Humedad
-                        elif class_id == 8:
-                            label = "Person"     # Clase 8 también puede ser Persona
-                        else:
-                            label = f"Class_{class_id}"
-                        
-                        # Solo procesar detecciones con confianza alta
-                        if confidence < 0.3:  # Bajar umbral
-                            print(f"   - Rechazado por confianza baja: {confidence:.2f}")
-                            continue
-                        
-                        print(f"   - Aceptado: {label} en ({x1},{y1})-({x2},{y2})")
-                        
-                        detections.append({
-                            "label": label,
-                            "confidence": float(confidence),
-                            "bbox": [int(x1), int(y1), int(x2), int(y2)],
-                            "class_id": class_id
-                        })
-                else:
-                    print("🔍 YOLO no detectó objetos")
-            
+            # El detector redimensiona a 640 de ancho y devuelve las cajas
+            # ya escaladas al frame original
+            detections = self.detector.predict(frame).to_list()
+            # Muestreado: con la IA cada 2 frames serían ~15 líneas por segundo
+            log.debug("Detecciones del frame", extra={
+                "sample": "detections",
+                "count": len(detections),
+                "labels": [d["label"] for d in detections],
+                "confidences": [round(d["confidence"], 2) for d in detections],
+            })
             return detections
-        except Exception as e:
-            print(f"Error en procesamiento IA: {e}")
+        except Exception:
+            log.exception("Error en procesamiento IA")
             return []
     
     def draw_detections(self, frame, detections):
@@ -452,84 +536,38 @@ class CameraApp:
             # Dibujar texto en blanco para contraste
             cv2.putText(frame, text, (x1, y1 - 5), font, font_scale, (255, 255, 255), thickness)
             
-            # Dibujar ID de clase en la esquina inferior derecha del rectángulo
-            class_text = f"ID: {detection['class_id']}"
+            # Dibujar ID del objeto seguido (o de la clase) en la esquina inferior derecha
+            if "track_id" in detection:
+                class_text = f"#{detection['track_id']}"
+            else:
+                class_text = f"ID: {detection['class_id']}"
             cv2.putText(frame, class_text, (x2 - 50, y2 - 5), font, 0.5, (255, 255, 255), 1)
         
         return frame
     
-    def display_frame(self, frame):
-        """Mostrar frame en la interfaz optimizado"""
-        try:
-            # Verificar que el frame sea válido
-            if frame is None or frame.size == 0:
-                return
-            
-            # Redimensionar frame para la interfaz
-            height, width = frame.shape[:2]
-            max_width = 800
-            max_height = 450
-            
-            if width > max_width or height > max_height:
-                scale = min(max_width/width, max_height/height)
-                new_width = int(width * scale)
-                new_height = int(height * scale)
-                frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
-            
-            # Convertir BGR a RGB
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Método más simple y directo para Tkinter
-            frame_pil = tk.PhotoImage(data=cv2.imencode('.png', frame_rgb)[1].tobytes())
-            
-            # Mostrar en label
-            self.video_label.config(image=frame_pil)
-            self.video_label.image = frame_pil  # Mantener referencia
-            
-        except Exception as e:
-            # Método alternativo más robusto
-            try:
-                # Redimensionar si es necesario
-                height, width = frame.shape[:2]
-                if width > 800 or height > 450:
-                    scale = min(800/width, 450/height)
-                    new_width = int(width * scale)
-                    new_height = int(height * scale)
-                    frame = cv2.resize(frame, (new_width, new_height))
-                
-                # Convertir y mostrar
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                frame_pil = tk.PhotoImage(data=cv2.imencode('.png', frame_rgb)[1].tobytes())
-                self.video_label.config(image=frame_pil)
-                self.video_label.image = frame_pil
-            except:
-                # Si todo falla, no mostrar nada para evitar spam
-                pass
+    def on_video_resize(self, event):
+        """Ajustar el tamaño de salida del video al área disponible"""
+        if event.width > 1 and event.height > 1:
+            self.renderer.set_bounds(event.width - 4, event.height - 4)
     
-    def send_to_web(self, detections):
-        """Enviar detecciones a la web"""
+    def display_frame(self, image):
+        """Mostrar la imagen RGB preparada en la interfaz (solo desde el hilo de Tk)"""
         try:
-            if detections:
-                data = {
-                    "detections": detections,
-                    "timestamp": time.time(),
-                    "camera_index": self.camera_index
-                }
-                
-                # Enviar a Flask
-                response = requests.post(
-                    "http://127.0.0.1:5000/receive_detections",
-                    json=data,
-                    timeout=1
-                )
-                
-                if response.status_code == 200:
-                    self.detection_label.config(text=f"Detections: {len(detections)}")
-                else:
-                    print(f"Error al enviar datos: {response.status_code}")
-        except Exception as e:
-            # No mostrar error en consola para evitar spam
-            pass
+            self.renderer.show(self.video_label, image)
+        except Exception:
+            log.exception("Error al mostrar frame", extra={"sample": "display_error"})
+    
+    def send_to_web(self, detections, events=None):
+        """Encolar detecciones (y eventos por objeto) para la web; no bloquea"""
+        if detections or events:
+            self.publisher.submit({
+                "detections": detections,
+                "events": events or [],
+                "timestamp": time.time(),
+                "device_id": Config.DEVICE_ID,
+                "camera_index": self.camera_index,
+                "frame_id": frame_id_var.get()
+            })
     
     def run(self):
         """Ejecutar la aplicacion"""
@@ -539,10 +577,19 @@ class CameraApp:
     def on_closing(self):
         """Manejar cierre de ventana"""
         self.is_running = False
+        self.cancel_display_poll()
+        for thread in self.threads:
+            thread.join(timeout=1)
         if self.camera:
             self.camera.release()
+        self.publisher.stop()
         self.root.destroy()
 
 if __name__ == "__main__":
+    setup_logging(Config.LOG_LEVEL, Config.LOG_JSON, Config.LOG_FRAME_SAMPLE)
+    threads.configure(
+        Config.INFER_WORKERS, 0, Config.TORCH_THREADS, Config.TORCH_INTEROP_THREADS,
+        Config.OPENCV_THREADS, Config.PIN_CORES
+    )
     app = CameraApp()
     app.run()
\ No newline at end of file
@@ -1,15 +1,25 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
 import time
 
+from config import Config
+from dipia import threads
+from dipia.engine import Detector, registry
+from dipia.pipeline import StageStats
+from dipia.scheduler import InferenceScheduler
+from dipia.tracker import Tracker
+
 def main():
     print("🚀 Iniciando aplicación de cámara con IA...")
     
     # Cargar modelo YOLO
     try:
-        model = YOLO("master_model.pt")
-        print("✅ Modelo de IA cargado correctamente")
+        # ONNX Runtime / OpenVINO si hay un exportado del modelo (más rápido en CPU)
+        registry.configure(Config.INFERENCE_BACKEND, Config.INFERENCE_INT8)
+        detector = Detector.from_registry(
+            "detector", Config.DETECTOR_MODEL, language="en", max_width=640, conf=0.5
+        )
+        print(f"✅ Modelo de IA cargado correctamente ({registry.stats()['models']['detector']['backend']})")
     except Exception as e:
         print(f"❌ Error al cargar modelo: {e}")
         return
@@ -52,6 +62,22 @@ def main():
     
     frame_count = 0
     last_detection_time = 0
+    detections = []
+    
+    # La IA corre según su latencia medida y se salta frames repetidos
+    scheduler = InferenceScheduler(
+        target_fps=Config.INFER_TARGET_FPS,
+        max_busy=Config.INFER_MAX_BUSY,
+        max_interval=Config.INFER_MAX_INTERVAL,
+        diff_threshold=Config.INFER_DIFF_THRESHOLD
+    )
+    display_stats = StageStats("display")
+    # Las cajas se extrapolan entre inferencias con un ID estable por objeto
+    tracker = Tracker(
+        iou_threshold=Config.TRACK_IOU_THRESHOLD,
+        max_age=Config.TRACK_MAX_AGE,
+        min_hits=Config.TRACK_MIN_HITS
+    )
     
     # Colores para las clases
     colors = {
@@ -68,62 +94,31 @@ def main():
         
         frame_count += 1
         
-        # Procesar con IA cada 10 frames para mejor rendimiento
-        detections = []
-        if frame_count % 10 == 0:
+        # Procesar con IA cuando el planificador lo indique
+        if scheduler.should_infer(frame):
             try:
-                # Redimensionar para IA
-                height, width = frame.shape[:2]
-                if width > 640:
-                    scale = 640 / width
-                    new_width = int(width * scale)
-                    new_height = int(height * scale)
-                    frame_resized = cv2.resize(frame, (new_width, new_height))
-                else:
-                    frame_resized = frame
-                
-                # Procesar con YOLO
-                results = model.predict(frame_resized, conf=0.5, verbose=False)
-                
-                for result in results:
-                    if result.boxes is not None:
-                        boxes = result.boxes.xyxy.cpu().numpy()
-                        confidences = result.boxes.conf.cpu().numpy()
-                        class_ids = result.boxes.cls.cpu().numpy().astype(int)
-                        
-                        for i, (box, conf, class_id) in enumerate(zip(boxes, confidences, class_ids)):
-                            # Mapear clases correctamente
-                            if class_id == 0:
-                                label = "Person"
-                            elif class_id == 1:
-                                label = "Crack"
-                            elif class_id == 2:
-                                label = "Humidity"
-                            else:
-                                label = f"Class_{class_id}"
-                            
-                            # Escalar coordenadas de vuelta al frame original
-                            if width > 640:
-                                x1, y1, x2, y2 = (box * scale).astype(int)
-                            else:
-                                x1, y1, x2, y2 = box.astype(int)
-                            
-                            detections.append({
-                                "bbox": [x1, y1, x2, y2],
-                                "label": label,
-                                "confidence": conf,
-                                "class_id": class_id
-                            })
+                # El detector redimensiona a 640 de ancho y devuelve las cajas
+                # escaladas al frame original
+                start = time.perf_counter()
+                detections = detector.predict(frame).to_list()
+                scheduler.record_inference((time.perf_counter() - start) * 1000)
+                tracker.update(detections, frame_count)
                 
+                # Un mensaje por objeto nuevo o perdido, no por frame
+                for event in tracker.pop_events():
+                    action = "Detected" if event["event"] == "appeared" else "Lost"
+                    print(f"🔍 {action} {event['label']} #{event['track_id']} ({event['confidence']:.2f})")
                 if detections:
-                    print(f"🔍 Detected {len(detections)} objects: {[d['label'] for d in detections]}")
                     last_detection_time = time.time()
                 
             except Exception as e:
                 print(f"❌ Error en procesamiento IA: {e}")
         
+        height, width = frame.shape[:2]
+        tracks = tracker.tracks_at(frame_count, width, height)
+        
         # Dibujar detecciones en el frame
-        for detection in detections:
+        for detection in tracks:
             x1, y1, x2, y2 = detection["bbox"]
             label = detection["label"]
             confidence = detection["confidence"]
@@ -147,12 +142,16 @@ def main():
             # Dibujar texto en blanco
             cv2.putText(frame, text, (x1, y1 - 5), font, font_scale, (255, 255, 255), thickness)
             
-            # Dibujar ID de clase
-            class_text = f"ID: {detection['class_id']}"
+            # Dibujar ID del objeto seguido
+            class_text = f"#{detection['track_id']}"
             cv2.putText(frame, class_text, (x2 - 50, y2 - 5), font, 0.5, (255, 255, 255), 1)
         
         # Mostrar información en pantalla
-        info_text = f"Frame: {frame_count} | Detections: {len(detections)}"
+        display_stats.record()
+        if frame_count % 30 == 0:
+            scheduler.observe_display_fps(display_stats.fps())
+        info_text = (f"Frame: {frame_count} | Objects: {len(tracks)} | "
+                     f"FPS: {display_stats.fps():.0f} | {scheduler.summary()}")
         cv2.putText(frame, info_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
         
         # Mostrar frame
@@ -174,5 +173,9 @@ def main():
     print("✅ Aplicación cerrada correctamente")
 
 if __name__ == "__main__":
+    threads.configure(
+        Config.INFER_WORKERS, 0, Config.TORCH_THREADS, Config.TORCH_INTEROP_THREADS,
+        Config.OPENCV_THREADS, Config.PIN_CORES
+    )
     main()
 
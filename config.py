@@ -2,8 +2,169 @@
 #  Archivo: config.py (Versión Base sin IA)
 # ----------------------------------------------------
 import os
+import socket
 
 class Config:
     # --- Configuración de la Cámara ---
     # 0 = Webcam principal, 1 = Webcam secundaria, etc.
-    VIDEO_SOURCE = 0
\ No newline at end of file
+    VIDEO_SOURCE = 0
+
+    # --- Modelos de IA ---
+    # Nombre (o ruta) del detector YOLO
+    DETECTOR_MODEL = os.environ.get("DIPIA_DETECTOR_MODEL", "master_model.pt")
+    # Cargar y calentar el modelo al arrancar el servidor (1) o en la primera petición (0)
+    PRELOAD_MODELS = os.environ.get("DIPIA_PRELOAD_MODELS", "1") == "1"
+    # Backend de inferencia: "auto" (OpenVINO u ONNX Runtime si hay exportado, si no PyTorch),
+    # "torch", "onnx" u "openvino" (ver export_models.py)
+    INFERENCE_BACKEND = os.environ.get("DIPIA_INFERENCE_BACKEND", "auto")
+    # Preferir los exportados INT8 (más rápidos, algo menos precisos)
+    INFERENCE_INT8 = os.environ.get("DIPIA_INFERENCE_INT8", "0") == "1"
+
+    # --- Hilos de CPU para la inferencia ---
+    # Workers que infieren a la vez en esta máquina (procesos de serve.py); los núcleos se reparten entre ellos
+    INFER_WORKERS = int(os.environ.get("DIPIA_INFER_WORKERS", "1"))
+    # Hilos intra-op de PyTorch por worker (0 = núcleos / INFER_WORKERS)
+    TORCH_THREADS = int(os.environ.get("DIPIA_TORCH_THREADS", "0"))
+    # Hilos inter-op de PyTorch (el modelo es secuencial: 1 alcanza)
+    TORCH_INTEROP_THREADS = int(os.environ.get("DIPIA_TORCH_INTEROP_THREADS", "1"))
+    # Hilos de OpenCV por worker (0 = igual que TORCH_THREADS)
+    OPENCV_THREADS = int(os.environ.get("DIPIA_OPENCV_THREADS", "0"))
+    # Fijar cada worker a su propio grupo de núcleos (solo Linux)
+    PIN_CORES = os.environ.get("DIPIA_PIN_CORES", "0") == "1"
+
+    # --- Servidor de producción (serve.py) ---
+    # Dirección "host:puerto" ("" = la de cada app: 127.0.0.1:5000 / 127.0.0.1:5001)
+    SERVER_BIND = os.environ.get("DIPIA_SERVER_BIND", "")
+    # Hilos de peticiones por worker; cada visor SSE conectado ocupa uno mientras
+    # está abierto, y los visores se limitan a la mitad para no bloquear la API
+    SERVER_THREADS = int(os.environ.get("DIPIA_SERVER_THREADS", "16"))
+    # Segundos sin responder antes de reiniciar un worker (incluye calentar el modelo)
+    SERVER_TIMEOUT = int(os.environ.get("DIPIA_SERVER_TIMEOUT", "120"))
+    # Segundos que un worker tiene para terminar sus peticiones al recargar o apagar
+    SERVER_GRACEFUL_TIMEOUT = int(os.environ.get("DIPIA_SERVER_GRACEFUL_TIMEOUT", "30"))
+    # Peticiones tras las que se recicla un worker (0 = nunca)
+    SERVER_MAX_REQUESTS = int(os.environ.get("DIPIA_SERVER_MAX_REQUESTS", "0"))
+    # Carpeta de las métricas por worker ("" = una temporal por servidor)
+    METRICS_DIR = os.environ.get("DIPIA_METRICS_DIR", "")
+    # Cada cuántos segundos cada worker vuelca sus métricas
+    METRICS_INTERVAL = float(os.environ.get("DIPIA_METRICS_INTERVAL", "5"))
+
+    # --- Micro-batching de inferencias ---
+    # Máximo de imágenes por llamada a predict()
+    BATCH_MAX_SIZE = int(os.environ.get("DIPIA_BATCH_MAX_SIZE", "8"))
+    # Tiempo máximo (ms) que una imagen espera a que se complete el lote
+    BATCH_MAX_WAIT_MS = float(os.environ.get("DIPIA_BATCH_MAX_WAIT_MS", "10"))
+    # Peticiones en cola antes de responder 503
+    BATCH_MAX_QUEUE = int(os.environ.get("DIPIA_BATCH_MAX_QUEUE", "64"))
+
+    # --- Clasificador de recortes (IA N°2) ---
+    # Lado del cuadrado (letterbox) al que se llevan los recortes
+    CLASSIFIER_IMGSZ = int(os.environ.get("DIPIA_CLASSIFIER_IMGSZ", "224"))
+    # Lado mínimo (px de la foto original) de una caja para clasificarla; los recortes
+    # salen de la imagen decodificada (reducida a DIPIA_INGEST_DECODE_SIZE)
+    CLASSIFIER_MIN_CROP = int(os.environ.get("DIPIA_CLASSIFIER_MIN_CROP", "8"))
+
+    # --- Base de datos ---
+    # Máximo de conexiones SQLite abiertas por proceso (0 = abrir y cerrar en cada petición)
+    DB_POOL_SIZE = int(os.environ.get("DIPIA_DB_POOL_SIZE", "8"))
+    # Espera máxima (ms) por una conexión libre cuando están todas prestadas
+    DB_POOL_TIMEOUT_MS = int(os.environ.get("DIPIA_DB_POOL_TIMEOUT_MS", "5000"))
+    # Espera máxima (ms) cuando la base de datos está bloqueada
+    DB_BUSY_TIMEOUT_MS = int(os.environ.get("DIPIA_DB_BUSY_TIMEOUT_MS", "5000"))
+    # Journal WAL + synchronous=NORMAL (lecturas concurrentes con escrituras)
+    DB_WAL = os.environ.get("DIPIA_DB_WAL", "1") == "1"
+
+    # --- Logging ---
+    # Nivel mínimo (DEBUG, INFO, WARNING, ERROR)
+    LOG_LEVEL = os.environ.get("DIPIA_LOG_LEVEL", "INFO")
+    # Una línea JSON por evento (1) o texto legible (0)
+    LOG_JSON = os.environ.get("DIPIA_LOG_JSON", "0") == "1"
+    # Solo 1 de cada N líneas por frame se escribe
+    LOG_FRAME_SAMPLE = int(os.environ.get("DIPIA_LOG_FRAME_SAMPLE", "30"))
+
+    # --- Planificación de la IA en los clientes de cámara ---
+    # FPS de visualización que se quieren sostener
+    INFER_TARGET_FPS = float(os.environ.get("DIPIA_INFER_TARGET_FPS", "30"))
+    # Fracción máxima del tiempo de cada frame dedicada a la IA
+    INFER_MAX_BUSY = float(os.environ.get("DIPIA_INFER_MAX_BUSY", "0.5"))
+    # Frames máximos entre dos inferencias (aunque la imagen no cambie)
+    INFER_MAX_INTERVAL = int(os.environ.get("DIPIA_INFER_MAX_INTERVAL", "30"))
+    # Diferencia media (0-255) por debajo de la cual un frame se considera repetido
+    INFER_DIFF_THRESHOLD = float(os.environ.get("DIPIA_INFER_DIFF_THRESHOLD", "2.0"))
+
+    # --- Seguimiento de objetos entre inferencias ---
+    # IoU mínimo para asociar una detección a un objeto ya seguido
+    TRACK_IOU_THRESHOLD = float(os.environ.get("DIPIA_TRACK_IOU_THRESHOLD", "0.3"))
+    # Inferencias seguidas sin ver un objeto antes de darlo por perdido
+    TRACK_MAX_AGE = int(os.environ.get("DIPIA_TRACK_MAX_AGE", "5"))
+    # Inferencias en que debe aparecer un objeto para mostrarlo y anunciarlo
+    TRACK_MIN_HITS = int(os.environ.get("DIPIA_TRACK_MIN_HITS", "1"))
+    # Cada cuánto (s) se reenvían los objetos seguidos aunque no haya eventos
+    TRACK_PUBLISH_INTERVAL = float(os.environ.get("DIPIA_TRACK_PUBLISH_INTERVAL", "1.0"))
+
+    # --- Detecciones en vivo (SSE) ---
+    # Lotes pendientes por visor antes de descartar los más viejos
+    STREAM_QUEUE_SIZE = int(os.environ.get("DIPIA_STREAM_QUEUE_SIZE", "16"))
+    # Visores conectados al mismo tiempo (con serve.py, además, la mitad de los hilos de cada worker)
+    STREAM_MAX_SUBSCRIBERS = int(os.environ.get("DIPIA_STREAM_MAX_SUBSCRIBERS", "100"))
+    # Intervalo mínimo (ms) entre mensajes a un visor (0 = sin límite)
+    STREAM_MIN_INTERVAL_MS = float(os.environ.get("DIPIA_STREAM_MIN_INTERVAL_MS", "0"))
+    # Cada cuánto (ms) cada worker busca lotes nuevos en el concentrador sqlite para sus visores
+    STREAM_POLL_MS = float(os.environ.get("DIPIA_STREAM_POLL_MS", "200"))
+    # Segundos sin detecciones antes de enviar un keep-alive
+    STREAM_HEARTBEAT_S = float(os.environ.get("DIPIA_STREAM_HEARTBEAT_S", "15"))
+
+    # --- Envío de detecciones desde la app de escritorio ---
+    PUBLISH_URL = os.environ.get("DIPIA_PUBLISH_URL", "http://127.0.0.1:5000/receive_detections/bulk")
+    # Lotes pendientes antes de descartar los más viejos
+    PUBLISH_MAX_QUEUE = int(os.environ.get("DIPIA_PUBLISH_MAX_QUEUE", "64"))
+    # Lotes agrupados como máximo en un mismo POST
+    PUBLISH_MAX_BATCH = int(os.environ.get("DIPIA_PUBLISH_MAX_BATCH", "16"))
+    # Espera (ms) para juntar lotes antes de enviar
+    PUBLISH_LINGER_MS = float(os.environ.get("DIPIA_PUBLISH_LINGER_MS", "50"))
+    # Reintentos (con espera exponencial) si el servidor no responde
+    PUBLISH_MAX_RETRIES = int(os.environ.get("DIPIA_PUBLISH_MAX_RETRIES", "3"))
+
+    # --- Concentrador de detecciones por dispositivo/cámara ---
+    # "memory" (un proceso) o "sqlite" (compartido entre workers)
+    HUB_BACKEND = os.environ.get("DIPIA_HUB_BACKEND", "memory")
+    # Lotes recientes que se guardan por stream
+    HUB_CAPACITY = int(os.environ.get("DIPIA_HUB_CAPACITY", "100"))
+    # Archivo del backend sqlite (separado de dipia.db)
+    HUB_DATABASE = os.environ.get("DIPIA_HUB_DATABASE", "dipia_hub.db")
+    # Identificador de esta app de escritorio en el concentrador
+    DEVICE_ID = os.environ.get("DIPIA_DEVICE_ID", socket.gethostname())
+
+    # --- Historial de detecciones ---
+    # Filas acumuladas antes de escribir un lote
+    HISTORY_BATCH_SIZE = int(os.environ.get("DIPIA_HISTORY_BATCH_SIZE", "500"))
+    # Espera máxima (s) antes de escribir lo acumulado
+    HISTORY_FLUSH_INTERVAL = float(os.environ.get("DIPIA_HISTORY_FLUSH_INTERVAL", "1.0"))
+
+    # --- Caché de resultados de análisis ---
+    # Memoria (MB) para resultados de imágenes ya analizadas (0 = sin caché)
+    RESULT_CACHE_MB = float(os.environ.get("DIPIA_RESULT_CACHE_MB", "64"))
+    # Archivo SQLite para conservar la caché entre reinicios ("" = solo memoria)
+    RESULT_CACHE_PATH = os.environ.get("DIPIA_RESULT_CACHE_PATH", "")
+    # Tamaño máximo (MB) de la caché en disco
+    RESULT_CACHE_DISK_MB = float(os.environ.get("DIPIA_RESULT_CACHE_DISK_MB", "256"))
+
+    # --- Imágenes subidas para análisis ---
+    # Tamaño máximo del archivo (MB)
+    INGEST_MAX_MB = float(os.environ.get("DIPIA_INGEST_MAX_MB", "25"))
+    # Resolución máxima (megapíxeles)
+    INGEST_MAX_MEGAPIXELS = float(os.environ.get("DIPIA_INGEST_MAX_MEGAPIXELS", "100"))
+    # Lado mayor mínimo al decodificar reducida (el modelo trabaja a 640; 0 = siempre completa)
+    INGEST_DECODE_SIZE = int(os.environ.get("DIPIA_INGEST_DECODE_SIZE", "1280"))
+
+    # --- Inferencia por mosaicos (fotos de alta resolución) ---
+    # Lado de cada ventana (px de la imagen)
+    TILE_SIZE = int(os.environ.get("DIPIA_TILE_SIZE", "640"))
+    # Fracción de superposición entre ventanas vecinas
+    TILE_OVERLAP = float(os.environ.get("DIPIA_TILE_OVERLAP", "0.2"))
+    # Ventanas máximas por imagen (si no alcanzan, se agrandan)
+    TILE_MAX = int(os.environ.get("DIPIA_TILE_MAX", "16"))
+    # IoU a partir del cual dos cajas de la misma clase se consideran la misma
+    TILE_NMS_IOU = float(os.environ.get("DIPIA_TILE_NMS_IOU", "0.5"))
+    # Agregar una pasada con la imagen completa (objetos más grandes que una ventana)
+    TILE_INCLUDE_FULL = os.environ.get("DIPIA_TILE_INCLUDE_FULL", "1") == "1"
@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+DIPIA - Código compartido entre el servidor Flask, el backend Hack4edu
+y las aplicaciones de cámara.
+"""
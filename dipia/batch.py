@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+"""
+Análisis por lotes de carpetas de fotos y videos grabados (sin servidor).
+
+Los archivos se parten en unidades de trabajo (un grupo de fotos, o un
+tramo de frames de un video) que se reparten entre procesos. Cada proceso
+carga el detector una vez y hace su propia etapa decodificar → inferir
+(por lotes); el proceso principal es el único que escribe: agrega las
+detecciones de cada unidad terminada al JSONL de salida y anota la unidad
+en el checkpoint. Al reanudar se saltean las unidades ya anotadas y el
+JSONL se trunca al último punto confirmado, así una corrida interrumpida
+no deja filas repetidas. Con --format parquet el JSONL se convierte al
+final (requiere pyarrow).
+
+    python analyze_batch.py vuelo_01/ grabacion.mp4 -o vuelo_01.jsonl --every 5
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+
+log = logging.getLogger("dipia.batch")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".m4v")
+
+# Columnas de cada fila de salida (una por detección)
+COLUMNS = ("source", "frame", "time_s", "label", "confidence", "x1", "y1", "x2", "y2", "class_id")
+
+# Estado del proceso de trabajo (uno por proceso)
+_detector = None
+_options = None
+
+
+def discover(paths):
+    """Fotos y videos de las rutas dadas (carpetas recorridas recursivamente), ordenados"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names)
+        else:
+            files.append(path)
+    return sorted(
+        os.path.abspath(f) for f in files
+        if f.lower().endswith(IMAGE_EXTENSIONS + VIDEO_EXTENSIONS)
+    )
+
+
+def video_frame_count(path):
+    import cv2
+    capture = cv2.VideoCapture(path)
+    try:
+        return int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    finally:
+        capture.release()
+
+
+def plan_units(files, images_per_unit=32, frames_per_unit=600):
+    """Unidades de trabajo: ("images", [rutas]) o ("video", ruta, inicio, fin)
+
+    Los videos largos se parten en tramos para que varios procesos avancen
+    sobre el mismo archivo; si no se conoce la cantidad de frames, el
+    video es una sola unidad.
+    """
+    units = []
+    images = [f for f in files if f.lower().endswith(IMAGE_EXTENSIONS)]
+    for i in range(0, len(images), images_per_unit):
+        units.append(("images", tuple(images[i:i + images_per_unit])))
+    for path in files:
+        if not path.lower().endswith(VIDEO_EXTENSIONS):
+            continue
+        total = video_frame_count(path)
+        if total <= 0:
+            units.append(("video", path, 0, None))
+            continue
+        for start in range(0, total, frames_per_unit):
+            units.append(("video", path, start, min(start + frames_per_unit, total)))
+    return units
+
+
+def unit_id(unit):
+    if unit[0] == "images":
+        return f"images:{unit[1][0]}:{len(unit[1])}"
+    return f"video:{unit[1]}:{unit[2]}"
+
+
+def load_detector(model, conf=None, language="es", backend="auto", int8=False):
+    """Detector para un proceso de trabajo (el modelo se carga una vez por proceso)"""
+    from .engine import Detector
+    from .engine.backends import load_model
+    from .engine.registry import find_model_path
+
+    path = find_model_path(model)
+    if path is None:
+        raise FileNotFoundError(f"{model} no encontrado")
+    kwargs = {"conf": conf} if conf is not None else {}
+    return Detector(load_model(path, backend, int8)[0], language=language, **kwargs)
+
+
+def _init_worker(detector_factory, options, counter=None):
+    """Inicializador de cada proceso: hilos acotados y detector cargado una vez"""
+    global _detector, _options
+    from .log import setup_logging
+    from .threads import configure
+    setup_logging()
+    index = 0
+    if counter is not None:
+        with counter.get_lock():
+            index, counter.value = counter.value, counter.value + 1
+    # Los procesos ya ocupan los núcleos: cada uno con sus propios hilos acotados
+    # (OpenCV de a uno: cada proceso decodifica lo suyo)
+    configure(options["workers"], index, options["threads"], 1, 1, options["pin"])
+    _options = options
+    _detector = detector_factory()
+
+
+def _rows(detections, source, frame=None, time_s=None):
+    rows = []
+    for d in detections.to_list():
+        x1, y1, x2, y2 = d["bbox"]
+        rows.append([source, frame, time_s, d["label"], round(d["confidence"], 4),
+                     x1, y1, x2, y2, d["class_id"]])
+    return rows
+
+
+def _process_images(paths):
+    from .ingest import ImageRejected, decode_image
+
+    rows, decoded, names, frames = [], [], [], 0
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                decoded.append(decode_image(f.read(), target_size=_options["decode_size"]))
+            names.append(path)
+        except (OSError, ImageRejected) as e:
+            log.warning("Se omite %s: %s", path, e)
+    batch_size = _options["batch_size"]
+    for i in range(0, len(decoded), batch_size):
+        chunk = decoded[i:i + batch_size]
+        results = _detector.predict_batch([image.image for image in chunk])
+        for name, image, result in zip(names[i:i + batch_size], chunk, results):
+            rows.extend(_rows(image.to_original(result), name))
+            frames += 1
+    return rows, frames
+
+
+def _seek(capture, start):
+    """Dejar `capture` justo antes del frame `start`; False si el video no llega
+
+    set(CAP_PROP_POS_FRAMES) puede caer en el keyframe anterior (o pasarse):
+    se lee la posición real y se avanza con grab() hasta `start`.
+    """
+    import cv2
+
+    capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+    position = int(capture.get(cv2.CAP_PROP_POS_FRAMES))
+    if not 0 <= position <= start:
+        # Posición desconocida o pasada: recorrer desde el principio
+        capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        position = int(capture.get(cv2.CAP_PROP_POS_FRAMES))
+        if position != 0:
+            return False
+    while position < start:
+        if not capture.grab():
+            return False
+        position += 1
+    return True
+
+
+def _process_video(path, start, end):
+    import cv2
+
+    every = _options["every"]
+    batch_size = _options["batch_size"]
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        log.warning("No se pudo abrir %s", path)
+        return [], 0
+    fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+    if start and not _seek(capture, start):
+        log.warning("%s no llega al frame %d", path, start)
+        capture.release()
+        return [], 0
+
+    rows, frames, pending = [], 0, []
+
+    def flush():
+        for (index, _), result in zip(pending, _detector.predict_batch([frame for _, frame in pending])):
+            rows.extend(_rows(result, path, index, round(index / fps, 3) if fps else None))
+        pending.clear()
+
+    index = start
+    try:
+        while end is None or index < end:
+            # grab() avanza sin convertir el frame; solo se recuperan los muestreados
+            if not capture.grab():
+                break
+            if index % every == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    pending.append((index, frame))
+                    frames += 1
+                    if len(pending) >= batch_size:
+                        flush()
+            index += 1
+        if pending:
+            flush()
+    finally:
+        capture.release()
+    return rows, frames
+
+
+def process_unit(unit):
+    """Analizar una unidad en el proceso de trabajo; devuelve (filas, frames analizados)"""
+    if unit[0] == "images":
+        return _process_images(unit[1])
+    return _process_video(*unit[1:])
+
+
+class CheckpointMismatch(Exception):
+    """El checkpoint existente es de una corrida con otras opciones"""
+
+
+class Checkpoint:
+    """Unidades terminadas y hasta dónde llega la salida confirmada"""
+
+    def __init__(self, path, params):
+        self.path = path
+        self.params = params
+        self.done = set()
+        self.offset = 0
+        self.frames = 0
+
+    def load(self):
+        """Leer un checkpoint previo; False si no existe"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if lines and lines[0].get("params") != self.params:
+            raise CheckpointMismatch(
+                f"El checkpoint {self.path} es de otra configuración {lines[0].get('params')}; "
+                "use --restart para empezar de cero"
+            )
+        for entry in lines[1:]:
+            self.done.add(entry["unit"])
+            self.offset = entry["offset"]
+            self.frames += entry["frames"]
+        return True
+
+    def start(self):
+        self._file = open(self.path, "a", encoding="utf-8")
+        if self._file.tell() == 0:
+            self._append({"params": self.params})
+
+    def _append(self, entry):
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def commit(self, unit, offset, frames):
+        self.done.add(unit)
+        self.offset = offset
+        self.frames += frames
+        self._append({"unit": unit, "offset": offset, "frames": frames})
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlWriter:
+    """Salida JSONL que se trunca al último punto confirmado al reanudar"""
+
+    def __init__(self, path, offset=0):
+        mode = "r+b" if os.path.exists(path) else "wb"
+        self._file = open(path, mode)
+        self._file.truncate(offset)
+        self._file.seek(offset)
+        self.rows = 0
+
+    def write(self, rows):
+        """Escribir las filas de una unidad; devuelve el offset confirmado"""
+        lines = [json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) for row in rows]
+        if lines:
+            self._file.write(("\n".join(lines) + "\n").encode("utf-8"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.rows += len(rows)
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+def jsonl_to_parquet(source, target, chunk_rows=100_000):
+    """Convertir el JSONL de detecciones a Parquet por bloques (requiere pyarrow)"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("La salida Parquet requiere pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([
+        ("source", pa.string()), ("frame", pa.int64()), ("time_s", pa.float64()),
+        ("label", pa.string()), ("confidence", pa.float32()),
+        ("x1", pa.int32()), ("y1", pa.int32()), ("x2", pa.int32()), ("y2", pa.int32()),
+        ("class_id", pa.int32()),
+    ])
+    with open(source, encoding="utf-8") as f, pq.ParquetWriter(target, schema) as writer:
+        chunk = []
+        for line in f:
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_rows:
+                writer.write_table(pa.Table.from_pylist(chunk, schema))
+                chunk = []
+        if chunk:
+            writer.write_table(pa.Table.from_pylist(chunk, schema))
+
+
+class Progress:
+    """Frames por segundo y avance, informados cada `interval` segundos"""
+
+    def __init__(self, total_units, interval=10.0):
+        self.total_units = total_units
+        self.interval = interval
+        self.units = 0
+        self.frames = 0
+        self.started = time.perf_counter()
+        self._last = self.started
+
+    def update(self, frames):
+        self.units += 1
+        self.frames += frames
+        now = time.perf_counter()
+        if now - self._last >= self.interval:
+            self._last = now
+            self.report()
+
+    def report(self):
+        log.info("%d/%d unidades, %d frames, %.1f frames/s", self.units, self.total_units,
+                 self.frames, self.fps())
+
+    def fps(self):
+        elapsed = time.perf_counter() - self.started
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+
+def run(paths, output, detector_factory, workers=None, every=1, batch_size=8, decode_size=1280,
+        checkpoint=None, restart=False, images_per_unit=32, frames_per_unit=600, progress_interval=10.0,
+        threads=0, pin_cores=False, detector_params=None):
+    """Analizar `paths` y escribir las detecciones en `output` (JSONL); devuelve un resumen
+
+    `detector_factory` es un invocable sin argumentos (que se pueda enviar a
+    otro proceso) que devuelve un Detector. Con workers=0 todo corre en el
+    proceso actual. `threads` son los hilos de PyTorch por proceso (0 =
+    núcleos / workers) y `pin_cores` fija cada proceso a sus núcleos.
+    `detector_params` (modelo, confianza, backend...) va al checkpoint: no
+    se reanuda una corrida hecha con otro detector.
+    """
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    every = max(1, int(every))
+    checkpoint_path = checkpoint or f"{output}.checkpoint"
+    if restart:
+        for path in (output, checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    files = discover(paths)
+    units = plan_units(files, images_per_unit, frames_per_unit)
+    params = {"files": len(files), "every": every, "decode_size": decode_size,
+              "images_per_unit": images_per_unit, "frames_per_unit": frames_per_unit,
+              **(detector_params or {})}
+    state = Checkpoint(checkpoint_path, params)
+    if state.load():
+        log.info("Reanudando: %d de %d unidades ya analizadas", len(state.done), len(units))
+    pending = [u for u in units if unit_id(u) not in state.done]
+
+    options = {
+        "every": every,
+        "batch_size": batch_size,
+        "decode_size": decode_size,
+        # Repartir los núcleos entre los procesos
+        "workers": max(workers, 1),
+        "threads": threads,
+        "pin": pin_cores,
+    }
+    writer = JsonlWriter(output, state.offset)
+    state.start()
+    progress = Progress(len(pending), progress_interval)
+
+    def finish(unit, rows, frames):
+        state.commit(unit_id(unit), writer.write(rows), frames)
+        progress.update(frames)
+
+    try:
+        if workers <= 0:
+            _init_worker(detector_factory, options)
+            for unit in pending:
+                finish(unit, *process_unit(unit))
+        else:
+            context = get_context("spawn")  # fork no es seguro con torch/CUDA ya inicializados
+            counter = context.Value("i", 0)  # índice de cada proceso (grupo de núcleos)
+            with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                     initargs=(detector_factory, options, counter)) as pool:
+                # Pocas unidades en vuelo a la vez: la memoria no depende del tamaño del lote
+                queue = iter(pending)
+                in_flight = {}
+                for unit in queue:
+                    in_flight[pool.submit(process_unit, unit)] = unit
+                    if len(in_flight) >= workers * 2:
+                        break
+                while in_flight:
+                    completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        finish(in_flight.pop(future), *future.result())
+                        unit = next(queue, None)
+                        if unit is not None:
+                            in_flight[pool.submit(process_unit, unit)] = unit
+    finally:
+        writer.close()
+        state.close()
+
+    fps = progress.fps()
+    progress.report()
+    return {
+        "files": len(files),
+        "units": len(units),
+        "skipped_units": len(units) - len(pending),
+        "frames": progress.frames,
+        "total_frames": state.frames,
+        "detections": writer.rows,
+        "fps": round(fps, 2),
+        "seconds": round(time.perf_counter() - progress.started, 2),
+    }
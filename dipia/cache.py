@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Caché de resultados de análisis por contenido de la imagen.
+
+La clave combina el hash de los bytes subidos, la versión del modelo
+(hash del archivo de pesos) y los parámetros que cambian el resultado
+(umbral de confianza, idioma de las etiquetas, tipo de análisis). Volver
+a subir la misma foto (un reintento tras un error de red, o ir y volver
+entre ImageAnalysis e ImageAnalysisExtended) devuelve el resultado
+guardado sin volver a correr el detector ni el clasificador.
+
+En memoria es un LRU acotado por bytes (el JSON de cada resultado). Si se
+indica un archivo, los resultados también se guardan en SQLite: sobreviven
+a un reinicio y los comparten los procesos que apunten al mismo archivo
+(el servidor Flask y el backend Hack4edu). Si dos peticiones piden la
+misma clave a la vez, solo una calcula y la otra espera su resultado.
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from .db import SQLitePool
+
+log = logging.getLogger("dipia.cache")
+
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+def content_hash(data):
+    """Hash de los bytes de la imagen tal como se subieron"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _model_files(path):
+    """Archivos de un modelo: el archivo mismo o los de su carpeta (OpenVINO)"""
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if os.path.isfile(os.path.join(path, name))
+    )
+
+
+def model_fingerprint(path):
+    """Versión de un modelo: hash de su archivo (se recalcula si cambia)"""
+    if not path:
+        return "none"
+    try:
+        files = _model_files(path)
+        stats = [os.stat(name) for name in files]
+    except OSError:
+        return os.path.basename(path)
+    key = (path, tuple((name, stat.st_size, stat.st_mtime_ns) for name, stat in zip(files, stats)))
+    with _fingerprints_lock:
+        fingerprint = _fingerprints.get(key)
+    if fingerprint is None:
+        digest = hashlib.blake2b(digest_size=8)
+        for name in files:
+            with open(name, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        fingerprint = digest.hexdigest()
+        with _fingerprints_lock:
+            _fingerprints[key] = fingerprint
+    return fingerprint
+
+
+def result_key(data, kind, model_version, conf=None, **params):
+    """Clave de caché para los bytes `data` analizados con `kind`"""
+    extra = "".join(f":{name}={params[name]}" for name in sorted(params))
+    return f"{kind}:{model_version}:conf={conf}{extra}:{content_hash(data)}"
+
+
+class ResultCache:
+    """LRU de resultados (dicts JSON) acotado por bytes, con copia opcional en disco"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS result_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            accessed REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_result_cache_accessed ON result_cache(accessed);
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, path=None, max_disk_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "errors": 0}
+
+        self.pool = None
+        if path:
+            self.pool = SQLitePool(path, size=2)
+            with self.pool.connection() as conn:
+                conn.executescript(self.SCHEMA)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _remember(self, key, encoded):
+        """Guardar en memoria y desalojar lo menos usado hasta entrar en el presupuesto"""
+        size = len(encoded)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = encoded
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._counters["evictions"] += 1
+
+    def _disk_get(self, key):
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute("SELECT value FROM result_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE result_cache SET accessed = ? WHERE key = ?", (time.time(), key))
+                    conn.commit()
+        except Exception:
+            self._count("errors")
+            log.exception("Error al leer la caché de resultados")
+            return None
+        return row[0] if row else None
+
+    def _disk_put(self, key, encoded):
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO result_cache (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                    (key, encoded, len(encoded), time.time())
+                )
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM result_cache").fetchone()[0]
+                if total > self.max_disk_bytes:
+                    # Borrar los menos usados hasta volver al presupuesto
+                    conn.execute(
+                        """
+                        DELETE FROM result_cache WHERE key IN (
+                            SELECT key FROM (
+                                SELECT key, SUM(size) OVER (ORDER BY accessed, key) - size AS before
+                                FROM result_cache
+                            ) WHERE before < ?
+                        )
+                        """,
+                        (total - self.max_disk_bytes,)
+                    )
+                conn.commit()
+        except Exception:
+            self._count("errors")
+            log.exception("Error al guardar en la caché de resultados")
+
+    def get(self, key):
+        """Resultado guardado para `key` (una copia nueva) o None"""
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return json.loads(encoded)
+
+        if self.pool is not None:
+            encoded = self._disk_get(key)
+            if encoded is not None:
+                self._remember(key, encoded)
+                self._count("disk_hits")
+                return json.loads(encoded)
+
+        self._count("misses")
+        return None
+
+    def put(self, key, value):
+        """Guardar un resultado serializable a JSON"""
+        encoded = json.dumps(value, separators=(",", ":"))
+        self._remember(key, encoded)
+        if self.pool is not None:
+            self._disk_put(key, encoded)
+
+    def get_or_compute(self, key, compute):
+        """Resultado de `key`, calculándolo con `compute()` si no está
+
+        Devuelve (resultado, True si vino de la caché). Las excepciones de
+        `compute` se propagan y no se guarda nada.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value, True
+
+        with self._lock:
+            # El que calculaba pudo terminar (y guardar) entre get() y este lock
+            encoded = self._entries.get(key)
+            if encoded is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                self._counters["misses"] -= 1
+                return json.loads(encoded), True
+            pending = self._inflight.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._inflight[key] = Future()
+
+        if not owner:
+            # Otra petición ya está analizando la misma imagen
+            value = pending.result()
+            with self._lock:
+                self._counters["hits"] += 1
+                self._counters["misses"] -= 1
+            return json.loads(json.dumps(value)), True
+
+        try:
+            value = compute()
+            self.put(key, value)
+            pending.set_result(value)
+            return value, False
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.pool is not None:
+            with self.pool.connection() as conn:
+                conn.execute("DELETE FROM result_cache")
+                conn.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes})
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["disk_hits"]) / lookups, 4) if lookups else None
+        stats["disk"] = self.pool.path if self.pool is not None else None
+        return stats
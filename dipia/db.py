@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Pool de conexiones SQLite.
+
+Las conexiones se abren una vez, en modo WAL con synchronous=NORMAL y un
+busy timeout, y se reutilizan entre peticiones. Así las lecturas no
+bloquean a las escrituras y cada conexión conserva su caché de
+sentencias preparadas. Nunca hay más de `size` conexiones prestadas a la
+vez: el que llega con todas ocupadas espera a que se libere una.
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """No se liberó ninguna conexión del pool a tiempo"""
+
+
+class SQLitePool:
+    """Pool acotado de conexiones a un archivo SQLite
+
+    Con size <= 0 no hay pool: cada préstamo abre una conexión y la cierra
+    al devolverla, sin límite.
+    """
+
+    def __init__(self, path, size=8, busy_timeout_ms=5000, wal=True, cached_statements=256,
+                 acquire_timeout_ms=5000):
+        self.path = path
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.acquire_timeout_ms = acquire_timeout_ms
+        self.wal = wal
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue(maxsize=max(size, 1))
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+        # Un permiso por conexión prestada
+        self._slots = threading.BoundedSemaphore(size) if size > 0 else None
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,  # cada conexión la usa un solo hilo a la vez
+            cached_statements=self.cached_statements,
+        )
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        if self.wal:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def acquire(self, timeout_ms=None):
+        """Tomar una conexión libre o abrir una nueva
+
+        Si ya hay `size` prestadas espera hasta `timeout_ms` (por defecto
+        acquire_timeout_ms) y después lanza PoolTimeout.
+        """
+        timeout_ms = self.acquire_timeout_ms if timeout_ms is None else timeout_ms
+        if self._slots is not None and not self._slots.acquire(timeout=timeout_ms / 1000):
+            raise PoolTimeout(f"Las {self.size} conexiones de {self.path} están ocupadas")
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+                with self._lock:
+                    self._opened += 1
+        except BaseException:
+            if self._slots is not None:
+                self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return conn
+
+    def release(self, conn):
+        """Devolver una conexión al pool (sin pool, se cierra)"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            if self.size <= 0:
+                conn.close()
+                return
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            if self._slots is not None:
+                self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Conexión prestada durante el bloque `with`"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Cerrar todas las conexiones libres"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "in_use": self._in_use,
+            "opened": self._opened,
+            "wal": self.wal,
+        }
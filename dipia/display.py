@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Visualización de frames en Tk sin codificar imágenes.
+
+La ruta anterior comprimía cada frame a PNG para que tk.PhotoImage lo
+volviera a decodificar. Aquí el frame se redimensiona y se convierte a RGB
+sobre buffers reutilizados (en el hilo de render), y en el hilo de Tk los
+píxeles se copian a una única PhotoImage persistente: con PIL
+(ImageTk.PhotoImage.paste) o, si ImageTk no está disponible, como datos
+PPM sin comprimir. El tamaño de salida solo se recalcula cuando cambia el
+tamaño de la ventana o del frame.
+
+Un buffer entregado por prepare() pertenece a quien lo recibe hasta que
+lo devuelve con release() (show() lo hace al terminar de copiarlo): el
+hilo de render nunca escribe sobre un frame que Tk todavía está pegando.
+"""
+import threading
+import tkinter as tk
+
+import cv2
+import numpy as np
+
+try:
+    from PIL import Image, ImageTk
+except ImportError:  # Pillow sin soporte de Tk
+    Image = ImageTk = None
+
+
+def fit_size(width, height, max_width, max_height):
+    """Tamaño que entra en (max_width, max_height) conservando la proporción (sin agrandar)"""
+    if width <= max_width and height <= max_height:
+        return width, height
+    scale = min(max_width / width, max_height / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def ppm_bytes(rgb):
+    """Imagen RGB (H,W,3) uint8 como PPM binario, sin compresión"""
+    height, width = rgb.shape[:2]
+    return b"P6 %d %d 255\n" % (width, height) + rgb.tobytes()
+
+
+class FrameRenderer:
+    """Prepara frames BGR para Tk y los muestra en un Label
+
+    prepare() corre en cualquier hilo; show() solo en el hilo de Tk. Un
+    frame que se descarta sin mostrarlo se devuelve con release().
+    """
+
+    # Buffers libres que se conservan (los que faltan se vuelven a crear)
+    POOL_SIZE = 3
+
+    def __init__(self, max_width=800, max_height=450, use_pil=None):
+        self.max_width = max_width
+        self.max_height = max_height
+        self.use_pil = ImageTk is not None if use_pil is None else use_pil
+        self._lock = threading.Lock()
+        self._source_shape = None
+        self._size = None
+        self._resized = None
+        # Buffers RGB libres: los prestados (en la cola o mostrándose) no están acá
+        self._free = []
+        self._photo = None
+        self._photo_size = None
+
+    def set_bounds(self, max_width, max_height):
+        """Nuevo tamaño disponible (p. ej. desde un evento <Configure> de la ventana)"""
+        with self._lock:
+            if (max_width, max_height) != (self.max_width, self.max_height):
+                self.max_width, self.max_height = max(1, max_width), max(1, max_height)
+                self._source_shape = None
+
+    def _output_size(self, frame):
+        with self._lock:
+            if frame.shape[:2] != self._source_shape:
+                height, width = frame.shape[:2]
+                self._source_shape = frame.shape[:2]
+                self._size = fit_size(width, height, self.max_width, self.max_height)
+                self._resized = None
+                self._free.clear()
+            return self._size
+
+    def prepare(self, frame):
+        """Frame BGR → array RGB listo para show(), sobre buffers reutilizados"""
+        if frame is None or frame.size == 0:
+            return None
+        width, height = self._output_size(frame)
+
+        if (width, height) != (frame.shape[1], frame.shape[0]):
+            if self._resized is None or self._resized.shape[:2] != (height, width):
+                self._resized = np.empty((height, width, 3), dtype=np.uint8)
+            frame = cv2.resize(frame, (width, height), dst=self._resized, interpolation=cv2.INTER_LINEAR)
+
+        with self._lock:
+            buffer = self._free.pop() if self._free else None
+        if buffer is None or buffer.shape != frame.shape:
+            buffer = np.empty_like(frame)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buffer)
+        return buffer
+
+    def release(self, rgb):
+        """Devolver un buffer de prepare() para reutilizarlo"""
+        if rgb is None:
+            return
+        with self._lock:
+            if (len(self._free) < self.POOL_SIZE and self._size is not None
+                    and rgb.shape[:2] == (self._size[1], self._size[0])):
+                self._free.append(rgb)
+
+    def show(self, label, rgb):
+        """Copiar los píxeles a la PhotoImage persistente del label (hilo de Tk)
+
+        Al terminar `rgb` vuelve al renderer: no usarlo después.
+        """
+        try:
+            self._show(label, rgb)
+        finally:
+            self.release(rgb)
+
+    def _show(self, label, rgb):
+        height, width = rgb.shape[:2]
+        if self.use_pil:
+            image = Image.frombuffer("RGB", (width, height), rgb, "raw", "RGB", 0, 1)
+            if self._photo is None or self._photo_size != (width, height):
+                self._photo = ImageTk.PhotoImage(image)
+                self._photo_size = (width, height)
+                label.config(image=self._photo)
+            else:
+                self._photo.paste(image)
+        else:
+            data = ppm_bytes(rgb)
+            if self._photo is None or self._photo_size != (width, height):
+                self._photo = tk.PhotoImage(data=data, format="PPM")
+                self._photo_size = (width, height)
+                label.config(image=self._photo)
+            else:
+                self._photo.configure(data=data, format="PPM")
+        label.image = self._photo  # Mantener referencia
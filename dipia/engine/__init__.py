@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de detección de DIPIA.
+"""
+from .registry import ModelRegistry, registry, get_model, find_model_path
+from .batching import MicroBatcher, QueueFullError
+from .detector import Detector, Detections, build_class_map
+from .classifier import classify_batch, crop_boxes, letterbox
+from .tiling import TiledDetector, nms, tile_grid
+
+__all__ = [
+    "ModelRegistry", "registry", "get_model", "find_model_path",
+    "MicroBatcher", "QueueFullError",
+    "Detector", "Detections", "build_class_map",
+    "classify_batch", "crop_boxes", "letterbox",
+    "TiledDetector", "nms", "tile_grid",
+]
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Backends de inferencia: PyTorch (.pt), ONNX Runtime y OpenVINO.
+
+`export_model` convierte un .pt de ultralytics a ONNX y/u OpenVINO junto
+al archivo original (opcionalmente cuantizado a INT8). Al cargar, el
+backend más rápido disponible se elige solo: en CPU, OpenVINO y luego
+ONNX Runtime si su runtime está instalado y hay un exportado al día; si
+no, o si el exportado no carga, se usa el .pt con PyTorch. Todos los
+backends devuelven resultados de ultralytics, así que `Detector` y
+`classify_batch` no cambian.
+
+    master_model.pt
+    master_model.onnx                  ONNX FP32
+    master_model.int8.onnx             ONNX INT8 (calibrado con imágenes)
+    master_model_openvino_model/       OpenVINO FP32
+    master_model_int8_openvino_model/  OpenVINO INT8 (calibrado con un dataset)
+"""
+import importlib.util
+import logging
+import os
+
+import numpy as np
+
+log = logging.getLogger("dipia.engine")
+
+BACKENDS = ("torch", "onnx", "openvino")
+# Orden de preferencia en CPU para "auto"
+CPU_PREFERENCE = ("openvino", "onnx")
+# Módulo que necesita cada backend exportado
+RUNTIMES = {"onnx": "onnxruntime", "openvino": "openvino"}
+
+
+def runtime_available(backend):
+    """¿Está instalado el runtime del backend?"""
+    if backend == "torch":
+        return True
+    return importlib.util.find_spec(RUNTIMES[backend]) is not None
+
+
+def _cuda_available():
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+
+def backend_of(path):
+    """Backend que corresponde a un archivo o carpeta de modelo"""
+    if path.endswith(".onnx"):
+        return "onnx"
+    if path.rstrip(os.sep).endswith("_openvino_model"):
+        return "openvino"
+    return "torch"
+
+
+def exported_paths(path, backend, int8=False):
+    """Rutas candidatas del exportado de `path` para `backend`, la preferida primero"""
+    stem = os.path.splitext(path)[0]
+    if backend == "onnx":
+        paths = [f"{stem}.int8.onnx", f"{stem}.onnx"]
+    elif backend == "openvino":
+        paths = [f"{stem}_int8_openvino_model", f"{stem}_openvino_model"]
+    else:
+        return [path]
+    return paths if int8 else paths[1:]
+
+
+def _is_current(exported, source):
+    """El exportado existe y no es más viejo que el .pt del que salió"""
+    try:
+        return os.path.getmtime(exported) >= os.path.getmtime(source)
+    except OSError:
+        return False
+
+
+def resolve_model(path, backend="auto", int8=False):
+    """Elegir (ruta, backend) para cargar el modelo `path`
+
+    `backend` es "auto", "torch", "onnx" u "openvino". Con un backend
+    explícito sin runtime o sin exportado se vuelve a PyTorch.
+    """
+    if backend_of(path) != "torch":
+        return path, backend_of(path)
+    if backend == "torch":
+        return path, "torch"
+    if backend == "auto":
+        # Con GPU el .pt en CUDA ya es lo más rápido
+        candidates = () if _cuda_available() else CPU_PREFERENCE
+    elif backend in RUNTIMES:
+        candidates = (backend,)
+    else:
+        raise ValueError(f"backend desconocido: {backend} (opciones: auto, {', '.join(BACKENDS)})")
+
+    for candidate in candidates:
+        if not runtime_available(candidate):
+            if backend != "auto":
+                log.warning("Backend %s sin runtime (%s); se usa PyTorch", candidate, RUNTIMES[candidate])
+            continue
+        for exported in exported_paths(path, candidate, int8):
+            if _is_current(exported, path):
+                return exported, candidate
+            if os.path.exists(exported):
+                log.warning("%s es más viejo que %s; se ignora (volver a exportar)", exported, path)
+        if backend != "auto":
+            log.warning("No hay exportado %s de %s; se usa PyTorch", candidate, path)
+    return path, "torch"
+
+
+def _load_yolo(path, task=None):
+    from ultralytics import YOLO
+    return YOLO(path, task=task)
+
+
+def load_model(path, backend="auto", int8=False, task=None, loader=None):
+    """Cargar el modelo con el backend elegido; devuelve (modelo, ruta, backend)
+
+    Si el exportado no carga se usa el .pt, así un exportado roto nunca
+    deja al servidor sin modelo.
+    """
+    loader = loader or (lambda p: _load_yolo(p, task))
+    resolved, chosen = resolve_model(path, backend, int8)
+    if chosen == "torch":
+        return loader(path), path, "torch"
+    try:
+        return loader(resolved), resolved, chosen
+    except Exception as e:
+        log.warning("No se pudo cargar %s con %s (%s); se usa PyTorch", resolved, chosen, e)
+        return loader(path), path, "torch"
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+
+def calibration_images(data, limit=64):
+    """Imágenes de calibración: una carpeta o el YAML de un dataset (su split val)"""
+    if os.path.isdir(data):
+        folders = [data]
+    else:
+        from ultralytics.data.utils import check_det_dataset
+        val = check_det_dataset(data)["val"]
+        folders = val if isinstance(val, list) else [val]
+
+    images = []
+    for folder in folders:
+        for root, _, names in os.walk(folder):
+            images.extend(os.path.join(root, n) for n in sorted(names) if n.lower().endswith(IMAGE_EXTENSIONS))
+    if not images:
+        raise ValueError(f"no hay imágenes de calibración en {data}")
+    # Repartidas por todo el dataset, no solo las primeras
+    step = max(1, len(images) // limit)
+    return images[::step][:limit]
+
+
+def _calibration_reader(images, input_name, imgsz):
+    """Lector de calibración con el mismo preprocesado que ultralytics (letterbox, RGB, 0-1)"""
+    import cv2
+    from onnxruntime.quantization import CalibrationDataReader
+
+    from .classifier import letterbox
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(images)
+
+        def get_next(self):
+            for path in self._paths:
+                image = cv2.imread(path)
+                if image is None:
+                    continue
+                blob = letterbox(image, imgsz)[:, :, ::-1].transpose(2, 0, 1)
+                return {input_name: (blob[None].astype(np.float32) / 255.0)}
+            return None
+
+    return Reader()
+
+
+def _quantize_onnx(source, target, data, imgsz):
+    """INT8 estático (QDQ) de las convoluciones, calibrado con imágenes reales
+
+    La cuantización dinámica no acelera las convoluciones en CPU (solo
+    las MatMul); la estática sí, pero necesita rangos de activación
+    medidos sobre imágenes como las de producción.
+    """
+    import tempfile
+
+    import onnxruntime
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    input_name = onnxruntime.InferenceSession(source, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    with tempfile.TemporaryDirectory() as folder:
+        # Plegar constantes antes: sin esto los sesgos de la cabeza no se cuantizan y no hay ganancia
+        prepared = os.path.join(folder, "prepared.onnx")
+        quant_pre_process(source, prepared, skip_symbolic_shape=True)
+        quantize_static(
+            prepared, target, _calibration_reader(calibration_images(data), input_name, imgsz),
+            quant_format=QuantFormat.QDQ, per_channel=True,
+            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+            op_types_to_quantize=["Conv"],
+        )
+    return target
+
+
+def export_model(path, formats=("onnx",), int8=False, imgsz=None, batch=8, data=None):
+    """Exportar un .pt de ultralytics; devuelve {backend: ruta}
+
+    Los exportados tienen lote y tamaño de entrada dinámicos (lote hasta
+    `batch`) para el micro-batching y los recortes del clasificador. El
+    INT8 se calibra con `data`: el YAML del dataset de entrenamiento
+    (OpenVINO y ONNX) o una carpeta de imágenes (solo ONNX).
+    """
+    unknown = set(formats) - set(RUNTIMES)
+    if unknown:
+        raise ValueError(f"formato desconocido: {', '.join(sorted(unknown))}")
+    if int8 and not data:
+        raise ValueError("la cuantización INT8 necesita imágenes de calibración (data=dataset.yaml o carpeta)")
+    if int8 and "openvino" in formats and os.path.isdir(data):
+        raise ValueError("el INT8 de OpenVINO se calibra con el YAML del dataset, no con una carpeta")
+
+    model = _load_yolo(path)
+    options = {"dynamic": True, "batch": batch}
+    if imgsz:
+        options["imgsz"] = imgsz
+    exported = {}
+    if "onnx" in formats:
+        onnx_path = model.export(format="onnx", **options)
+        if int8:
+            calibration_size = imgsz or (224 if model.task == "classify" else 640)
+            onnx_path = _quantize_onnx(onnx_path, f"{os.path.splitext(path)[0]}.int8.onnx", data, calibration_size)
+        exported["onnx"] = onnx_path
+    if "openvino" in formats:
+        kwargs = {"int8": True, "data": data} if int8 else {}
+        exported["openvino"] = model.export(format="openvino", **options, **kwargs)
+    return {backend: str(p).rstrip(os.sep) for backend, p in exported.items()}
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-batching de inferencias.
+
+Las peticiones concurrentes dejan su imagen en una cola acotada; un hilo
+de trabajo junta hasta `max_batch_size` imágenes o espera como máximo
+`max_wait_ms`, hace una sola llamada a predict() con todo el lote y
+devuelve a cada petición su resultado.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class QueueFullError(Exception):
+    """La cola de inferencia está llena (el servidor está saturado)"""
+
+
+class _Request:
+    __slots__ = ("image", "future", "enqueued_at")
+
+    def __init__(self, image):
+        self.image = image
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 2)
+
+
+class MicroBatcher:
+    """Agrupa imágenes de varias peticiones en una sola llamada a predict"""
+
+    def __init__(self, predict_batch, max_batch_size=8, max_wait_ms=10,
+                 max_queue=64, name="detector"):
+        # predict_batch(lista_de_imagenes) -> lista de resultados, mismo orden
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.name = name
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._running = True
+
+        # Métricas (ventana de las últimas muestras)
+        self._stats_lock = threading.Lock()
+        self._queue_ms = deque(maxlen=512)
+        self._inference_ms = deque(maxlen=512)
+        self._batch_sizes = deque(maxlen=512)
+        self._total_images = 0
+        self._total_batches = 0
+        self._rejected = 0
+        self._errors = 0
+
+        self._worker = threading.Thread(target=self._run, name=f"batcher-{name}")
+        self._worker.daemon = True
+        self._worker.start()
+
+    def submit(self, image, timeout=None):
+        """Encolar una imagen y esperar su resultado"""
+        return self.submit_async(image).result(timeout=timeout)
+
+    def submit_async(self, image):
+        """Encolar una imagen y devolver un Future con su resultado"""
+        if not self._running:
+            raise RuntimeError(f"Batcher {self.name} detenido")
+        request = _Request(image)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            raise QueueFullError(
+                f"Cola de inferencia llena ({self._queue.maxsize} peticiones)"
+            )
+        if not self._running:
+            # stop() corrió entre la verificación y el put: que nadie quede esperando
+            self._fail_pending()
+        return request.future
+
+    def _collect(self):
+        """Tomar el primer elemento y completar el lote hasta el límite o timeout"""
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect()
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            queue_times = [(started - r.enqueued_at) * 1000 for r in batch]
+            try:
+                results = self.predict_batch([r.image for r in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"predict devolvió {len(results)} resultados para {len(batch)} imágenes"
+                    )
+            except Exception as e:
+                with self._stats_lock:
+                    self._errors += 1
+                for r in batch:
+                    r.future.set_exception(e)
+                continue
+            inference_ms = (time.perf_counter() - started) * 1000
+
+            for r, result in zip(batch, results):
+                r.future.set_result(result)
+
+            with self._stats_lock:
+                self._queue_ms.extend(queue_times)
+                self._inference_ms.append(inference_ms)
+                self._batch_sizes.append(len(batch))
+                self._total_images += len(batch)
+                self._total_batches += 1
+
+    def _fail_pending(self):
+        """Resolver con error las peticiones que quedaron en la cola"""
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if not request.future.done():
+                request.future.set_exception(RuntimeError(f"Batcher {self.name} detenido"))
+
+    def stop(self):
+        """Detener el hilo de trabajo; lo que quedó en la cola falla con RuntimeError"""
+        self._running = False
+        self._worker.join(timeout=1)
+        self._fail_pending()
+
+    def stats(self):
+        """Métricas de cola e inferencia"""
+        with self._stats_lock:
+            queue_ms = list(self._queue_ms)
+            inference_ms = list(self._inference_ms)
+            batch_sizes = list(self._batch_sizes)
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self._queue.maxsize,
+                "total_images": self._total_images,
+                "total_batches": self._total_batches,
+                "rejected": self._rejected,
+                "errors": self._errors,
+                "avg_batch_size": (
+                    round(sum(batch_sizes) / len(batch_sizes), 2) if batch_sizes else None
+                ),
+                "queue_ms_p50": _percentile(queue_ms, 50),
+                "queue_ms_p95": _percentile(queue_ms, 95),
+                "inference_ms_p50": _percentile(inference_ms, 50),
+                "inference_ms_p95": _percentile(inference_ms, 95),
+            }
+
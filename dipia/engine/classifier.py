@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Clasificación por lotes de los recortes de cada detección (IA N°2).
+
+Los recortes se llevan a un cuadrado fijo con letterbox (sin deformar ni
+recortar grietas largas y finas) y se clasifican todos en una sola
+llamada a predict().
+"""
+import numpy as np
+
+from .detector import UNKNOWN_PREFIXES
+
+PAD_VALUE = 114
+
+
+def letterbox(image, size):
+    """Redimensionar manteniendo la proporción y rellenar hasta size x size"""
+    import cv2
+
+    height, width = image.shape[:2]
+    scale = size / max(height, width)
+    new_width = max(1, int(round(width * scale)))
+    new_height = max(1, int(round(height * scale)))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    resized = cv2.resize(image, (new_width, new_height), interpolation=interpolation)
+
+    canvas = np.full((size, size, 3), PAD_VALUE, dtype=np.uint8)
+    top = (size - new_height) // 2
+    left = (size - new_width) // 2
+    canvas[top:top + new_height, left:left + new_width] = resized
+    return canvas
+
+
+def crop_boxes(image, boxes, min_size=8):
+    """Recortar cada caja; devuelve (recortes, índices de las cajas válidas)"""
+    height, width = image.shape[:2]
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    x1 = np.clip(boxes[:, 0], 0, width)
+    y1 = np.clip(boxes[:, 1], 0, height)
+    x2 = np.clip(boxes[:, 2], 0, width)
+    y2 = np.clip(boxes[:, 3], 0, height)
+
+    # Cajas degeneradas o demasiado pequeñas para clasificar
+    valid = np.flatnonzero(((x2 - x1) >= min_size) & ((y2 - y1) >= min_size))
+    crops = [image[y1[i]:y2[i], x1[i]:x2[i]] for i in valid]
+    return crops, valid.tolist()
+
+
+def _names_lookup(names, index, unknown="Class_"):
+    if names is None:
+        return f"{unknown}{index}"
+    if isinstance(names, dict):
+        return str(names.get(index, f"{unknown}{index}"))
+    return str(names[index])
+
+
+def top1(result, unknown="Class_"):
+    """(nombre, confianza) de la clase más probable de un resultado"""
+    if getattr(result, "probs", None) is not None:
+        probs = result.probs.data
+        if hasattr(probs, "cpu"):
+            probs = probs.cpu().numpy()
+        probs = np.asarray(probs).reshape(-1)
+        index = int(probs.argmax())
+        return _names_lookup(getattr(result, "names", None), index, unknown), float(probs[index])
+
+    boxes = getattr(result, "boxes", None)
+    if boxes is not None and len(boxes) > 0:
+        data = boxes.data
+        if hasattr(data, "cpu"):
+            data = data.cpu().numpy()
+        best = int(np.asarray(data)[:, -2].argmax())
+        index = int(data[best, -1])
+        return _names_lookup(getattr(result, "names", None), index, unknown), float(data[best, -2])
+
+    return None, 0.0
+
+
+def classify_batch(model, crops, imgsz=224, lock=None, language="en"):
+    """Clasificar todos los recortes en una sola pasada; lista de (nombre, confianza)"""
+    if not crops:
+        return []
+
+    batch = [letterbox(crop, imgsz) for crop in crops]
+    if lock is None:
+        results = model.predict(batch, imgsz=imgsz, verbose=False)
+    else:
+        with lock:
+            results = model.predict(batch, imgsz=imgsz, verbose=False)
+    unknown = UNKNOWN_PREFIXES.get(language, "Class_")
+    return [top1(result, unknown) for result in results]
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Detector YOLO compartido por el servidor Flask, el backend Hack4edu y las
+aplicaciones de cámara.
+
+Las cajas de cada resultado se copian del dispositivo al host en una sola
+transferencia (`boxes.data`) y se devuelven como arreglos numpy. Las
+etiquetas salen de `model.names`, no de tablas escritas a mano.
+"""
+import numpy as np
+
+from .postprocess import (
+    box_areas, clip_boxes, confidence_mask, label_table, lookup_labels, scale_boxes, serialize,
+)
+
+# Nombre canónico de cada clase según cómo la nombre el modelo
+CANONICAL_NAMES = {
+    "person": "person", "persona": "person",
+    "crack": "crack", "grieta": "crack",
+    "humidity": "humidity", "humedad": "humidity",
+}
+
+# Etiqueta que muestra cada cliente para el nombre canónico
+DISPLAY_LABELS = {
+    "en": {"person": "Person", "crack": "Crack", "humidity": "Humidity"},
+    "es": {"person": "Persona", "crack": "Crack", "humidity": "Humedad"},
+}
+
+
+# Etiqueta de una clase que el modelo no nombra: <prefijo><class_id>
+UNKNOWN_PREFIXES = {"en": "Class_", "es": "Clase_"}
+
+
+def build_class_map(names, language="en"):
+    """Construir {class_id: etiqueta} a partir de `model.names`"""
+    if isinstance(names, dict):
+        items = names.items()
+    else:
+        items = enumerate(names or [])
+
+    display = DISPLAY_LABELS.get(language, {})
+    class_map = {}
+    for class_id, name in items:
+        canonical = CANONICAL_NAMES.get(str(name).strip().lower())
+        class_map[int(class_id)] = display.get(canonical, str(name))
+    return class_map
+
+
+class Detections:
+    """Detecciones de una imagen como arreglos numpy"""
+
+    __slots__ = ("boxes", "scores", "class_ids", "class_map", "_table")
+
+    def __init__(self, boxes, scores, class_ids, class_map, table=None):
+        self.boxes = boxes          # (N, 4) float32, xyxy en píxeles de la imagen original
+        self.scores = scores        # (N,) float32
+        self.class_ids = class_ids  # (N,) int32
+        self.class_map = class_map
+        self._table = table if table is not None else label_table(class_map)
+
+    @classmethod
+    def empty(cls, class_map, table=None):
+        return cls(
+            np.zeros((0, 4), dtype=np.float32),
+            np.zeros((0,), dtype=np.float32),
+            np.zeros((0,), dtype=np.int32),
+            class_map,
+            table,
+        )
+
+    @classmethod
+    def from_result(cls, result, class_map, scale=1.0, table=None, shape=None):
+        """Convertir un resultado de ultralytics con una sola copia al host"""
+        boxes = getattr(result, "boxes", None)
+        if boxes is None or len(boxes) == 0:
+            return cls.empty(class_map, table)
+
+        # data = [x1, y1, x2, y2, (track_id,) conf, cls]
+        data = boxes.data
+        if hasattr(data, "cpu"):
+            data = data.cpu().numpy()
+        data = np.asarray(data, dtype=np.float32)
+
+        xyxy = data[:, :4]
+        if scale != 1.0:
+            # Volver a píxeles de la imagen original sin salirse de ella
+            xyxy = scale_boxes(xyxy, scale)
+            if shape is not None:
+                clip_boxes(xyxy, shape)
+
+        return cls(
+            xyxy,
+            data[:, -2],
+            data[:, -1].astype(np.int32),
+            class_map,
+            table,
+        )
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __getitem__(self, index):
+        """Subconjunto por máscara booleana o índices"""
+        return Detections(
+            self.boxes[index], self.scores[index], self.class_ids[index],
+            self.class_map, self._table,
+        )
+
+    def filter(self, min_conf=0.0, min_area=0.0):
+        """Quitar detecciones con confianza o área por debajo del umbral"""
+        mask = confidence_mask(self.scores, min_conf)
+        if min_area > 0:
+            mask &= box_areas(self.boxes) >= min_area
+        return self if mask.all() else self[mask]
+
+    def rescale(self, scale, shape):
+        """Cajas en la imagen original si se detectó sobre una reducida por `scale`
+
+        `shape` es (alto, ancho) de la imagen original.
+        """
+        if scale == 1.0 or len(self) == 0:
+            return self
+        boxes = clip_boxes(scale_boxes(self.boxes, scale), shape)
+        return Detections(boxes, self.scores, self.class_ids, self.class_map, self._table)
+
+    @property
+    def labels(self):
+        return lookup_labels(self.class_ids, self._table)
+
+    def to_list(self):
+        """Detecciones en el formato JSON de la API"""
+        return serialize(self.boxes, self.scores, self.class_ids, self.labels)
+
+
+class Detector:
+    """Envoltorio de un modelo YOLO con pre y post-procesado comunes"""
+
+    def __init__(self, model, lock=None, language="en", max_width=None, **predict_kwargs):
+        self.model = model
+        self.lock = lock
+        self.max_width = max_width
+        self.predict_kwargs = predict_kwargs
+        self.class_map = build_class_map(getattr(model, "names", None), language)
+        self.label_table = label_table(self.class_map, UNKNOWN_PREFIXES.get(language, "Class_"))
+
+    @classmethod
+    def from_registry(cls, name, filename=None, search_dirs=None, registry=None, **kwargs):
+        """Crear un detector sobre un modelo del registro del proceso"""
+        if registry is None:
+            from .registry import registry
+        model = registry.get(name, filename, search_dirs)
+        return cls(model, lock=registry.inference_lock(name), **kwargs)
+
+    def _prepare(self, image):
+        """Reducir la imagen a `max_width` si hace falta; devuelve (imagen, escala)"""
+        if not self.max_width:
+            return image, 1.0
+        height, width = image.shape[:2]
+        if width <= self.max_width:
+            return image, 1.0
+
+        import cv2
+        scale = self.max_width / width
+        resized = cv2.resize(image, (self.max_width, int(height * scale)))
+        return resized, scale
+
+    def _predict(self, images):
+        if self.lock is None:
+            return list(self.model.predict(images, verbose=False, **self.predict_kwargs))
+        with self.lock:
+            return list(self.model.predict(images, verbose=False, **self.predict_kwargs))
+
+    def predict_batch(self, images):
+        """Detectar en una lista de imágenes BGR con una sola llamada a predict"""
+        prepared = [self._prepare(image) for image in images]
+        results = self._predict([resized for resized, _ in prepared])
+        return [
+            Detections.from_result(result, self.class_map, scale, self.label_table, image.shape)
+            for result, image, (_, scale) in zip(results, images, prepared)
+        ]
+
+    def predict(self, image):
+        """Detectar en una imagen BGR"""
+        return self.predict_batch([image])[0]
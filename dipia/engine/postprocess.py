@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Post-procesado vectorizado de detecciones.
+
+Todas las funciones trabajan sobre los arreglos completos de un frame
+(cajas (N, 4), confianzas (N,), clases (N,)) en lugar de recorrer caja
+por caja.
+"""
+import numpy as np
+
+
+def scale_boxes(boxes, scale):
+    """Llevar cajas de la imagen reducida a la original"""
+    if scale == 1.0:
+        return boxes
+    return boxes / np.float32(scale)
+
+
+def clip_boxes(boxes, shape):
+    """Recortar cajas a los límites (alto, ancho) de la imagen"""
+    height, width = shape[:2]
+    np.clip(boxes[:, 0::2], 0, width, out=boxes[:, 0::2])
+    np.clip(boxes[:, 1::2], 0, height, out=boxes[:, 1::2])
+    return boxes
+
+
+def confidence_mask(scores, min_conf):
+    """Máscara booleana de las detecciones con confianza >= min_conf"""
+    return scores >= np.float32(min_conf)
+
+
+def box_areas(boxes):
+    """Área de cada caja"""
+    return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+
+class LabelTable:
+    """Etiqueta de cada class_id y prefijo de las clases desconocidas (Class_<id>, Clase_<id>)"""
+
+    __slots__ = ("labels", "unknown")
+
+    def __init__(self, labels, unknown="Class_"):
+        self.labels = labels    # arreglo de objetos indexable por class_id
+        self.unknown = unknown
+
+    def __len__(self):
+        return len(self.labels)
+
+
+def label_table(class_map, unknown="Class_"):
+    """Tabla indexable por class_id con la etiqueta de cada clase"""
+    size = max(class_map) + 1 if class_map else 0
+    labels = np.array([f"{unknown}{i}" for i in range(size)], dtype=object)
+    for class_id, label in class_map.items():
+        labels[class_id] = label
+    return LabelTable(labels, unknown)
+
+
+def lookup_labels(class_ids, table):
+    """Etiquetas de un arreglo de clases; las desconocidas quedan como <prefijo><id>"""
+    if len(class_ids) == 0:
+        return []
+    known = (class_ids >= 0) & (class_ids < len(table))
+    if known.all():
+        return table.labels[class_ids].tolist()
+    labels = np.array([f"{table.unknown}{c}" for c in class_ids.tolist()], dtype=object)
+    labels[known] = table.labels[class_ids[known]]
+    return labels.tolist()
+
+
+def serialize(boxes, scores, class_ids, labels):
+    """Lista de dicts de la API a partir de los arreglos del frame"""
+    # tolist() convierte todo el arreglo a tipos de Python de una vez
+    bboxes = boxes.astype(np.int32).tolist()
+    confidences = scores.astype(np.float64).tolist()
+    ids = class_ids.tolist()
+    return [
+        {"label": label, "confidence": confidence, "bbox": bbox, "class_id": class_id}
+        for label, confidence, bbox, class_id in zip(labels, confidences, bboxes, ids)
+    ]
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Registro de modelos de IA compartido por todo el proceso.
+
+Cada modelo (.pt) se carga una sola vez, bajo un lock, y se reutiliza en
+todas las peticiones, con el backend más rápido disponible (ver
+`backends`). Se guardan el backend, el tiempo de carga, el tiempo de
+calentamiento y la memoria consumida para exponerlos en /health.
+"""
+import os
+import threading
+import time
+
+from .backends import load_model, resolve_model
+
+
+def find_model_path(filename, search_dirs=None):
+    """Buscar un archivo de modelo en los directorios candidatos"""
+    if os.path.isabs(filename):
+        return filename if os.path.exists(filename) else None
+
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(package_dir))
+    candidates = list(search_dirs or []) + [project_root, os.getcwd()]
+
+    for directory in candidates:
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def current_memory_mb():
+    """Memoria residente del proceso en MB (None si no se puede medir)"""
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        return rss_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ModelRegistry:
+    """Carga perezosa y thread-safe de modelos, una vez por proceso"""
+
+    def __init__(self, loader=None, backend="auto", int8=False):
+        self._loader = loader
+        self.backend = backend
+        self.int8 = int8
+        self._models = {}
+        self._stats = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+        # predict() de ultralytics no es thread-safe: un lock por modelo
+        self._inference_locks = {}
+
+    def get(self, name, filename=None, search_dirs=None):
+        """Devolver el modelo `name`, cargándolo la primera vez"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            # Otro hilo pudo cargarlo mientras esperábamos el lock
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            path = find_model_path(filename or name, search_dirs)
+            if path is None:
+                error = FileNotFoundError(f"{filename or name} no encontrado")
+                self._errors[name] = str(error)
+                raise error
+
+            memory_before = current_memory_mb()
+            start = time.perf_counter()
+            try:
+                model, path, backend = load_model(path, self.backend, self.int8, loader=self._loader)
+            except Exception as e:
+                self._errors[name] = str(e)
+                raise
+            load_time = time.perf_counter() - start
+            memory_after = current_memory_mb()
+
+            self._models[name] = model
+            self._inference_locks[name] = threading.Lock()
+            self._errors.pop(name, None)
+            self._stats[name] = {
+                "path": path,
+                "backend": backend,
+                "load_time_ms": round(load_time * 1000, 1),
+                "memory_mb": (
+                    round(memory_after - memory_before, 1)
+                    if memory_before is not None and memory_after is not None
+                    else None
+                ),
+                "loaded_at": time.time(),
+                "warmup_ms": None,
+            }
+            return model
+
+    def resolve(self, name, filename=None, search_dirs=None):
+        """(ruta, backend) con que se cargaría `name`, sin cargarlo (None si no existe)"""
+        path = find_model_path(filename or name, search_dirs)
+        if path is None:
+            return None
+        return resolve_model(path, self.backend, self.int8)
+
+    def configure(self, backend="auto", int8=False):
+        """Backend preferido para los modelos que se carguen a partir de ahora"""
+        self.backend = backend
+        self.int8 = int8
+
+    def warmup(self, name, imgsz=640):
+        """Hacer una inferencia de prueba para inicializar el grafo"""
+        import numpy as np
+
+        model = self._models.get(name)
+        if model is None:
+            return None
+
+        dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        start = time.perf_counter()
+        with self.inference_lock(name):
+            model.predict(dummy, verbose=False)
+        warmup_ms = round((time.perf_counter() - start) * 1000, 1)
+        self._stats[name]["warmup_ms"] = warmup_ms
+        return warmup_ms
+
+    def preload(self, name, filename=None, search_dirs=None, warmup=True):
+        """Cargar (y calentar) un modelo al arrancar; no lanza excepciones"""
+        try:
+            self.get(name, filename, search_dirs)
+            if warmup:
+                self.warmup(name)
+            return True
+        except Exception as e:
+            print(f"❌ No se pudo precargar el modelo {name}: {e}")
+            return False
+
+    def inference_lock(self, name):
+        """Lock que serializa las inferencias sobre el modelo `name`"""
+        return self._inference_locks[name]
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def stats(self):
+        """Estado de los modelos para /health"""
+        models = {}
+        for name, stats in self._stats.items():
+            models[name] = dict(stats, loaded=True)
+        for name, error in self._errors.items():
+            models[name] = {"loaded": False, "error": error}
+        memory = current_memory_mb()
+        return {
+            "models": models,
+            "process_memory_mb": round(memory, 1) if memory is not None else None,
+        }
+
+
+# Registro único del proceso
+registry = ModelRegistry()
+
+
+def get_model(name, filename=None, search_dirs=None):
+    """Atajo para obtener un modelo del registro global"""
+    return registry.get(name, filename, search_dirs)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Inferencia por mosaicos para fotos de alta resolución.
+
+Con una sola pasada la imagen completa se reduce al tamaño de entrada del
+modelo (640) y las grietas finas de una foto 4K o de dron desaparecen. En
+modo por mosaicos la imagen se corta en ventanas superpuestas de
+`tile_size` píxeles, todas las ventanas (y opcionalmente la imagen
+completa, para los objetos grandes) se infieren en una sola llamada por
+lotes, las cajas se llevan a coordenadas de la imagen y los duplicados de
+las zonas superpuestas se eliminan con NMS por clase.
+"""
+import math
+
+import numpy as np
+
+from .detector import Detections
+
+
+def tile_grid(width, height, tile_size=640, overlap=0.2, max_tiles=16):
+    """Ventanas (x, y, ancho, alto) que cubren la imagen con superposición
+
+    Si hicieran falta más de `max_tiles` ventanas, se agrandan (el modelo
+    las reduce igual a su entrada) hasta entrar en el límite.
+    """
+    if (width <= tile_size and height <= tile_size) or max_tiles <= 1:
+        return [(0, 0, width, height)]
+
+    overlap = min(max(overlap, 0.0), 0.9)
+    size = tile_size
+    while True:
+        stride = max(1, int(size * (1 - overlap)))
+        columns = 1 if width <= size else math.ceil((width - size) / stride) + 1
+        rows = 1 if height <= size else math.ceil((height - size) / stride) + 1
+        if columns * rows <= max_tiles:
+            break
+        size = int(size * 1.25) + 1
+
+    tile_w, tile_h = min(size, width), min(size, height)
+    xs = _positions(width, tile_w, columns)
+    ys = _positions(height, tile_h, rows)
+    return [(x, y, tile_w, tile_h) for y in ys for x in xs]
+
+
+def _positions(length, size, count):
+    """Inicios de `count` ventanas repartidas de borde a borde"""
+    if count <= 1:
+        return [0]
+    step = (length - size) / (count - 1)
+    return [int(round(i * step)) for i in range(count)]
+
+
+def box_iou(box, boxes):
+    """IoU de una caja contra un arreglo de cajas (N, 4)"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-6)
+
+
+def nms(boxes, scores, class_ids, iou_threshold=0.5):
+    """Índices que sobreviven a NMS por clase, de mayor a menor confianza"""
+    if len(scores) == 0:
+        return np.zeros((0,), dtype=np.int64)
+    # Desplazar cada clase para que cajas de clases distintas nunca se solapen
+    offset = class_ids.astype(np.float32)[:, None] * (boxes.max() + 1)
+    shifted = boxes + offset
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while len(order):
+        best = order[0]
+        keep.append(best)
+        if len(order) == 1:
+            break
+        rest = order[1:]
+        order = rest[box_iou(shifted[best], shifted[rest]) <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def merge_tiles(results, tiles, class_map, table=None, iou_threshold=0.5):
+    """Unir las detecciones de cada ventana en coordenadas de la imagen"""
+    parts = [r for r in results if len(r)]
+    if not parts:
+        return Detections.empty(class_map, table)
+    boxes = np.concatenate([
+        r.boxes + np.array([x, y, x, y], dtype=np.float32)
+        for r, (x, y, _, _) in zip(results, tiles) if len(r)
+    ])
+    scores = np.concatenate([r.scores for r in parts])
+    class_ids = np.concatenate([r.class_ids for r in parts])
+    keep = nms(boxes, scores, class_ids, iou_threshold)
+    return Detections(boxes[keep], scores[keep], class_ids[keep], class_map, table)
+
+
+class TiledDetector:
+    """Detector por mosaicos sobre un `Detector` existente (mismo modelo y lock)"""
+
+    def __init__(self, detector, tile_size=640, overlap=0.2, max_tiles=16, iou_threshold=0.5,
+                 include_full=True, batch_size=None):
+        self.detector = detector
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.max_tiles = max_tiles
+        self.iou_threshold = iou_threshold
+        self.include_full = include_full
+        # Por defecto todas las ventanas de una imagen (y la completa) en un solo lote
+        if batch_size is None:
+            batch_size = max_tiles + (1 if include_full else 0)
+        self.batch_size = max(1, int(batch_size))
+
+    @property
+    def decode_size(self):
+        """Lado mayor con el que conviene decodificar: más resolución no la aprovechan las ventanas"""
+        return self.tile_size * max(1, math.isqrt(self.max_tiles))
+
+    def params(self):
+        """Parámetros que cambian el resultado (parte de la clave de la caché)"""
+        return {
+            "tile": self.tile_size, "overlap": self.overlap, "max_tiles": self.max_tiles,
+            "nms": self.iou_threshold, "full": self.include_full, "decode": self.decode_size,
+        }
+
+    def tiles(self, image):
+        height, width = image.shape[:2]
+        tiles = tile_grid(width, height, self.tile_size, self.overlap, self.max_tiles)
+        if self.include_full and len(tiles) > 1:
+            tiles.append((0, 0, width, height))
+        return tiles
+
+    def predict_batch(self, images):
+        """Detectar en una lista de imágenes BGR; las ventanas van en lotes de `batch_size`"""
+        plans = [self.tiles(image) for image in images]
+        # Las ventanas son vistas de la imagen (sin copiar píxeles)
+        crops = [image[y:y + h, x:x + w] for image, tiles in zip(images, plans) for x, y, w, h in tiles]
+        results = []
+        for i in range(0, len(crops), self.batch_size):
+            results.extend(self.detector.predict_batch(crops[i:i + self.batch_size]))
+
+        merged, start = [], 0
+        for tiles in plans:
+            merged.append(merge_tiles(
+                results[start:start + len(tiles)], tiles,
+                self.detector.class_map, self.detector.label_table, self.iou_threshold,
+            ))
+            start += len(tiles)
+        return merged
+
+    def predict(self, image):
+        return self.predict_batch([image])[0]
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Historial persistente de detecciones y consultas agregadas.
+
+Cada objeto detectado (por la app de escritorio o por /analyze_image) se
+agrega a `detection_log`. Las escrituras se acumulan y se hacen por lotes
+en un hilo aparte; en la misma transacción se actualizan los agregados
+por minuto y por hora (`detection_rollup`) y el histograma de confianza
+por hora (`detection_confidence_hist`). Las consultas del dashboard leen
+solo los agregados, así que su costo depende del rango pedido y no de la
+cantidad de detecciones guardadas.
+"""
+import collections
+import logging
+import threading
+import time
+
+log = logging.getLogger("dipia.history")
+
+# Usuario de las detecciones sin sesión (app de escritorio)
+SHARED_USER = 0
+
+BUCKETS = {"minute": 60, "hour": 3600, "day": 86400}
+HIST_BINS = 10
+
+
+def rows_from_batch(batch, user_id=SHARED_USER, source="camera"):
+    """Filas de detection_log para un lote de detecciones
+
+    Si el lote viene del tracker (detecciones con track_id), se registra
+    cada objeto una sola vez, con su evento "appeared"; el estado que se
+    reenvía periódicamente no se vuelve a guardar.
+    """
+    detections = batch.get("detections") or []
+    if any("track_id" in d for d in detections) or batch.get("events"):
+        detections = [e for e in batch.get("events") or [] if e.get("event") == "appeared"]
+
+    ts = float(batch.get("timestamp") or time.time())
+    device_id = str(batch.get("device_id") or "default")
+    camera_index = int(batch.get("camera_index") or 0)
+    rows = []
+    for detection in detections:
+        bbox = detection.get("bbox") or [None] * 4
+        rows.append((
+            float(detection.get("timestamp") or ts), user_id, device_id, camera_index, source,
+            detection["label"], float(detection["confidence"]), *bbox[:4], detection.get("track_id"),
+        ))
+    return rows
+
+
+def write_rows(conn, rows):
+    """Insertar filas y actualizar los agregados en una sola transacción"""
+    if not rows:
+        return
+    rollup = collections.defaultdict(lambda: [0, 0.0])
+    hist = collections.Counter()
+    for ts, user_id, device_id, camera_index, _, label, confidence, *_ in rows:
+        for resolution in (60, 3600):
+            key = (resolution, user_id, int(ts // resolution), label, device_id, camera_index)
+            rollup[key][0] += 1
+            rollup[key][1] += confidence
+        bin_ = min(max(int(confidence * HIST_BINS), 0), HIST_BINS - 1)
+        hist[(user_id, int(ts // 3600), label, bin_)] += 1
+
+    try:
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO detection_log (ts, user_id, device_id, camera_index, source, label, "
+            "confidence, x1, y1, x2, y2, track_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        conn.executemany(
+            """
+            INSERT INTO detection_rollup (resolution, user_id, bucket, label, device_id, camera_index,
+                                          count, confidence_sum)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO UPDATE SET
+                count = count + excluded.count,
+                confidence_sum = confidence_sum + excluded.confidence_sum
+            """,
+            [(*key, count, total) for key, (count, total) in rollup.items()]
+        )
+        conn.executemany(
+            """
+            INSERT INTO detection_confidence_hist (user_id, hour, label, bin, count)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT DO UPDATE SET count = count + excluded.count
+            """,
+            [(*key, count) for key, count in hist.items()]
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+class DetectionRecorder:
+    """Acumula filas y las escribe por lotes desde un hilo aparte"""
+
+    def __init__(self, pool, batch_size=500, flush_interval=1.0, max_pending=50000):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._write_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="detection-recorder", daemon=True)
+            self._thread.start()
+        return self
+
+    def record(self, rows):
+        """Encolar filas para escribir (no bloquea)"""
+        if not rows:
+            return
+        with self._lock:
+            room = self.max_pending - len(self._pending)
+            if room < len(rows):
+                self.dropped += len(rows) - max(room, 0)
+                rows = rows[:max(room, 0)]
+            self._pending.extend(rows)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Escribir ahora todo lo pendiente"""
+        with self._write_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            with self.pool.connection() as conn:
+                write_rows(conn, rows)
+            self.written += len(rows)
+            self.flushes += 1
+            return len(rows)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Error al guardar el historial de detecciones")
+
+    def stop(self):
+        """Detener el hilo y escribir lo pendiente; devuelve las filas escritas
+
+        El hilo es daemon: lo que no se escriba acá se pierde al salir.
+        """
+        written = self.written
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+        return self.written - written
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {"written": self.written, "pending": pending, "dropped": self.dropped, "flushes": self.flushes}
+
+
+def _scope(user_ids, label=None, device_id=None, camera_index=None):
+    where = [f"user_id IN ({', '.join('?' * len(user_ids))})"]
+    params = list(user_ids)
+    for column, value in (("label", label), ("device_id", device_id), ("camera_index", camera_index)):
+        if value is not None:
+            where.append(f"{column} = ?")
+            params.append(value)
+    return where, params
+
+
+def bucket_counts(conn, user_ids, start, end, bucket="hour", label=None, device_id=None, camera_index=None):
+    """Detecciones por intervalo de tiempo y etiqueta en [start, end)"""
+    size = BUCKETS[bucket]
+    resolution = 60 if size < 3600 else 3600
+    where, params = _scope(user_ids, label, device_id, camera_index)
+    where += ["resolution = ?", "bucket >= ?", "bucket < ?"]
+    params += [resolution, int(start // resolution), -int(-end // resolution)]
+    sql = f"""
+        SELECT (bucket * {resolution}) / {size} * {size} AS t, label,
+               SUM(count), SUM(confidence_sum) / SUM(count)
+        FROM detection_rollup
+        WHERE {' AND '.join(where)}
+        GROUP BY t, label
+        ORDER BY t, label
+    """
+    return [
+        {"bucket": row[0], "label": row[1], "count": row[2], "avg_confidence": round(row[3], 4)}
+        for row in conn.execute(sql, params)
+    ]
+
+
+def confidence_histogram(conn, user_ids, start, end, label=None):
+    """Histograma de confianza (10 intervalos) por etiqueta en [start, end)"""
+    where, params = _scope(user_ids, label)
+    where += ["hour >= ?", "hour < ?"]
+    params += [int(start // 3600), -int(-end // 3600)]
+    sql = f"""
+        SELECT label, bin, SUM(count) FROM detection_confidence_hist
+        WHERE {' AND '.join(where)}
+        GROUP BY label, bin
+    """
+    histograms = {}
+    for label_, bin_, count in conn.execute(sql, params):
+        histograms.setdefault(label_, [0] * HIST_BINS)[bin_] = count
+    return histograms
+
+
+def label_trends(conn, user_ids, days=7, now=None):
+    """Por etiqueta: detecciones por día en los últimos `days` días y
+    variación respecto de los `days` días anteriores"""
+    now = time.time() if now is None else now
+    end = (int(now // 86400) + 1) * 86400
+    start = end - days * 86400
+    previous_start = start - days * 86400
+
+    where, params = _scope(user_ids)
+    where += ["resolution = 3600", "bucket >= ?", "bucket < ?"]
+    params += [previous_start // 3600, end // 3600]
+    sql = f"""
+        SELECT bucket * 3600 / 86400 * 86400 AS day, label, SUM(count)
+        FROM detection_rollup
+        WHERE {' AND '.join(where)}
+        GROUP BY day, label
+    """
+    trends = {}
+    for day, label, count in conn.execute(sql, params):
+        trend = trends.setdefault(label, {
+            "label": label, "count": 0, "previous": 0,
+            "daily": {start + i * 86400: 0 for i in range(days)},
+        })
+        if day >= start:
+            trend["count"] += count
+            trend["daily"][day] = count
+        else:
+            trend["previous"] += count
+
+    result = []
+    for trend in trends.values():
+        previous = trend["previous"]
+        trend["change"] = round((trend["count"] - previous) / previous, 4) if previous else None
+        trend["daily"] = [{"day": day, "count": count} for day, count in sorted(trend["daily"].items())]
+        result.append(trend)
+    return sorted(result, key=lambda t: -t["count"])
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Concentrador de detecciones en vivo por dispositivo y cámara.
+
+Cada stream (dispositivo + índice de cámara) guarda sus últimos lotes en
+un buffer circular con un número de secuencia creciente, así un cliente
+puede pedir solo lo nuevo (since=<seq>). Dos backends:
+
+- MemoryHubBackend: dentro del proceso (servidor de desarrollo, un worker).
+- SQLiteHubBackend: archivo SQLite en WAL compartido por todos los
+  procesos del servidor (varios workers de gunicorn ven los mismos datos).
+"""
+import collections
+import json
+import threading
+import time
+
+from .db import SQLitePool
+
+DEFAULT_DEVICE = "default"
+
+
+def stream_key(device_id, camera_index):
+    return f"{device_id}:{camera_index}"
+
+
+class MemoryHubBackend:
+    """Buffers circulares en memoria, uno por stream"""
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def append(self, device_id, camera_index, batch):
+        key = stream_key(device_id, camera_index)
+        now = time.time()
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                stream = self._streams[key] = {
+                    "device_id": device_id,
+                    "camera_index": camera_index,
+                    "buffer": collections.deque(maxlen=self.capacity),
+                    "last_seq": 0,
+                    "detections": 0,
+                    "first_seen": now,
+                }
+            stream["last_seq"] += 1
+            stream["detections"] += len(batch.get("detections") or [])
+            stream["last_seen"] = now
+            batch = dict(batch, seq=stream["last_seq"])
+            stream["buffer"].append(batch)
+            return batch["seq"]
+
+    def read(self, device_id, camera_index, since=0, limit=None):
+        with self._lock:
+            stream = self._streams.get(stream_key(device_id, camera_index))
+            if stream is None:
+                return []
+            batches = [b for b in stream["buffer"] if b["seq"] > since]
+        return batches[:limit] if limit else batches
+
+    def latest(self, device_id=None, camera_index=None):
+        with self._lock:
+            candidates = [
+                s for s in self._streams.values()
+                if (device_id is None or s["device_id"] == device_id)
+                and (camera_index is None or s["camera_index"] == camera_index)
+                and s["buffer"]
+            ]
+            if not candidates:
+                return None
+            return max(candidates, key=lambda s: s["last_seen"])["buffer"][-1]
+
+    def streams(self):
+        with self._lock:
+            return [
+                {
+                    "device_id": s["device_id"],
+                    "camera_index": s["camera_index"],
+                    "last_seq": s["last_seq"],
+                    "buffered": len(s["buffer"]),
+                    "detections": s["detections"],
+                    "first_seen": s["first_seen"],
+                    "last_seen": s["last_seen"],
+                }
+                for s in self._streams.values()
+            ]
+
+
+class SQLiteHubBackend:
+    """Buffers circulares en un archivo SQLite compartido entre procesos"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS hub_streams (
+            stream TEXT PRIMARY KEY,
+            device_id TEXT NOT NULL,
+            camera_index INTEGER NOT NULL,
+            last_seq INTEGER NOT NULL DEFAULT 0,
+            detections INTEGER NOT NULL DEFAULT 0,
+            first_seen REAL NOT NULL,
+            last_seen REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS hub_batches (
+            stream TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            PRIMARY KEY (stream, seq)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path, capacity=100, pool_size=4):
+        self.capacity = capacity
+        self.pool = SQLitePool(path, size=pool_size)
+        with self.pool.connection() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def append(self, device_id, camera_index, batch):
+        key = stream_key(device_id, camera_index)
+        now = time.time()
+        count = len(batch.get("detections") or [])
+        with self.pool.connection() as conn:
+            # BEGIN IMMEDIATE: el número de secuencia es único aunque escriban varios procesos
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = conn.execute(
+                    """
+                    INSERT INTO hub_streams (stream, device_id, camera_index, last_seq, detections,
+                                             first_seen, last_seen)
+                    VALUES (?, ?, ?, 1, ?, ?, ?)
+                    ON CONFLICT(stream) DO UPDATE SET
+                        last_seq = last_seq + 1,
+                        detections = detections + excluded.detections,
+                        last_seen = excluded.last_seen
+                    RETURNING last_seq
+                    """,
+                    (key, device_id, camera_index, count, now, now)
+                ).fetchone()[0]
+                batch = dict(batch, seq=seq)
+                conn.execute(
+                    "INSERT INTO hub_batches (stream, seq, payload) VALUES (?, ?, ?)",
+                    (key, seq, json.dumps(batch))
+                )
+                conn.execute(
+                    "DELETE FROM hub_batches WHERE stream = ? AND seq <= ?",
+                    (key, seq - self.capacity)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return seq
+
+    def read(self, device_id, camera_index, since=0, limit=None):
+        sql = "SELECT payload FROM hub_batches WHERE stream = ? AND seq > ? ORDER BY seq"
+        params = [stream_key(device_id, camera_index), since]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self.pool.connection() as conn:
+            return [json.loads(row[0]) for row in conn.execute(sql, params)]
+
+    def latest(self, device_id=None, camera_index=None):
+        where, params = [], []
+        if device_id is not None:
+            where.append("s.device_id = ?")
+            params.append(device_id)
+        if camera_index is not None:
+            where.append("s.camera_index = ?")
+            params.append(camera_index)
+        sql = (
+            "SELECT b.payload FROM hub_streams s "
+            "JOIN hub_batches b ON b.stream = s.stream AND b.seq = s.last_seq "
+            + (f"WHERE {' AND '.join(where)} " if where else "")
+            + "ORDER BY s.last_seen DESC LIMIT 1"
+        )
+        with self.pool.connection() as conn:
+            row = conn.execute(sql, params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def streams(self):
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT s.device_id, s.camera_index, s.last_seq,
+                       (SELECT COUNT(*) FROM hub_batches b WHERE b.stream = s.stream),
+                       s.detections, s.first_seen, s.last_seen
+                FROM hub_streams s
+                """
+            ).fetchall()
+        keys = ("device_id", "camera_index", "last_seq", "buffered", "detections", "first_seen", "last_seen")
+        return [dict(zip(keys, row)) for row in rows]
+
+
+class DetectionHub:
+    """Lotes de detecciones por dispositivo/cámara sobre un backend intercambiable"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @classmethod
+    def from_config(cls, backend="memory", capacity=100, path=None):
+        if backend == "sqlite":
+            return cls(SQLiteHubBackend(path, capacity))
+        if backend == "memory":
+            return cls(MemoryHubBackend(capacity))
+        raise ValueError(f"Backend de detecciones desconocido: {backend}")
+
+    def publish(self, batch):
+        """Guardar un lote; devuelve el lote con device_id, camera_index y seq"""
+        device_id = str(batch.get("device_id") or DEFAULT_DEVICE)
+        camera_index = int(batch.get("camera_index") or 0)
+        batch = dict(batch, device_id=device_id, camera_index=camera_index)
+        seq = self.backend.append(device_id, camera_index, batch)
+        return dict(batch, seq=seq)
+
+    def since(self, device_id, camera_index, since=0, limit=None):
+        """Lotes del stream con seq mayor a `since` (los más viejos primero)"""
+        return self.backend.read(device_id, camera_index, since, limit)
+
+    def latest(self, device_id=None, camera_index=None):
+        """Último lote recibido (del stream indicado o de cualquiera)"""
+        return self.backend.latest(device_id, camera_index)
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "streams": self.backend.streams(),
+        }
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Lectura de imágenes subidas a los endpoints de análisis.
+
+El archivo se lee por bloques y se corta apenas supera el máximo de bytes.
+Antes de decodificar se leen solo las dimensiones de la cabecera para
+rechazar imágenes con demasiados píxeles. La decodificación es una sola
+llamada a cv2.imdecode, directo a BGR: si la foto es bastante más grande
+que lo que usa el modelo, se decodifica reducida (IMREAD_REDUCED_*; en
+JPEG la reducción se hace en la propia DCT y nunca se materializa la
+imagen completa). Las cajas detectadas sobre la imagen reducida se llevan
+de vuelta a píxeles de la original con `Detections.rescale`.
+"""
+import io
+import warnings
+
+import cv2
+import numpy as np
+
+try:
+    from PIL import Image
+except ImportError:  # solo se pierde la validación previa de dimensiones
+    Image = None
+
+CHUNK_SIZE = 64 * 1024
+
+# Factor de reducción → flag de imdecode
+REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Orientaciones EXIF que giran la imagen 90° (imdecode las aplica)
+_TRANSPOSED = {5, 6, 7, 8}
+
+
+class ImageRejected(Exception):
+    """La imagen subida no se puede analizar"""
+
+    status = 400
+
+
+class InvalidImage(ImageRejected):
+    """Los bytes no son una imagen que se pueda decodificar"""
+
+
+class ImageTooLarge(ImageRejected):
+    """La imagen supera el máximo de bytes o de píxeles"""
+
+    status = 413
+
+
+class DecodedImage:
+    """Imagen BGR lista para el detector y cómo volver a la original"""
+
+    __slots__ = ("image", "original_size", "scale")
+
+    def __init__(self, image, original_size, scale):
+        self.image = image                  # BGR uint8, posiblemente reducida
+        self.original_size = original_size  # (ancho, alto) de la imagen subida
+        self.scale = scale                  # tamaño decodificado / original
+
+    @property
+    def original_shape(self):
+        width, height = self.original_size
+        return height, width
+
+    def to_original(self, detections):
+        """Detecciones en píxeles de la imagen original"""
+        return detections.rescale(self.scale, self.original_shape)
+
+
+def read_upload(stream, max_bytes, chunk_size=CHUNK_SIZE):
+    """Leer un archivo subido por bloques, sin pasar de `max_bytes` (bytearray)"""
+    buffer = bytearray()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        if max_bytes and len(buffer) > max_bytes:
+            raise ImageTooLarge(f"La imagen supera el máximo de {max_bytes // (1024 * 1024)} MB")
+    return buffer
+
+
+def image_dimensions(data):
+    """(ancho, alto) tal como se verá la imagen, leyendo solo la cabecera
+
+    Devuelve None si no se pueden leer sin decodificar.
+    """
+    if Image is None:
+        return None
+    try:
+        with warnings.catch_warnings():
+            # El límite de píxeles lo controlamos nosotros
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with Image.open(io.BytesIO(data)) as image:
+                width, height = image.size
+                orientation = image.getexif().get(0x0112)
+    except Image.DecompressionBombError:
+        raise ImageTooLarge("La imagen tiene demasiados píxeles")
+    except Exception:
+        return None
+    if orientation in _TRANSPOSED:
+        width, height = height, width
+    return width, height
+
+
+def _decode_with_pil(data):
+    """Formatos que OpenCV no decodifica en esta instalación (p. ej. GIF)"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+    except Exception:
+        return None
+
+
+def reduction_factor(width, height, target_size):
+    """Mayor factor (1, 2, 4 u 8) que deja el lado mayor en al menos `target_size`"""
+    if not target_size:
+        return 1
+    factor = 1
+    while factor < 8 and max(width, height) / (factor * 2) >= target_size:
+        factor *= 2
+    return factor
+
+
+def decode_image(data, max_pixels=None, target_size=None):
+    """Decodificar una sola vez a BGR, reducida si sobra resolución"""
+    size = image_dimensions(data)
+    if size is not None and max_pixels and size[0] * size[1] > max_pixels:
+        raise ImageTooLarge(
+            f"La imagen tiene {size[0] * size[1] / 1e6:.1f} MP (máximo {max_pixels / 1e6:.0f} MP)"
+        )
+
+    factor = reduction_factor(*size, target_size) if size is not None else 1
+    buffer = np.frombuffer(data, np.uint8)
+    image = cv2.imdecode(buffer, REDUCED_FLAGS[factor]) if len(buffer) else None
+    if image is None:
+        image = _decode_with_pil(data)
+    if image is None:
+        raise InvalidImage("Formato de imagen no soportado")
+
+    height, width = image.shape[:2]
+    if size is None:
+        if max_pixels and width * height > max_pixels:
+            raise ImageTooLarge(f"La imagen supera el máximo de {max_pixels / 1e6:.0f} MP")
+        size = (width, height)
+    return DecodedImage(image, size, width / size[0])
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Logging estructurado para el servidor y las aplicaciones de cámara.
+
+- Los registros pasan por una QueueHandler: el hilo que registra (captura
+  de video, petición Flask) solo encola; la escritura a consola la hace
+  un hilo aparte (QueueListener).
+- Salida en JSON (una línea por evento) o en texto legible.
+- IDs de correlación (request_id, frame_id) en contextvars, agregados a
+  cada registro, para seguir un frame desde el cliente de escritorio
+  hasta el servidor.
+- Muestreo de las líneas por frame: solo 1 de cada N se escribe.
+"""
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import uuid
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+frame_id_var = contextvars.ContextVar("frame_id", default=None)
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def new_id():
+    """ID corto para correlacionar registros"""
+    return uuid.uuid4().hex[:12]
+
+
+class ContextFilter(logging.Filter):
+    """Agrega request_id y frame_id del contexto actual a cada registro"""
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        if not hasattr(record, "frame_id"):
+            record.frame_id = frame_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar 1 de cada N registros marcados con extra={"sample": clave}"""
+
+    def __init__(self, every=30):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, "sample", None)
+        if key is None:
+            return True
+        with self._lock:
+            counter = self._counters.setdefault(key, itertools.count())
+            return next(counter) % self.every == 0
+
+
+# Atributos estándar de LogRecord que no se repiten como campos extra
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id", "frame_id", "sample",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea"""
+
+    def format(self, record):
+        event = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.request_id:
+            event["request_id"] = record.request_id
+        if record.frame_id is not None:
+            event["frame_id"] = record.frame_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                event[key] = value
+        if record.exc_info:
+            event["exc"] = self.formatException(record.exc_info)
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato legible con los IDs de correlación al final"""
+
+    def format(self, record):
+        line = f"{time.strftime('%H:%M:%S', time.localtime(record.created))} " \
+               f"{record.levelname:<7} {record.name}: {record.getMessage()}"
+        ids = []
+        if record.request_id:
+            ids.append(f"req={record.request_id}")
+        if record.frame_id is not None:
+            ids.append(f"frame={record.frame_id}")
+        if ids:
+            line += f" [{' '.join(ids)}]"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta registros si la cola está llena en vez de bloquear"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+def setup_logging(level=None, json_output=None, frame_sample=None):
+    """Configurar el logger raíz una vez por proceso (no bloqueante)"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        level = level or os.environ.get("DIPIA_LOG_LEVEL", "INFO")
+        if json_output is None:
+            json_output = os.environ.get("DIPIA_LOG_JSON", "0") == "1"
+        if frame_sample is None:
+            frame_sample = int(os.environ.get("DIPIA_LOG_FRAME_SAMPLE", "30"))
+
+        console = logging.StreamHandler()
+        console.setFormatter(JsonFormatter() if json_output else TextFormatter())
+
+        # El hilo que registra solo encola; la consola la escribe el listener
+        log_queue = queue.Queue(maxsize=10000)
+        queue_handler = _DroppingQueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(frame_sample))
+        queue_handler.addFilter(ContextFilter())
+
+        root = logging.getLogger()
+        root.setLevel(level.upper() if isinstance(level, str) else level)
+        root.addHandler(queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, console, respect_handler_level=True)
+        _listener.start()
+
+
+def shutdown_logging():
+    """Vaciar la cola y detener el hilo de escritura"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def dropped_records():
+    """Registros descartados por cola llena desde el inicio del proceso"""
+    return _DroppingQueueHandler.dropped
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Consulta paginada de materiales.
+
+Paginación por cursor (keyset) sobre (created_at, id) en orden
+descendente: cada página continúa donde terminó la anterior usando el
+índice (user_id, COALESCE(created_at, '')), sin OFFSET. Un created_at
+NULL se ordena como '' (al final) tanto en el ORDER BY como en el cursor.
+"""
+import base64
+import json
+
+# Campos que se pueden pedir con ?fields=
+MATERIAL_FIELDS = (
+    "id", "name", "supplier", "price", "unit", "category", "pathology_related",
+    "image_url", "is_favorite", "usage_count", "created_at",
+)
+
+MAX_LIMIT = 500
+
+# Clave de orden: la misma expresión que el índice de la migración 4
+SORT_KEY = "COALESCE(created_at, '')"
+
+
+def encode_cursor(created_at, material_id):
+    """Cursor opaco a partir del último material de la página"""
+    raw = json.dumps([created_at, material_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, id) del cursor; ValueError si no es válido"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, material_id = json.loads(base64.urlsafe_b64decode(padded))
+        return ("" if created_at is None else str(created_at)), int(material_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+def parse_fields(value):
+    """Lista de campos pedidos (todos si no se indica)"""
+    if not value:
+        return list(MATERIAL_FIELDS)
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in MATERIAL_FIELDS]
+    if unknown:
+        raise ValueError(f"Campos desconocidos: {', '.join(unknown)}")
+    return fields
+
+
+def _normalize(field, value):
+    """Valores por defecto que espera el frontend"""
+    if field == "category":
+        return value if value else 'General'
+    if field in ("pathology_related", "image_url"):
+        return value if value else ''
+    if field == "is_favorite":
+        return bool(value) if value is not None else False
+    if field == "usage_count":
+        return value if value is not None else 0
+    return value
+
+
+def list_materials(conn, user_id, limit=None, cursor=None, category=None,
+                   favorite=None, min_price=None, max_price=None, fields=None):
+    """Página de materiales del usuario; devuelve (materiales, next_cursor)"""
+    fields = list(fields or MATERIAL_FIELDS)
+    # created_at e id siempre se leen para poder armar el siguiente cursor
+    columns = list(dict.fromkeys(fields + ["created_at", "id"]))
+
+    where = ["user_id = ?"]
+    params = [user_id]
+    if category is not None:
+        where.append("category = ?")
+        params.append(category)
+    if favorite is not None:
+        where.append("is_favorite = ?")
+        params.append(1 if favorite else 0)
+    if min_price is not None:
+        where.append("price >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        where.append("price <= ?")
+        params.append(max_price)
+    if cursor is not None:
+        created_at, material_id = decode_cursor(cursor)
+        where.append(f"({SORT_KEY}, id) < (?, ?)")
+        params.extend([created_at, material_id])
+
+    sql = (
+        f"SELECT {', '.join(columns)} FROM materials "
+        f"WHERE {' AND '.join(where)} "
+        f"ORDER BY {SORT_KEY} DESC, id DESC"
+    )
+    if limit is not None:
+        # Una fila extra indica si hay otra página
+        sql += " LIMIT ?"
+        params.append(limit + 1)
+
+    rows = conn.execute(sql, params).fetchall()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = dict(zip(columns, rows[-1]))
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+
+    materials = []
+    for row in rows:
+        values = dict(zip(columns, row))
+        materials.append({field: _normalize(field, values[field]) for field in fields})
+    return materials, next_cursor
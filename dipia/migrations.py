@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Migraciones versionadas del esquema SQLite.
+
+Cada migración se aplica una sola vez, dentro de una transacción, y queda
+registrada en la tabla `schema_migrations`. Al arrancar solo se consulta
+la versión actual; ya no se inspeccionan las columnas con PRAGMA en cada
+inicio.
+
+Para cambiar el esquema se agrega una función al final de MIGRATIONS;
+nunca se modifica una migración ya publicada.
+"""
+import time
+
+
+def _columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [column[1] for column in cursor.fetchall()]
+
+
+def _001_base_schema(cursor):
+    """Tablas users y materials (incluye bases de datos creadas antes de las migraciones)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            full_name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    if 'full_name' not in _columns(cursor, 'users'):
+        cursor.execute("ALTER TABLE users ADD COLUMN full_name TEXT")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS materials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            supplier TEXT NOT NULL,
+            price REAL NOT NULL,
+            unit TEXT NOT NULL,
+            category TEXT DEFAULT 'General',
+            pathology_related TEXT DEFAULT '',
+            image_url TEXT DEFAULT '',
+            is_favorite INTEGER DEFAULT 0,
+            usage_count INTEGER DEFAULT 0,
+            user_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Columnas agregadas a mano en versiones anteriores de init_database
+    material_columns = _columns(cursor, 'materials')
+    added_columns = [
+        ("category", "TEXT DEFAULT 'General'"),
+        ("pathology_related", "TEXT DEFAULT ''"),
+        ("image_url", "TEXT DEFAULT ''"),
+        ("is_favorite", "INTEGER DEFAULT 0"),
+        ("usage_count", "INTEGER DEFAULT 0"),
+    ]
+    for name, definition in added_columns:
+        if name not in material_columns:
+            cursor.execute(f"ALTER TABLE materials ADD COLUMN {name} {definition}")
+
+
+def _002_materials_indexes(cursor):
+    """Índices compuestos para las consultas por usuario"""
+    # GET /materials y /materials/recent: WHERE user_id = ? ORDER BY created_at DESC
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_materials_user_created "
+        "ON materials (user_id, created_at)"
+    )
+    # Filtros por categoría del usuario
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_materials_user_category "
+        "ON materials (user_id, category)"
+    )
+    # /materials/most-used: GROUP BY name dentro del usuario
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_materials_user_name "
+        "ON materials (user_id, name)"
+    )
+
+
+def _003_materials_fts(cursor):
+    """Índice de texto completo (FTS5) de materials para las recomendaciones"""
+    # `owner` es un token por usuario ('u<id>'), indexado: MATCH 'owner : u<id> AND ...'
+    # intersecta en el índice y solo puntúa los materiales del usuario
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS materials_fts_source AS
+        SELECT id, name, category, pathology_related, 'u' || user_id AS owner FROM materials
+    ''')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS materials_fts USING fts5(
+            name, category, pathology_related, owner,
+            content='materials_fts_source', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    # Triggers para mantener el índice sincronizado con la tabla
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS materials_fts_insert AFTER INSERT ON materials BEGIN
+            INSERT INTO materials_fts (rowid, name, category, pathology_related, owner)
+            VALUES (new.id, new.name, new.category, new.pathology_related, 'u' || new.user_id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS materials_fts_delete AFTER DELETE ON materials BEGIN
+            INSERT INTO materials_fts (materials_fts, rowid, name, category, pathology_related, owner)
+            VALUES ('delete', old.id, old.name, old.category, old.pathology_related, 'u' || old.user_id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS materials_fts_update
+        AFTER UPDATE OF name, category, pathology_related, user_id ON materials BEGIN
+            INSERT INTO materials_fts (materials_fts, rowid, name, category, pathology_related, owner)
+            VALUES ('delete', old.id, old.name, old.category, old.pathology_related, 'u' || old.user_id);
+            INSERT INTO materials_fts (rowid, name, category, pathology_related, owner)
+            VALUES (new.id, new.name, new.category, new.pathology_related, 'u' || new.user_id);
+        END
+    ''')
+    # Indexar los materiales que ya existen
+    cursor.execute("INSERT INTO materials_fts (materials_fts) VALUES ('rebuild')")
+
+
+def _004_materials_sort_index(cursor):
+    """Índice de la paginación por cursor de materials (created_at NULL como '')"""
+    # GET /materials: ORDER BY COALESCE(created_at, '') DESC, id DESC
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_materials_user_sort "
+        "ON materials (user_id, COALESCE(created_at, ''))"
+    )
+
+
+def _005_detection_history(cursor):
+    """Historial de detecciones y tablas de agregados (rollups)"""
+    # Registro append-only: una fila por objeto detectado
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS detection_log (
+            id INTEGER PRIMARY KEY,
+            ts REAL NOT NULL,
+            user_id INTEGER NOT NULL DEFAULT 0,
+            device_id TEXT NOT NULL,
+            camera_index INTEGER NOT NULL DEFAULT 0,
+            source TEXT NOT NULL,
+            label TEXT NOT NULL,
+            confidence REAL NOT NULL,
+            x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+            track_id INTEGER
+        )
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_detection_log_user_ts "
+        "ON detection_log (user_id, ts)"
+    )
+    # Conteos por minuto (resolution = 60) y por hora (3600), actualizados
+    # en cada inserción por lotes
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS detection_rollup (
+            resolution INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            label TEXT NOT NULL,
+            device_id TEXT NOT NULL,
+            camera_index INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            confidence_sum REAL NOT NULL,
+            PRIMARY KEY (resolution, user_id, bucket, label, device_id, camera_index)
+        ) WITHOUT ROWID
+    ''')
+    # Histograma de confianza por hora (10 intervalos de 0.1)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS detection_confidence_hist (
+            user_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            label TEXT NOT NULL,
+            bin INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, hour, label, bin)
+        ) WITHOUT ROWID
+    ''')
+
+
+# (versión, función) en orden; la descripción sale del docstring
+MIGRATIONS = [
+    (1, _001_base_schema),
+    (2, _002_materials_indexes),
+    (3, _003_materials_fts),
+    (4, _004_materials_sort_index),
+    (5, _005_detection_history),
+]
+
+
+def current_version(conn):
+    """Versión del esquema registrada en la base de datos (0 si no hay)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at REAL NOT NULL
+        )
+    ''')
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn, migrations=None):
+    """Aplicar las migraciones pendientes; devuelve las versiones aplicadas"""
+    migrations = MIGRATIONS if migrations is None else migrations
+    version = current_version(conn)
+    conn.commit()
+
+    applied = []
+    for target, migration in migrations:
+        if target <= version:
+            continue
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            migration(cursor)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)",
+                (target, (migration.__doc__ or migration.__name__).strip(), time.time())
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(target)
+    return applied
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Piezas del pipeline de video por etapas (captura → IA → render → envío).
+
+Cada etapa corre en su propio hilo y se comunica con la siguiente por una
+cola acotada que descarta el elemento más viejo cuando está llena: una
+etapa lenta nunca frena a la anterior, solo pierde frames intermedios y
+siempre trabaja sobre el más reciente.
+"""
+import collections
+import threading
+import time
+
+
+class DropOldestQueue:
+    """Cola acotada: put() nunca bloquea, descarta el elemento más viejo"""
+
+    def __init__(self, maxsize=1):
+        self.maxsize = max(1, int(maxsize))
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        """Encolar `item`; devuelve el elemento descartado (o None)"""
+        discarded = None
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                discarded = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+        return discarded
+
+    def get(self, timeout=None):
+        """Siguiente elemento, o None si no llega ninguno en `timeout` segundos"""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class FramePacket:
+    """Un frame en tránsito por el pipeline"""
+
+    __slots__ = ("frame_id", "index", "frame", "captured_at", "detections")
+
+    def __init__(self, frame_id, index, frame, captured_at=None, detections=None):
+        self.frame_id = frame_id
+        self.index = index
+        self.frame = frame
+        self.captured_at = time.perf_counter() if captured_at is None else captured_at
+        self.detections = detections
+
+
+class StageStats:
+    """FPS y latencia (ms) de una etapa sobre una ventana deslizante"""
+
+    def __init__(self, name, window=60):
+        self.name = name
+        self._times = collections.deque(maxlen=window)
+        self._latencies = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, latency_ms=None, now=None):
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            self._times.append(now)
+            if latency_ms is not None:
+                self._latencies.append(latency_ms)
+            self.count += 1
+
+    def fps(self, now=None):
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            times = list(self._times)
+        # Frames que ya no llegan no deben seguir contando como FPS actuales
+        if len(times) < 2 or now - times[-1] > 2.0:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def latency_ms(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return 0.0
+        return latencies[len(latencies) // 2]
+
+    def snapshot(self):
+        return {
+            "fps": round(self.fps(), 1),
+            "latency_ms": round(self.latency_ms(), 1),
+            "count": self.count,
+        }
+
+    def summary(self):
+        """Texto corto para la barra de estado"""
+        text = f"{self.name} {self.fps():.0f}fps"
+        latency = self.latency_ms()
+        if latency:
+            text += f" {latency:.0f}ms"
+        return text
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Envío de detecciones de la app de escritorio al servidor Flask.
+
+submit() solo encola (nunca bloquea el video). Un hilo aparte agrupa los
+lotes pendientes en un único POST a /receive_detections/bulk, sobre una
+sesión HTTP persistente (keep-alive). Si el envío falla se reintenta con
+espera exponencial; si la cola se llena se descartan los lotes más viejos.
+Los contadores (enviados, descartados, fallidos, reintentos) quedan en
+stats().
+"""
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .log import REQUEST_ID_HEADER, new_id
+from .pipeline import DropOldestQueue, StageStats
+
+log = logging.getLogger("dipia.publisher")
+
+
+class DetectionPublisher:
+    """Publicador en segundo plano con agrupación y reintentos"""
+
+    def __init__(self, url, max_queue=64, max_batch=16, linger_ms=50, timeout=2.0,
+                 max_retries=3, backoff=0.25, max_backoff=4.0, session=None):
+        self.url = url
+        self.max_batch = max(1, int(max_batch))
+        self.linger = linger_ms / 1000.0
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session = session
+
+        self.queue = DropOldestQueue(max_queue)
+        self.timing = StageStats("publish")
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "sent": 0, "requests": 0, "failed": 0, "retries": 0}
+        self.last_error = None
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="detection-publisher", daemon=True)
+        self._thread.start()
+
+    def submit(self, batch):
+        """Encolar un lote (dict) para enviar; no bloquea"""
+        with self._lock:
+            self._counters["submitted"] += 1
+        self.queue.put(batch)
+
+    def _collect(self):
+        """Primer lote disponible más los que lleguen dentro de `linger`"""
+        first = self.queue.get(timeout=0.1)
+        if first is None:
+            return []
+        batches = [first]
+        deadline = time.monotonic() + self.linger
+        while len(batches) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            batch = self.queue.get(timeout=max(remaining, 0))
+            if batch is None:
+                break
+            batches.append(batch)
+        return batches
+
+    def _post(self, batches):
+        """Un POST con todos los lotes; True si el servidor los aceptó"""
+        request_id = batches[-1].get("frame_id") or new_id()
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                with self._lock:
+                    self._counters["retries"] += 1
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+            try:
+                response = self.session.post(
+                    self.url,
+                    json={"batches": batches},
+                    headers={REQUEST_ID_HEADER: request_id},
+                    timeout=self.timeout
+                )
+                if response.status_code < 500:
+                    if response.status_code != 200:
+                        # Error del cliente: reintentar no cambiaría nada
+                        self.last_error = f"HTTP {response.status_code}"
+                        log.warning("Detecciones rechazadas", extra={"status": response.status_code})
+                        return False
+                    return True
+                self.last_error = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                self.last_error = str(e)
+            if not self._running:
+                break
+        log.warning("No se pudieron enviar detecciones: %s", self.last_error,
+                    extra={"sample": "publish_error", "batches": len(batches)})
+        return False
+
+    def _run(self):
+        while self._running or len(self.queue):
+            batches = self._collect()
+            if not batches:
+                continue
+            start = time.perf_counter()
+            ok = self._post(batches)
+            self.timing.record((time.perf_counter() - start) * 1000)
+            with self._lock:
+                self._counters["requests"] += 1
+                self._counters["sent" if ok else "failed"] += len(batches)
+
+    def stop(self, timeout=2.0):
+        """Enviar lo pendiente (con un límite de tiempo) y detener el hilo"""
+        self._running = False
+        self._thread.join(timeout)
+        self.session.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats.update({
+            "dropped": self.queue.dropped,
+            "pending": len(self.queue),
+            "last_error": self.last_error,
+            **self.timing.snapshot(),
+        })
+        return stats
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Planificación adaptativa de la inferencia en los clientes de cámara.
+
+En lugar de correr la IA cada N frames fijos, el intervalo se calcula a
+partir de la latencia reciente del detector para que la inferencia no use
+más que una fracción del tiempo de cada frame a los FPS objetivo (o a los
+de la cámara, si entrega menos). Si los FPS mostrados caen por debajo de
+esa referencia la fracción se reduce, y se recupera cuando hay margen:
+una cámara lenta (p. ej. con poca luz) no frena la IA. Los frames casi idénticos al último analizado
+(diferencia media sobre una miniatura en gris) no se vuelven a analizar.
+"""
+import collections
+import math
+import time
+
+import cv2
+import numpy as np
+
+# Tamaño de la miniatura para comparar frames (barato de calcular)
+THUMB_SIZE = (32, 18)
+
+
+def frame_thumbnail(frame):
+    """Miniatura en escala de grises para la métrica de diferencia"""
+    small = cv2.resize(frame, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small.astype(np.int16)
+
+
+def frame_difference(a, b):
+    """Diferencia absoluta media (0-255) entre dos miniaturas"""
+    return float(np.abs(a - b).mean())
+
+
+class InferenceScheduler:
+    """Decide en qué frames correr la IA"""
+
+    def __init__(self, target_fps=30, max_busy=0.5, min_interval=1, max_interval=30,
+                 diff_threshold=2.0, smoothing=0.2):
+        self.target_fps = float(target_fps)
+        self.max_busy = float(max_busy)
+        self.busy = self.max_busy
+        self.min_interval = max(1, int(min_interval))
+        self.max_interval = max(self.min_interval, int(max_interval))
+        self.diff_threshold = float(diff_threshold)
+        self.smoothing = float(smoothing)
+
+        self.latency_ms = None
+        self.interval = self.min_interval
+        self._frames_since = None
+        self._last_thumb = None
+        self._inference_times = collections.deque(maxlen=30)
+        # (instante, frames capturados) de cada llamada a should_infer
+        self._captures = collections.deque(maxlen=60)
+        self.inferences = 0
+        self.skipped_static = 0
+
+    def should_infer(self, frame, frames_elapsed=1, now=None):
+        """True si hay que correr la IA sobre este frame
+
+        `frames_elapsed` son los frames capturados desde la última llamada
+        (en un pipeline con descarte de frames puede ser más de 1).
+        """
+        now = time.perf_counter() if now is None else now
+        self._captures.append((now, frames_elapsed))
+        if self._frames_since is None:
+            self._frames_since = self.interval
+        else:
+            self._frames_since += frames_elapsed
+
+        if self._frames_since < self.interval:
+            return False
+
+        # Frame casi igual al último analizado: reutilizar sus detecciones,
+        # salvo que ya se haya esperado el intervalo máximo
+        thumb = frame_thumbnail(frame)
+        if (self._last_thumb is not None and self.diff_threshold > 0
+                and self._frames_since < self.max_interval
+                and frame_difference(thumb, self._last_thumb) < self.diff_threshold):
+            self.skipped_static += 1
+            return False
+
+        self._last_thumb = thumb
+        self._frames_since = 0
+        return True
+
+    def record_inference(self, latency_ms, now=None):
+        """Registrar la latencia de una inferencia y recalcular el intervalo"""
+        now = time.perf_counter() if now is None else now
+        self._inference_times.append(now)
+        self.inferences += 1
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms += self.smoothing * (latency_ms - self.latency_ms)
+        self._update_interval(now)
+
+    def capture_fps(self, now=None):
+        """Frames por segundo que entrega la cámara (0 si no hay datos recientes)"""
+        now = time.perf_counter() if now is None else now
+        captures = list(self._captures)
+        if len(captures) < 2 or now - captures[-1][0] > 2.0:
+            return 0.0
+        elapsed = captures[-1][0] - captures[0][0]
+        if elapsed <= 0:
+            return 0.0
+        return sum(frames for _, frames in captures[1:]) / elapsed
+
+    def reference_fps(self, now=None):
+        """FPS alcanzables: el objetivo, o menos si la cámara no llega"""
+        capture = self.capture_fps(now)
+        return min(self.target_fps, capture) if capture > 0 else self.target_fps
+
+    def observe_display_fps(self, fps, now=None):
+        """Ajustar la fracción de tiempo para IA según los FPS mostrados"""
+        if fps <= 0:
+            return
+        reference = self.reference_fps(now)
+        if fps < 0.9 * reference:
+            self.busy = max(0.05, self.busy * 0.9)
+        elif fps >= 0.98 * reference:
+            self.busy = min(self.max_busy, self.busy * 1.05)
+        self._update_interval(now)
+
+    def _update_interval(self, now=None):
+        if self.latency_ms is None:
+            return
+        # Frames necesarios para que la IA use como mucho `busy` del tiempo
+        frames = (self.latency_ms / 1000.0) * self.reference_fps(now) / self.busy
+        self.interval = min(self.max_interval, max(self.min_interval, math.ceil(frames)))
+
+    def inference_rate(self, now=None):
+        """Inferencias por segundo efectivas (recientes)"""
+        now = time.perf_counter() if now is None else now
+        times = list(self._inference_times)
+        if len(times) < 2 or now - times[-1] > 2.0:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def summary(self):
+        """Texto corto para la barra de estado"""
+        return f"AI {self.inference_rate():.1f}/s every {self.interval}f"
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Recomendación de materiales por patología sobre el índice FTS5.
+
+Los sinónimos de cada patología salen de los alias de clase del detector
+(crack/grieta, humidity/humedad, ...) y de las correcciones del
+diccionario técnico (hack4edu/knowledge/technical_dictionary.json). Todas
+las patologías se resuelven en una sola consulta ordenada. Los términos
+coinciden por palabra o prefijo de palabra ("grie" encuentra "grietas"),
+no como subcadena en cualquier posición.
+"""
+import json
+import os
+from functools import lru_cache
+
+from .engine.detector import CANONICAL_NAMES
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DICTIONARY_PATH = os.path.join(PROJECT_ROOT, "hack4edu", "knowledge", "technical_dictionary.json")
+
+# Prioridad de columnas en bm25: name, category, pathology_related, owner (no puntúa)
+COLUMN_WEIGHTS = (1.0, 2.0, 4.0, 0.0)
+
+
+@lru_cache(maxsize=None)
+def load_synonyms(path=DICTIONARY_PATH):
+    """{término: conjunto de sinónimos} a partir de las correcciones del diccionario"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            dictionary = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ No se pudo leer el diccionario técnico: {e}")
+        dictionary = {}
+
+    # Agrupar los términos coloquiales que corrigen al mismo término técnico
+    groups = {}
+    for language in dictionary.values():
+        for colloquial, technical in language.get("corrections", {}).items():
+            group = groups.setdefault(technical.lower(), {technical.lower()})
+            group.add(colloquial.lower())
+
+    synonyms = {}
+    for group in groups.values():
+        for term in group:
+            synonyms.setdefault(term, set()).update(group)
+    return synonyms
+
+
+def expand_terms(pathology, synonyms=None):
+    """Términos de búsqueda para una patología (ella misma, alias y sinónimos)"""
+    synonyms = load_synonyms() if synonyms is None else synonyms
+    term = pathology.strip().lower()
+    if not term:
+        return []
+
+    terms = {term}
+    canonical = CANONICAL_NAMES.get(term)
+    if canonical:
+        terms.update(alias for alias, name in CANONICAL_NAMES.items() if name == canonical)
+    for alias in list(terms):
+        terms.update(synonyms.get(alias, ()))
+    return sorted(terms)
+
+
+def match_expression(terms, user_id=None):
+    """Expresión MATCH de FTS5: cada término como frase con prefijo
+
+    Con `user_id` se exige además el token del dueño: FTS5 intersecta
+    ambas listas en el índice y solo puntúa los materiales del usuario.
+    """
+    phrases = []
+    for term in terms:
+        escaped = term.replace('"', '""')
+        phrases.append(f'"{escaped}"*')
+    expression = " OR ".join(phrases)
+    if user_id is None:
+        return expression
+    return f'owner : "u{int(user_id)}" AND {{name category pathology_related}} : ({expression})'
+
+
+def recommend_materials(conn, user_id, pathologies, synonyms=None):
+    """Materiales del usuario relacionados con las patologías, ordenados por prioridad"""
+    # Quitar patologías vacías o repetidas, conservando el orden
+    unique = []
+    for pathology in pathologies:
+        if pathology and pathology.strip().lower() not in [p.lower() for p in unique]:
+            unique.append(pathology.strip())
+    if not unique:
+        return []
+
+    hits = []
+    params = []
+    for position, pathology in enumerate(unique):
+        terms = expand_terms(pathology, synonyms)
+        hits.append(
+            "SELECT rowid AS id, ? AS position, bm25(materials_fts, ?, ?, ?, ?) AS rank "
+            "FROM materials_fts WHERE materials_fts MATCH ?"
+        )
+        params.extend([position, *COLUMN_WEIGHTS, match_expression(terms, user_id)])
+
+    # Puntaje de priorización: favoritos +50, +30 por cada 10 usos,
+    # +20 si el precio < 100, +10 si < 500
+    sql = f"""
+        WITH hits AS MATERIALIZED ({" UNION ALL ".join(hits)})
+        SELECT m.id, m.name, m.supplier, m.price, m.unit, m.category,
+               m.pathology_related, m.image_url, m.is_favorite, m.usage_count,
+               group_concat(hits.position) AS positions,
+               MIN(hits.rank) AS rank,
+               (CASE WHEN m.is_favorite THEN 50 ELSE 0 END)
+               + (COALESCE(m.usage_count, 0) / 10) * 30
+               + (CASE WHEN m.price < 100 THEN 20 WHEN m.price < 500 THEN 10 ELSE 0 END) AS score
+        FROM hits
+        JOIN materials m ON m.id = hits.id
+        GROUP BY m.id
+        ORDER BY score DESC, m.price ASC, rank ASC
+    """
+    recommendations = []
+    for row in conn.execute(sql, params):
+        positions = sorted({int(p) for p in row[10].split(",")})
+        recommendations.append({
+            "id": row[0],
+            "name": row[1],
+            "supplier": row[2],
+            "price": row[3],
+            "unit": row[4],
+            "category": row[5] if row[5] else 'General',
+            "pathology_related": row[6] if row[6] else '',
+            "image_url": row[7] if row[7] else '',
+            "is_favorite": bool(row[8]),
+            "usage_count": row[9] if row[9] is not None else 0,
+            "match_reason": ", ".join(unique[p] for p in positions),
+            "score": row[12],
+        })
+    return recommendations
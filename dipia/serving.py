@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Servidor de producción con workers pre-fork (ver serve.py).
+
+El proceso maestro carga los pesos una vez y hace fork de N workers, que
+los comparten copy-on-write. Cada worker lleva sus propias métricas
+(peticiones, errores, latencia, memoria) y las vuelca cada tanto a
+`<directorio>/<pid>.json`; cualquier worker puede juntar las de todos
+para /health/workers sin memoria compartida entre procesos.
+"""
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from .engine.batching import _percentile
+from .engine.registry import current_memory_mb
+
+log = logging.getLogger("dipia.serving")
+
+# Métricas del worker actual (None con el servidor de desarrollo)
+_metrics = None
+
+
+def close_pools(*pools):
+    """Cerrar las conexiones SQLite abiertas antes del fork
+
+    Una conexión heredada por varios procesos corrompe los locks de
+    SQLite: cada worker abre las suyas la primera vez que las necesita.
+    """
+    for pool in pools:
+        if pool is not None:
+            pool.close()
+
+
+def memory_usage():
+    """Memoria del proceso en MB: residente, proporcional (PSS) y privada
+
+    PSS reparte las páginas compartidas entre los procesos que las usan:
+    la suma de los PSS de los workers es lo que ocupan de verdad. Fuera
+    de Linux solo se informa la residente.
+    """
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                fields = line.split()
+                if fields[-1] == "kB":
+                    usage[fields[0].rstrip(":")] = int(fields[1]) / 1024
+    except (OSError, ValueError):
+        rss = current_memory_mb()
+        return {"rss_mb": round(rss, 1) if rss is not None else None, "pss_mb": None, "private_mb": None}
+    private = usage.get("Private_Clean", 0) + usage.get("Private_Dirty", 0)
+    return {
+        "rss_mb": round(usage.get("Rss", 0), 1),
+        "pss_mb": round(usage.get("Pss", 0), 1),
+        "private_mb": round(private, 1),
+    }
+
+
+class WorkerMetrics:
+    """Contadores de un worker, volcados periódicamente a un archivo JSON"""
+
+    def __init__(self, directory, index=0, interval=5.0, extra=None, window=1024):
+        self.directory = directory
+        self.index = index
+        self.interval = interval
+        # extra() -> dict con métricas propias de la app (colas, caché)
+        self.extra = extra
+        self.pid = os.getpid()
+        self.path = os.path.join(directory, f"{self.pid}.json")
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._latency_ms = deque(maxlen=window)
+        self._requests = 0
+        self._errors = 0
+        self._in_flight = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def request_started(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def request_finished(self, elapsed_ms, status):
+        with self._lock:
+            self._in_flight -= 1
+            self._requests += 1
+            if status >= 500:
+                self._errors += 1
+            self._latency_ms.append(elapsed_ms)
+
+    def install(self, app):
+        """Medir todas las peticiones de una app Flask"""
+        from flask import g
+
+        @app.before_request
+        def _metrics_start():
+            g.metrics_start = time.perf_counter()
+            self.request_started()
+
+        @app.after_request
+        def _metrics_status(response):
+            g.metrics_status = response.status_code
+            return response
+
+        @app.teardown_request
+        def _metrics_finish(exception):
+            start = g.pop("metrics_start", None)
+            if start is None:
+                return
+            status = g.pop("metrics_status", 500 if exception is not None else 200)
+            self.request_finished((time.perf_counter() - start) * 1000, status)
+
+        return self
+
+    def snapshot(self):
+        with self._lock:
+            latency = list(self._latency_ms)
+            snapshot = {
+                "pid": self.pid,
+                "index": self.index,
+                "started_at": self.started_at,
+                "updated_at": time.time(),
+                "requests": self._requests,
+                "errors": self._errors,
+                "in_flight": self._in_flight,
+                "latency_ms_p50": _percentile(latency, 50),
+                "latency_ms_p99": _percentile(latency, 99),
+            }
+        snapshot["memory"] = memory_usage()
+        if self.extra is not None:
+            try:
+                snapshot.update(self.extra())
+            except Exception:
+                log.exception("No se pudieron leer las métricas de la app")
+        return snapshot
+
+    def write(self):
+        """Volcar la foto actual (escritura atómica: nunca se lee a medias)"""
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temporary, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                log.exception("No se pudieron escribir las métricas del worker")
+
+    def start(self):
+        self.write()
+        self._thread = threading.Thread(target=self._run, name="worker-metrics", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Dejar de volcar y borrar el archivo (el worker termina)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        remove_worker_file(self.directory, self.pid)
+
+
+def remove_worker_file(directory, pid):
+    try:
+        os.remove(os.path.join(directory, f"{pid}.json"))
+    except OSError:
+        pass
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect(directory):
+    """Métricas de los workers vivos (se descartan las de procesos muertos)"""
+    workers = []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            pid = int(os.path.basename(path)[:-len(".json")])
+        except ValueError:
+            continue
+        if not _alive(pid):
+            remove_worker_file(directory, pid)
+            continue
+        try:
+            with open(path, encoding="utf-8") as f:
+                workers.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # el worker terminó mientras tanto
+    return sorted(workers, key=lambda worker: (worker.get("index", 0), worker.get("pid", 0)))
+
+
+def start_worker_metrics(app, directory, index=0, interval=5.0, extra=None):
+    """Métricas del worker actual, instaladas en `app` (llamar tras el fork)"""
+    global _metrics
+    _metrics = WorkerMetrics(directory, index, interval, extra).install(app).start()
+    return _metrics
+
+
+def stop_worker_metrics():
+    global _metrics
+    if _metrics is not None:
+        _metrics.stop()
+        _metrics = None
+
+
+def workers_report():
+    """Métricas de todos los workers para /health/workers"""
+    if _metrics is None:
+        return {"server": "dev", "workers": []}
+    _metrics.write()  # el que responde, con datos al día
+    workers = collect(_metrics.directory)
+    return {
+        "server": "prefork",
+        "master_pid": os.getppid(),
+        "workers": workers,
+        "totals": {
+            "workers": len(workers),
+            "requests": sum(w["requests"] for w in workers),
+            "errors": sum(w["errors"] for w in workers),
+            "in_flight": sum(w["in_flight"] for w in workers),
+            "pss_mb": round(sum(w["memory"]["pss_mb"] or 0 for w in workers), 1),
+        },
+    }
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Difusión de detecciones en vivo a los visores web (Server-Sent Events).
+
+Cada lote recibido de la app de escritorio se publica una vez y se copia a
+la cola de cada suscriptor. Las colas son acotadas y descartan el lote más
+viejo: un visor lento pierde lotes intermedios (y se le informa cuántos),
+pero nunca frena a quien publica ni a los demás visores. Opcionalmente el
+servidor limita la frecuencia por suscriptor y agrupa los lotes de ese
+intervalo en uno solo (conservando todos los eventos por objeto).
+
+Con el concentrador SQLite (varios workers) los visores no reciben los
+lotes directamente de quien los guarda sino de `HubRelay`, que los lee
+del concentrador compartido.
+"""
+import itertools
+import json
+import logging
+import threading
+import time
+
+from .pipeline import DropOldestQueue
+
+log = logging.getLogger("dipia.stream")
+
+
+class TooManySubscribers(Exception):
+    """Se alcanzó el máximo de visores conectados"""
+
+
+class Subscription:
+    """Un visor conectado"""
+
+    def __init__(self, broadcaster, camera=None, queue_size=16, min_interval=0.0, device=None):
+        self.broadcaster = broadcaster
+        self.camera = camera
+        self.device = device
+        self.queue = DropOldestQueue(queue_size)
+        self.min_interval = min_interval
+        self.last_sent = 0.0
+        self.sent = 0
+
+    @property
+    def dropped(self):
+        return self.queue.dropped
+
+    def wants(self, batch):
+        return ((self.camera is None or batch.get("camera_index") == self.camera)
+                and (self.device is None or batch.get("device_id") == self.device))
+
+    def next_batch(self, timeout):
+        """Siguiente lote a enviar, o None si no hubo nada en `timeout` segundos"""
+        batch = self.queue.get(timeout=timeout)
+        if batch is None:
+            return None
+
+        if self.min_interval:
+            wait = self.last_sent + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            # Agrupar lo acumulado: el estado más reciente y todos los eventos
+            events = list(batch.get("events") or [])
+            while True:
+                newer = self.queue.get(timeout=0)
+                if newer is None:
+                    break
+                events.extend(newer.get("events") or [])
+                batch = newer
+            if events:
+                batch = dict(batch, events=events)
+
+        self.last_sent = time.monotonic()
+        self.sent += 1
+        return batch
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+
+class DetectionBroadcaster:
+    """Reparte cada lote de detecciones a todos los suscriptores"""
+
+    def __init__(self, queue_size=16, max_subscribers=100, min_interval=0.0):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.min_interval = min_interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._event_ids = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self, camera=None, min_interval=None, device=None):
+        """Nuevo suscriptor; `min_interval` (s) no puede ser menor que el del servidor"""
+        interval = max(self.min_interval, min_interval or 0.0)
+        subscription = Subscription(self, camera, self.queue_size, interval, device)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers(f"Máximo de {self.max_subscribers} visores")
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, batch):
+        """Publicar un lote (dict con detections, events, timestamp, camera_index)
+
+        Cada lote recibe un `event_id` global (el id del mensaje SSE); el
+        `seq` por stream del concentrador se conserva tal cual.
+        """
+        batch = dict(batch, event_id=next(self._event_ids))
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for subscription in subscribers:
+            if subscription.wants(batch):
+                subscription.queue.put(batch)
+        return batch["event_id"]
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        return {
+            "subscribers": len(subscribers),
+            "published": self.published,
+            "dropped": sum(s.dropped for s in subscribers),
+        }
+
+
+class HubRelay:
+    """Publica en un broadcaster los lotes nuevos del concentrador compartido
+
+    El broadcaster vive dentro de un proceso: con varios workers y el
+    concentrador SQLite, un lote recibido por un worker no llegaría a los
+    visores conectados a otro. Cada worker consulta el concentrador cada
+    `interval` segundos y publica lo que haya llegado desde la última vez
+    (lo recibido por él mismo incluido).
+    """
+
+    def __init__(self, hub, broadcaster, interval=0.2):
+        self.hub = hub
+        self.broadcaster = broadcaster
+        self.interval = interval
+        # Lo anterior al arranque no se reenvía
+        self._seen = {
+            (s["device_id"], s["camera_index"]): s["last_seq"] for s in hub.stats()["streams"]
+        }
+        self._stop = threading.Event()
+        self._thread = None
+        self.relayed = 0
+
+    def poll(self):
+        """Publicar los lotes nuevos; devuelve cuántos"""
+        listening = self.broadcaster.stats()["subscribers"] > 0
+        relayed = 0
+        for stream in self.hub.stats()["streams"]:
+            key = (stream["device_id"], stream["camera_index"])
+            seen = self._seen.get(key, 0)
+            if stream["last_seq"] <= seen:
+                continue
+            latest = stream["last_seq"]
+            if listening:
+                for batch in self.hub.since(key[0], key[1], seen):
+                    self.broadcaster.publish(batch)
+                    latest = max(latest, batch["seq"])
+                    relayed += 1
+            self._seen[key] = latest
+        self.relayed += relayed
+        return relayed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                log.exception("No se pudo leer el concentrador de detecciones")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stream-relay", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+
+def sse_events(subscription, heartbeat=15.0):
+    """Generador de mensajes SSE para un suscriptor (se cierra al desconectarse)"""
+    try:
+        yield "retry: 2000\n\n"
+        while True:
+            batch = subscription.next_batch(timeout=heartbeat)
+            if batch is None:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield ": keep-alive\n\n"
+                continue
+            payload = dict(batch, dropped=subscription.dropped)
+            yield f"id: {batch['event_id']}\nevent: detections\ndata: {json.dumps(payload)}\n\n"
+    finally:
+        subscription.close()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Hilos y afinidad de CPU para la inferencia.
+
+PyTorch y OpenCV usan por defecto un hilo por núcleo en cada llamada; con
+varios workers infiriendo a la vez en la misma máquina (procesos del
+servidor, de analyze_batch, la cámara) eso suma más hilos que núcleos y
+la latencia empeora en vez de mejorar. `configure` reparte los núcleos:
+cada worker recibe núcleos / workers hilos y, opcionalmente, queda fijado
+a su propio grupo de núcleos (solo Linux).
+"""
+import logging
+import os
+import sys
+
+log = logging.getLogger("dipia.threads")
+
+# Última configuración aplicada en este proceso (para /health)
+_applied = None
+
+
+def available_cores():
+    """Núcleos en los que puede correr este proceso"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+# Núcleos al importar, antes de fijar nada: los procesos hijos heredan la
+# afinidad del padre y tienen que repartir el total, no el grupo del padre
+_initial_cores = available_cores()
+
+
+def threads_per_worker(workers=1, cores=None):
+    """Hilos de cada worker para no pasarse de los núcleos disponibles"""
+    cores = len(_initial_cores) if cores is None else cores
+    return max(1, cores // max(1, workers))
+
+
+def core_groups(workers, cores=None):
+    """Repartir los núcleos en `workers` grupos contiguos (sin repetir si alcanzan)"""
+    cores = list(_initial_cores if cores is None else cores)
+    workers = max(1, workers)
+    if workers >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(workers)]
+    size, extra = divmod(len(cores), workers)
+    groups, start = [], 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(cores[start:end])
+        start = end
+    return groups
+
+
+def pin_to_cores(cores):
+    """Fijar todos los hilos del proceso a `cores`; los hilos nuevos lo heredan"""
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    cores = set(cores)
+    try:
+        # sched_setaffinity(0) solo afecta al hilo actual: aplicarlo a cada hilo existente
+        tasks = [int(t) for t in os.listdir("/proc/self/task")]
+    except OSError:
+        tasks = [0]
+    for task in tasks:
+        try:
+            os.sched_setaffinity(task, cores)
+        except OSError:
+            pass  # el hilo terminó mientras tanto
+    return True
+
+
+def configure(workers=1, index=0, threads=0, interop_threads=1, opencv_threads=0, pin=False):
+    """Aplicar hilos y afinidad al proceso actual (worker `index` de `workers`)
+
+    `threads` y `opencv_threads` en 0 significan núcleos / workers. Llamar
+    al arrancar, antes de la primera inferencia: PyTorch no deja cambiar
+    los hilos inter-op una vez que empezó a usarlos.
+    """
+    global _applied
+    group = core_groups(workers)[index % max(1, workers)] if pin else None
+    threads = threads or (len(group) if group else threads_per_worker(workers))
+    opencv_threads = opencv_threads or threads
+
+    # Para las bibliotecas que leen el entorno al cargarse (OpenMP, MKL)
+    if "torch" not in sys.modules:
+        os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+        os.environ.setdefault("MKL_NUM_THREADS", str(threads))
+
+    if group is not None and pin_to_cores(group):
+        log.info("Worker %d fijado a los núcleos %s", index, group)
+    else:
+        group = None
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        if torch.get_num_interop_threads() != interop_threads:
+            try:
+                torch.set_num_interop_threads(interop_threads)
+            except RuntimeError:
+                log.warning("No se pudo cambiar los hilos inter-op de PyTorch (ya se usaron)")
+        interop_threads = torch.get_num_interop_threads()
+    except ImportError:
+        pass
+
+    try:
+        # ultralytics vuelve a llamar torch.set_num_threads(NUM_THREADS) al
+        # elegir el dispositivo CPU en cada predictor nuevo, con un valor
+        # calculado al importarse (núcleos - 1): que use el nuestro
+        from ultralytics.utils import torch_utils
+        torch_utils.NUM_THREADS = threads
+    except ImportError:
+        pass
+
+    try:
+        import cv2
+        cv2.setNumThreads(opencv_threads)
+    except ImportError:
+        pass
+
+    _applied = {
+        "workers": workers, "index": index, "threads": threads,
+        "interop_threads": interop_threads, "opencv_threads": opencv_threads,
+        "cores": group, "available_cores": len(_initial_cores),
+    }
+    return _applied
+
+
+def settings():
+    """Configuración aplicada con `configure` (None si no se llamó)"""
+    return dict(_applied) if _applied else None
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Seguimiento liviano de objetos entre inferencias.
+
+Cada objeto detectado es un "track" con un ID estable y un filtro de
+Kalman de velocidad constante sobre (cx, cy, w, h). Las detecciones nuevas
+se asocian a los tracks por IoU contra la posición predicha (con la
+distancia entre centros como respaldo para objetos rápidos). En los frames
+sin IA las cajas se extrapolan, así que no parpadean.
+
+Además de las cajas, el tracker produce eventos por track ("appeared" al
+confirmarse, "ended" al perderse) para no repetir el mismo objeto en
+cada frame.
+"""
+import itertools
+import threading
+import time
+
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """IoU entre cada caja de `a` (N,4) y cada caja de `b` (M,4), en xyxy"""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+def _to_state(box):
+    x1, y1, x2, y2 = box
+    return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=np.float64)
+
+
+def _to_box(state):
+    cx, cy, w, h = state[:4]
+    w, h = max(w, 1.0), max(h, 1.0)
+    return [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]
+
+
+class KalmanBox:
+    """Filtro de Kalman de velocidad constante sobre (cx, cy, w, h)"""
+
+    # Varianzas del proceso y de la medición (en px²)
+    PROCESS_NOISE = 1.0
+    MEASUREMENT_NOISE = 10.0
+
+    def __init__(self, box):
+        self.x = np.zeros(8)
+        self.x[:4] = _to_state(box)
+        self.P = np.diag([10.0] * 4 + [1000.0] * 4)
+        self.H = np.eye(4, 8)
+        self.R = np.eye(4) * self.MEASUREMENT_NOISE
+
+    @staticmethod
+    def _transition(dt):
+        F = np.eye(8)
+        F[:4, 4:] = np.eye(4) * dt
+        return F
+
+    def predicted(self, dt):
+        """Estado extrapolado `dt` frames hacia adelante (sin modificar el filtro)"""
+        return self._transition(dt) @ self.x
+
+    def predict(self, dt):
+        F = self._transition(dt)
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + np.eye(8) * self.PROCESS_NOISE * max(dt, 1)
+
+    def update(self, box):
+        z = _to_state(box)
+        y = z - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(8) - K @ self.H) @ self.P
+
+
+class Track:
+    """Un objeto seguido a lo largo de los frames"""
+
+    def __init__(self, track_id, detection, frame_index):
+        self.track_id = track_id
+        self.kalman = KalmanBox(detection["bbox"])
+        self.label = detection["label"]
+        self.class_id = detection["class_id"]
+        self.confidence = detection["confidence"]
+        self.max_confidence = detection["confidence"]
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.hits = 1
+        self.misses = 0
+        self.announced = False
+
+    def box_at(self, frame_index):
+        return _to_box(self.kalman.predicted(frame_index - self.last_frame))
+
+    def to_dict(self, frame_index, width=None, height=None):
+        x1, y1, x2, y2 = self.box_at(frame_index)
+        if width is not None and height is not None:
+            x1, x2 = min(max(x1, 0), width), min(max(x2, 0), width)
+            y1, y2 = min(max(y1, 0), height), min(max(y2, 0), height)
+        return {
+            "track_id": self.track_id,
+            "label": self.label,
+            "confidence": self.confidence,
+            "bbox": [int(x1), int(y1), int(x2), int(y2)],
+            "class_id": self.class_id,
+        }
+
+
+class Tracker:
+    """Asocia detecciones a tracks y extrapola las cajas entre inferencias
+
+    `max_age` son las inferencias seguidas sin ver un track antes de darlo
+    por perdido; `min_hits` las necesarias para mostrarlo y anunciarlo.
+    Es seguro llamar update() y tracks_at() desde hilos distintos.
+    """
+
+    def __init__(self, iou_threshold=0.3, centroid_threshold=0.5, max_age=5, min_hits=1):
+        self.iou_threshold = iou_threshold
+        self.centroid_threshold = centroid_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.tracks = []
+        self._ids = itertools.count(1)
+        self._events = []
+        self._lock = threading.Lock()
+
+    def _match(self, predicted, detections):
+        """Pares (track, detección) por mayor afinidad, de a uno"""
+        det_boxes = np.array([d["bbox"] for d in detections], dtype=np.float32).reshape(-1, 4)
+        iou = iou_matrix(predicted, det_boxes)
+
+        # Respaldo: distancia entre centros relativa al tamaño del track
+        pred_centers = (predicted[:, :2] + predicted[:, 2:]) / 2
+        det_centers = (det_boxes[:, :2] + det_boxes[:, 2:]) / 2
+        diag = np.hypot(predicted[:, 2] - predicted[:, 0], predicted[:, 3] - predicted[:, 1])
+        dist = np.linalg.norm(pred_centers[:, None] - det_centers[None], axis=2) / np.maximum(diag[:, None], 1.0)
+
+        score = np.where(iou >= self.iou_threshold, 1.0 + iou,
+                         np.where(dist < self.centroid_threshold, 1.0 - dist, 0.0))
+        same_class = (np.array([t.class_id for t in self.tracks])[:, None]
+                      == np.array([d["class_id"] for d in detections])[None, :])
+        score = np.where(same_class, score, 0.0)
+
+        pairs = []
+        used_tracks, used_dets = set(), set()
+        for flat in np.argsort(-score, axis=None):
+            t, d = np.unravel_index(flat, score.shape)
+            if score[t, d] <= 0:
+                break
+            if t in used_tracks or d in used_dets:
+                continue
+            used_tracks.add(t)
+            used_dets.add(d)
+            pairs.append((t, d))
+        return pairs
+
+    def update(self, detections, frame_index):
+        """Incorporar las detecciones de una inferencia hecha en `frame_index`"""
+        with self._lock:
+            predicted = np.array([t.box_at(frame_index) for t in self.tracks],
+                                 dtype=np.float32).reshape(-1, 4)
+            pairs = self._match(predicted, detections) if self.tracks and detections else []
+
+            matched_tracks = {t for t, _ in pairs}
+            matched_dets = {d for _, d in pairs}
+            for t, d in pairs:
+                track, detection = self.tracks[t], detections[d]
+                track.kalman.predict(frame_index - track.last_frame)
+                track.kalman.update(detection["bbox"])
+                track.last_frame = frame_index
+                track.confidence = detection["confidence"]
+                track.max_confidence = max(track.max_confidence, detection["confidence"])
+                track.hits += 1
+                track.misses = 0
+
+            for i, track in enumerate(self.tracks):
+                if i not in matched_tracks:
+                    track.misses += 1
+
+            for d, detection in enumerate(detections):
+                if d not in matched_dets:
+                    self.tracks.append(Track(next(self._ids), detection, frame_index))
+
+            alive = []
+            for track in self.tracks:
+                if track.misses > self.max_age:
+                    if track.announced:
+                        self._events.append(self._event("ended", track))
+                    continue
+                if not track.announced and track.hits >= self.min_hits:
+                    track.announced = True
+                    self._events.append(self._event("appeared", track))
+                alive.append(track)
+            self.tracks = alive
+
+    def tracks_at(self, frame_index, width=None, height=None):
+        """Tracks confirmados, con la caja extrapolada a `frame_index`"""
+        with self._lock:
+            return [
+                track.to_dict(frame_index, width, height)
+                for track in self.tracks
+                if track.hits >= self.min_hits
+            ]
+
+    def pop_events(self):
+        """Eventos pendientes ("appeared"/"ended"), cada track una vez"""
+        with self._lock:
+            events, self._events = self._events, []
+            return events
+
+    def reset(self):
+        with self._lock:
+            self.tracks = []
+            self._events = []
+
+    def _event(self, kind, track):
+        event = track.to_dict(track.last_frame)
+        event.update({
+            "event": kind,
+            "confidence": track.max_confidence,
+            "frames": track.last_frame - track.first_frame + 1,
+            "timestamp": time.time(),
+        })
+        return event
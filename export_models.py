@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Exportar los modelos a ONNX / OpenVINO para inferencia rápida en CPU.
+
+    python export_models.py                              # detector (y clasificador) a ONNX
+    python export_models.py --format onnx openvino
+    python export_models.py --int8 --data dataset.yaml   # INT8 calibrado
+
+Los exportados quedan junto a cada .pt y los servidores los usan solos al
+arrancar (DIPIA_INFERENCE_BACKEND=auto). Volver a exportar después de
+reentrenar: un exportado más viejo que su .pt se ignora.
+"""
+import argparse
+import importlib.util
+import os
+
+from config import Config
+from dipia.engine import find_model_path
+from dipia.engine.backends import RUNTIMES, export_model
+
+CLASSIFIER_MODEL = "classifier_model.pt"
+CLASSIFIER_DIRS = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "hack4edu", "models")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exportar los modelos de DIPIA a ONNX / OpenVINO")
+    parser.add_argument("models", nargs="*",
+                        help=f"modelos .pt (por defecto {Config.DETECTOR_MODEL} y {CLASSIFIER_MODEL} si existe)")
+    parser.add_argument("--format", nargs="+", choices=sorted(RUNTIMES), default=["onnx"])
+    parser.add_argument("--int8", action="store_true", help="cuantizar a INT8 (requiere --data)")
+    parser.add_argument("--data", default=None,
+                        help="imágenes de calibración INT8: YAML del dataset o carpeta (solo ONNX)")
+    parser.add_argument("--imgsz", type=int, default=None, help="tamaño de entrada (por defecto el del modelo)")
+    parser.add_argument("--batch", type=int, default=Config.BATCH_MAX_SIZE, help="lote máximo")
+    args = parser.parse_args(argv)
+
+    if args.int8 and not args.data:
+        parser.error("--int8 requiere --data (YAML del dataset o carpeta de imágenes)")
+    # El export de ONNX necesita el paquete onnx; la cuantización y el uso, onnxruntime
+    needed = {"onnx": ["onnx"] + (["onnxruntime"] if args.int8 else []), "openvino": ["openvino"]}
+    missing = [m for f in args.format for m in needed[f] if importlib.util.find_spec(m) is None]
+    if missing:
+        parser.error(f"faltan paquetes: pip install {' '.join(missing)}")
+
+    if args.models:
+        paths = []
+        for model in args.models:
+            path = find_model_path(model)
+            if path is None:
+                parser.error(f"modelo {model} no encontrado")
+            paths.append(path)
+    else:
+        paths = [find_model_path(Config.DETECTOR_MODEL), find_model_path(CLASSIFIER_MODEL, CLASSIFIER_DIRS)]
+        if paths[0] is None:
+            parser.error(f"modelo {Config.DETECTOR_MODEL} no encontrado")
+        paths = [p for p in paths if p]
+
+    exported = {}
+    for path in paths:
+        try:
+            exported[path] = export_model(path, args.format, args.int8, args.imgsz, args.batch, args.data)
+        except ValueError as e:
+            parser.error(str(e))
+        for backend, target in exported[path].items():
+            print(f"✅ {os.path.basename(path)} → {target} ({backend}{', INT8' if args.int8 else ''})")
+    return exported
+
+
+if __name__ == "__main__":
+    main()
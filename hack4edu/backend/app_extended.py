@@ -3,23 +3,77 @@
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import cv2
-import numpy as np
-from ultralytics import YOLO
+from werkzeug.exceptions import RequestEntityTooLarge
+import atexit
 import os
+import sys
 import json
+import time
+import threading
 from datetime import datetime
+import numpy as np
+
+# Permitir importar `config` y el paquete compartido `dipia` desde la raíz
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from config import Config
+from dipia import serving, threads
+from dipia.engine import Detector, MicroBatcher, QueueFullError, TiledDetector, classify_batch, crop_boxes
+from dipia.engine.backends import load_model, resolve_model
+from dipia.cache import ResultCache, model_fingerprint, result_key
+from dipia.ingest import ImageRejected, decode_image, read_upload
+
+# Hilos de PyTorch/OpenCV repartidos entre los workers de la máquina (antes de cargar modelos)
+threads.configure(
+    Config.INFER_WORKERS, 0, Config.TORCH_THREADS, Config.TORCH_INTEROP_THREADS,
+    Config.OPENCV_THREADS, Config.PIN_CORES
+)
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# Límites de las imágenes subidas
+MAX_UPLOAD_BYTES = int(Config.INGEST_MAX_MB * 1024 * 1024)
+MAX_UPLOAD_PIXELS = int(Config.INGEST_MAX_MEGAPIXELS * 1_000_000)
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
+
 # Cargar modelos de IA
 detector_model = None  # IA N°1: Detector existente
 classifier_model = None  # IA N°2: Clasificador de características
+detector_batcher = None  # Cola de micro-batching delante de la IA N°1
+tiled_detector = None  # IA N°1 por mosaicos, para fotos de alta resolución (?tiled=1)
+tiled_batcher = None
+detector_lock = threading.Lock()  # Ambas colas usan el mismo modelo
+classifier_lock = threading.Lock()  # predict() de ultralytics no es thread-safe
+models_version = None  # Versión de ambos modelos, parte de la clave de la caché
+model_backends = {}  # Backend de inferencia de cada modelo (torch, onnx, openvino)
+
+# Umbral de confianza de la IA N°1
+DETECTOR_CONF = 0.5
+
+# Resultados de imágenes ya analizadas (misma foto, mismos modelos y umbral)
+result_cache = ResultCache(
+    max_bytes=int(Config.RESULT_CACHE_MB * 1024 * 1024),
+    path=Config.RESULT_CACHE_PATH or None,
+    max_disk_bytes=int(Config.RESULT_CACHE_DISK_MB * 1024 * 1024)
+)
 
-def load_models():
-    """Cargar ambos modelos de IA"""
-    global detector_model, classifier_model
+def load_models(fork=False):
+    """Cargar ambos modelos de IA (una sola vez) y crear las colas de inferencia
+
+    Con `fork` (maestro de serve.py) solo se cargan los pesos de PyTorch:
+    los workers los heredan copy-on-write. Las sesiones de ONNX Runtime /
+    OpenVINO y los hilos de las colas no sobreviven a un fork y se crean
+    en cada worker, al volver a llamar sin `fork`.
+    """
+    global detector_model, classifier_model, detector_batcher, models_version, tiled_detector, tiled_batcher
+    global model_backends
+    
+    def loads_here(path):
+        # ONNX Runtime / OpenVINO si hay un exportado al día (export_models.py), si no PyTorch
+        return not fork or resolve_model(path, Config.INFERENCE_BACKEND, Config.INFERENCE_INT8)[1] == "torch"
     
     try:
         # Resolver ruta absoluta al archivo del modelo en la RAÍZ del proyecto
@@ -44,9 +98,13 @@ def load_models():
             )
 
         # IA N°1: Detector existente
-        detector_model = YOLO(model_path)
-        print(f"✅ IA N°1 (Detector) cargada: {model_path}")
-        print("✅ IA N°1 (Detector) cargada correctamente")
+        if detector_model is None and loads_here(model_path):
+            detector_model, loaded_path, detector_backend = load_model(
+                model_path, Config.INFERENCE_BACKEND, Config.INFERENCE_INT8, task="detect"
+            )
+            model_backends["detector"] = detector_backend
+            print(f"✅ IA N°1 (Detector) cargada: {loaded_path} ({detector_backend})")
+            print("✅ IA N°1 (Detector) cargada correctamente")
         
         # IA N°2: Clasificador (si existe classifier_model.pt)
         classifier_candidates = [
@@ -61,57 +119,104 @@ def load_models():
                 break
 
         if classifier_path:
-            classifier_model = YOLO(classifier_path)
-            print(f"✅ IA N°2 (Clasificador) cargada: {classifier_path}")
+            if classifier_model is None and loads_here(classifier_path):
+                classifier_model, loaded_path, classifier_backend = load_model(
+                    classifier_path, Config.INFERENCE_BACKEND, Config.INFERENCE_INT8, task="classify"
+                )
+                model_backends["classifier"] = classifier_backend
+                print(f"✅ IA N°2 (Clasificador) cargada: {loaded_path} ({classifier_backend})")
         else:
             classifier_model = None
             print("⚠️ IA N°2 (Clasificador) no encontrada (se usará stub)")
         
+        if fork or detector_batcher is not None:
+            return
+        
+        detector = Detector(detector_model, lock=detector_lock, language="en", conf=DETECTOR_CONF)
+        detector_batcher = MicroBatcher(
+            detector.predict_batch,
+            max_batch_size=Config.BATCH_MAX_SIZE,
+            max_wait_ms=Config.BATCH_MAX_WAIT_MS,
+            max_queue=Config.BATCH_MAX_QUEUE,
+            name="detector"
+        )
+        tiled_detector = TiledDetector(
+            detector,
+            tile_size=Config.TILE_SIZE,
+            overlap=Config.TILE_OVERLAP,
+            max_tiles=Config.TILE_MAX,
+            iou_threshold=Config.TILE_NMS_IOU,
+            include_full=Config.TILE_INCLUDE_FULL
+        )
+        # Cada imagen ya es un lote de ventanas: se infiere de a una
+        tiled_batcher = MicroBatcher(
+            tiled_detector.predict_batch,
+            max_batch_size=1,
+            max_queue=Config.BATCH_MAX_QUEUE,
+            name="detector-tiled"
+        )
+        
+        models_version = f"{model_fingerprint(model_path)}+{model_fingerprint(classifier_path)}"
+        
     except Exception as e:
         print(f"❌ Error cargando modelos: {e}")
 
-def crop_detection(image, bbox):
-    """Recortar imagen basada en bounding box"""
-    x1, y1, x2, y2 = bbox
-    return image[y1:y2, x1:x2]
+def preload(fork=False):
+    """Precargar los modelos antes de aceptar peticiones (ver serve.py)"""
+    load_models(fork)
+
+def before_fork():
+    """Cerrar las conexiones SQLite del maestro (cada worker abre las suyas)"""
+    serving.close_pools(result_cache.pool)
+
+def after_fork(request_threads=None):
+    """En cada worker: cargar lo que falte, crear las colas y calentar el detector"""
+    load_models()
+    if detector_batcher is not None:
+        # La primera inferencia inicializa el grafo: que no la pague una petición
+        detector_batcher.submit(np.zeros((640, 640, 3), dtype=np.uint8))
+
+def before_exit():
+    """Al terminar el proceso: detener los batchers (las peticiones en cola fallan, no quedan colgadas)"""
+    for batcher in (detector_batcher, tiled_batcher):
+        if batcher is not None:
+            batcher.stop()
+
+def worker_stats():
+    """Métricas propias de la app para /health/workers"""
+    return {
+        "batching": detector_batcher.stats() if detector_batcher else None,
+        "result_cache": result_cache.stats(),
+    }
+
+# Respuestas de IA N°2 cuando no hay modelo o el modelo falla
+STUB_CLASSIFICATION = {
+    "crack": {"type": "Grieta_Escalonada", "severity": "Media", "confidence": 0.85},
+    "humidity": {"type": "Humedad_Interior", "severity": "Alta", "confidence": 0.92},
+    "person": {"type": "Inspector_Presente", "severity": "N/A", "confidence": 1.0},
+}
+FALLBACK_CLASSIFICATION = {
+    "crack": {"type": "Grieta_Escalonada", "severity": "Media", "confidence": 0.80},
+    "humidity": {"type": "Humedad_Interior", "severity": "Alta", "confidence": 0.80},
+    "person": {"type": "Inspector_Presente", "severity": "N/A", "confidence": 1.0},
+}
 
-def classify_damage(cropped_image):
-    """Clasificar características del daño (IA N°2). Usa modelo si existe; si no, stub."""
+def classify_damages(cropped_images):
+    """Clasificar características del daño (IA N°2) de todos los recortes en un
+    solo lote. Usa modelo si existe; si no, stub."""
     if classifier_model is None:
-        return {
-            "crack": {"type": "Grieta_Escalonada", "severity": "Media", "confidence": 0.85},
-            "humidity": {"type": "Humedad_Interior", "severity": "Alta", "confidence": 0.92},
-            "person": {"type": "Inspector_Presente", "severity": "N/A", "confidence": 1.0},
-        }
+        return [STUB_CLASSIFICATION for _ in cropped_images]
 
     try:
-        results = classifier_model.predict(cropped_image, verbose=False)
-        best_name = None
-        best_conf = 0.0
-
-        for r in results:
-            if hasattr(r, "probs") and r.probs is not None:
-                probs = r.probs.data.cpu().numpy().flatten()
-                idx = int(probs.argmax())
-                best_conf = float(probs[idx])
-                if hasattr(r, "names") and r.names is not None:
-                    if isinstance(r.names, dict):
-                        best_name = str(r.names.get(idx, f"Class_{idx}"))
-                    else:
-                        best_name = str(r.names[idx])
-                else:
-                    best_name = f"Class_{idx}"
-            elif hasattr(r, "boxes") and r.boxes is not None and len(r.boxes) > 0:
-                cls_val = int(r.boxes.cls[0].cpu().numpy())
-                best_conf = float(r.boxes.conf[0].cpu().numpy())
-                if hasattr(r, "names") and r.names is not None:
-                    if isinstance(r.names, dict):
-                        best_name = str(r.names.get(cls_val, f"Class_{cls_val}"))
-                    else:
-                        best_name = str(r.names[cls_val])
-                else:
-                    best_name = f"Class_{cls_val}"
+        predictions = classify_batch(
+            classifier_model, cropped_images, Config.CLASSIFIER_IMGSZ, classifier_lock
+        )
+    except Exception as e:
+        print(f"⚠️ Error en clasificador IA N°2 (stub): {e}")
+        return [FALLBACK_CLASSIFICATION for _ in cropped_images]
 
+    classifications = []
+    for best_name, best_conf in predictions:
         def pick(default_key):
             return {
                 "type": best_name or default_key,
@@ -119,18 +224,12 @@ def classify_damage(cropped_image):
                 "confidence": best_conf if best_conf > 0 else 0.5,
             }
 
-        return {
+        classifications.append({
             "crack": pick("Grieta"),
             "humidity": pick("Humedad"),
             "person": {"type": "Inspector_Presente", "severity": "N/A", "confidence": 1.0},
-        }
-    except Exception as e:
-        print(f"⚠️ Error en clasificador IA N°2 (stub): {e}")
-        return {
-            "crack": {"type": "Grieta_Escalonada", "severity": "Media", "confidence": 0.80},
-            "humidity": {"type": "Humedad_Interior", "severity": "Alta", "confidence": 0.80},
-            "person": {"type": "Inspector_Presente", "severity": "N/A", "confidence": 1.0},
-        }
+        })
+    return classifications
 
 @app.route('/analyze_extended', methods=['POST'])
 def analyze_extended():
@@ -143,66 +242,110 @@ def analyze_extended():
         if file.filename == '':
             return jsonify({"success": False, "error": "No image selected"}), 400
         
-        # Leer imagen
-        image_bytes = file.read()
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        image_cv = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if image_cv is None:
-            return jsonify({"success": False, "error": "Invalid image format"}), 400
+        image_bytes = read_upload(file.stream, MAX_UPLOAD_BYTES)
         
-        # IA N°1: Detección
-        results = detector_model.predict(image_cv, conf=0.5, verbose=False)
+        if detector_batcher is None:
+            return jsonify({"success": False, "error": "Detector model not loaded"}), 500
         
-        detections = []
-        cropped_images = []
+        # Modo por mosaicos: grietas finas en fotos de alta resolución
+        tiled = str(request.values.get('tiled', '')).strip().lower() in ('1', 'true', 'yes', 'on')
+        batcher = tiled_batcher if tiled else detector_batcher
+        decode_size = tiled_detector.decode_size if tiled else Config.INGEST_DECODE_SIZE
         
-        for result in results:
-            if result.boxes is not None:
-                for box in result.boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
-                    confidence = float(box.conf[0].cpu().numpy())
-                    class_id = int(box.cls[0].cpu().numpy())
-                    
-                    # Mapear clases
-                    class_names = {0: "Person", 1: "Crack", 2: "Humidity"}
-                    label = class_names.get(class_id, f"Class_{class_id}")
-                    
-                    detection = {
-                        "label": label,
-                        "confidence": confidence,
-                        "bbox": [x1, y1, x2, y2],
-                        "class_id": class_id
-                    }
-                    detections.append(detection)
-                    
-                    # Recortar imagen para IA N°2
-                    cropped = crop_detection(image_cv, [x1, y1, x2, y2])
-                    cropped_images.append(cropped)
+        timings = {}
         
-        # IA N°2: Clasificación de características
-        classifications = []
-        for i, detection in enumerate(detections):
-            if i < len(cropped_images):
-                classification = classify_damage(cropped_images[i])
+        def analyze():
+            # Leer imagen (solo si no está en la caché): una decodificación, reducida si sobra resolución
+            decoded = decode_image(image_bytes, MAX_UPLOAD_PIXELS, decode_size)
+            image_cv = decoded.image
+            
+            # IA N°1: Detección (agrupada con otras peticiones concurrentes)
+            detector_start = time.perf_counter()
+            result = batcher.submit(image_cv)
+            timings["detector_ms"] = round((time.perf_counter() - detector_start) * 1000, 1)
+            
+            detections = decoded.to_original(result).to_list()
+            
+            # Recortar imagen para IA N°2 sobre la imagen decodificada, no la original:
+            # el lado mayor sigue siendo >= decode_size y el clasificador lleva cada
+            # recorte a CLASSIFIER_IMGSZ (224), así que solo las cajas chicas pierden
+            # detalle, a cambio de no decodificar la foto completa una segunda vez.
+            # El tamaño mínimo se mide en píxeles de la original, como las cajas devueltas.
+            classifier_start = time.perf_counter()
+            min_crop = max(1, round(Config.CLASSIFIER_MIN_CROP * decoded.scale))
+            cropped_images, valid_ids = crop_boxes(image_cv, result.boxes, min_crop)
+            
+            # IA N°2: Clasificación de características, todos los recortes en un lote
+            classifications = []
+            for i, classification in zip(valid_ids, classify_damages(cropped_images)):
                 classifications.append({
                     "detection_id": i,
-                    "classification": classification.get(detection["label"].lower(), {})
+                    "classification": classification.get(detections[i]["label"].lower(), {})
                 })
+            timings["classifier_ms"] = round((time.perf_counter() - classifier_start) * 1000, 1)
+            timings["classified_crops"] = len(cropped_images)
+            
+            return {
+                "detections": detections,
+                "classifications": classifications,
+                "image_size": list(decoded.original_size),
+                "timings": timings
+            }
+        
+        # La misma foto con los mismos modelos no se vuelve a analizar
+        if tiled:
+            key = result_key(image_bytes, "extended-tiled", models_version, DETECTOR_CONF, language="en",
+                             **tiled_detector.params())
+        else:
+            key = result_key(image_bytes, "extended", models_version, DETECTOR_CONF, language="en",
+                             decode=decode_size)
+        try:
+            cached_result, cached = result_cache.get_or_compute(key, analyze)
+        except QueueFullError as e:
+            return jsonify({"success": False, "error": str(e)}), 503
+        detections = cached_result["detections"]
         
         return jsonify({
             "success": True,
             "detections": detections,
-            "classifications": classifications,
-            "image_size": [image_cv.shape[1], image_cv.shape[0]],
+            "classifications": cached_result["classifications"],
+            "image_size": cached_result["image_size"],
             "total_detections": len(detections),
+            "mode": "tiled" if tiled else "single",
+            # Con la caché, los tiempos del análisis original (ver "cached")
+            "timings": cached_result.get("timings", {}),
+            "cached": cached,
             "timestamp": datetime.now().isoformat()
         })
         
+    except RequestEntityTooLarge:
+        return jsonify({"success": False, "error": "Image exceeds the maximum upload size"}), 413
+    except ImageRejected as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
     except Exception as e:
         print(f"❌ Error en análisis extendido: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/health')
+def health():
+    """Estado del backend extendido y métricas de la cola de inferencia"""
+    return jsonify({
+        "status": "ok",
+        "timestamp": time.time(),
+        "detector_loaded": detector_model is not None,
+        "classifier_loaded": classifier_model is not None,
+        "backends": model_backends,
+        "threads": threads.settings(),
+        "batching": detector_batcher.stats() if detector_batcher else None,
+        "batching_tiled": tiled_batcher.stats() if tiled_batcher else None,
+        "result_cache": result_cache.stats()
+    })
+
+@app.route('/health/workers')
+def health_workers():
+    """Métricas de cada worker del servidor de producción (serve.py)"""
+    return jsonify(serving.workers_report())
+
 @app.route('/knowledge/<damage_type>')
 def get_knowledge(damage_type):
     """Obtener base de conocimiento para tipo de daño"""
@@ -241,5 +384,12 @@ def get_knowledge(damage_type):
     return jsonify(knowledge_base.get(damage_type.lower(), {}))
 
 if __name__ == '__main__':
-    load_models()
-    app.run(debug=True, port=5001)  # Puerto diferente para no conflictuar
+    # Producción por defecto (serve.py); el servidor de desarrollo solo con --dev
+    if '--dev' not in sys.argv[1:]:
+        serve = os.path.join(PROJECT_ROOT, "serve.py")
+        os.execv(sys.executable, [sys.executable, serve, "hack4edu", *sys.argv[1:]])
+    
+    preload()
+    atexit.register(before_exit)
+    # Sin el recargador: volvería a cargar los modelos en un segundo proceso
+    app.run(debug=True, use_reloader=False, port=5001)  # Puerto diferente para no conflictuar
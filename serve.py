@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Servidor de producción: N workers pre-fork con los modelos precargados.
+
+    python serve.py app --workers 4                  # app.py en 127.0.0.1:5000
+    python serve.py hack4edu --bind 0.0.0.0:5001     # backend Hack4edu
+    python serve.py app --dev                        # servidor de desarrollo de Flask
+
+El maestro carga los pesos una sola vez y hace fork de los workers, que
+los comparten copy-on-write; cada worker calienta el modelo, reparte los
+núcleos con dipia.threads y publica sus métricas en /health/workers.
+
+    kill -HUP <maestro>      recrea los workers sin cortar peticiones (mismo código y pesos)
+    kill -USR2 <maestro>     arranca un maestro nuevo (código y pesos nuevos); luego
+    kill -TERM <viejo>       apagar el viejo cuando el nuevo ya responde
+
+Requiere gunicorn (Linux/macOS). En Windows, usar --dev.
+"""
+import argparse
+import atexit
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+
+from config import Config
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Apps servibles: (carpeta a agregar a sys.path, módulo, dirección por defecto)
+TARGETS = {
+    "app": (ROOT, "app", "127.0.0.1:5000"),
+    "hack4edu": (os.path.join(ROOT, "hack4edu", "backend"), "app_extended", "127.0.0.1:5001"),
+}
+
+
+def import_target(name):
+    folder, module, _ = TARGETS[name]
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+    return importlib.import_module(module)
+
+
+def free_index(workers):
+    """Menor número de worker libre (estable entre reinicios, para repartir núcleos)"""
+    taken = {getattr(worker, "dipia_index", None) for worker in workers}
+    index = 0
+    while index in taken:
+        index += 1
+    return index
+
+
+def build_server(name, options, metrics_dir, temporary=False):
+    """Aplicación gunicorn que precarga `name` en el maestro antes del fork"""
+    from gunicorn.app.base import BaseApplication
+
+    from dipia import serving, threads
+
+    state = {}
+
+    def pre_fork(server, worker):
+        worker.dipia_index = free_index(server.WORKERS.values())
+
+    def post_fork(server, worker):
+        module = state["module"]
+        threads.configure(
+            server.num_workers, worker.dipia_index, Config.TORCH_THREADS,
+            Config.TORCH_INTEROP_THREADS, Config.OPENCV_THREADS, Config.PIN_CORES
+        )
+        module.after_fork(server.cfg.threads)
+        serving.start_worker_metrics(
+            module.app, metrics_dir, worker.dipia_index, Config.METRICS_INTERVAL, module.worker_stats
+        )
+        server.log.info("Worker %d (pid %d) listo", worker.dipia_index, worker.pid)
+
+    def worker_exit(server, worker):
+        # HUP, --max-requests o TERM: que no se pierda el historial pendiente
+        try:
+            state["module"].before_exit()
+        finally:
+            serving.stop_worker_metrics()
+
+    def child_exit(server, worker):
+        # También si el worker murió sin pasar por worker_exit
+        serving.remove_worker_file(metrics_dir, worker.pid)
+
+    def on_exit(server):
+        # Solo corre en el maestro, al apagarse
+        if temporary:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+    class DipiaServer(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+            self.cfg.set("preload_app", True)
+            self.cfg.set("pre_fork", pre_fork)
+            self.cfg.set("post_fork", post_fork)
+            self.cfg.set("worker_exit", worker_exit)
+            self.cfg.set("child_exit", child_exit)
+            self.cfg.set("on_exit", on_exit)
+
+        def load(self):
+            # En el maestro, una sola vez: lo que se cargue acá lo heredan los workers
+            module = import_target(name)
+            module.preload(fork=True)
+            module.before_fork()
+            state["module"] = module
+            return module.app
+
+    return DipiaServer()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor de producción de DIPIA (workers pre-fork)")
+    parser.add_argument("target", nargs="?", choices=sorted(TARGETS), default="app")
+    parser.add_argument("--dev", action="store_true",
+                        help="servidor de desarrollo de Flask (un proceso, con debug, sin recarga)")
+    parser.add_argument("--bind", default=Config.SERVER_BIND or None,
+                        help="host:puerto (por defecto el de cada app)")
+    parser.add_argument("--workers", type=int, default=Config.INFER_WORKERS,
+                        help="procesos (los núcleos se reparten entre ellos)")
+    parser.add_argument("--threads", type=int, default=Config.SERVER_THREADS,
+                        help="hilos de peticiones por worker (los visores SSE usan hasta la mitad)")
+    parser.add_argument("--timeout", type=int, default=Config.SERVER_TIMEOUT)
+    parser.add_argument("--graceful-timeout", type=int, default=Config.SERVER_GRACEFUL_TIMEOUT)
+    parser.add_argument("--max-requests", type=int, default=Config.SERVER_MAX_REQUESTS,
+                        help="reciclar cada worker tras tantas peticiones (0 = nunca)")
+    parser.add_argument("--pid", default=None, help="archivo con el pid del maestro (para HUP/USR2)")
+    args = parser.parse_args(argv)
+
+    bind = args.bind or TARGETS[args.target][2]
+
+    if args.dev:
+        host, _, port = bind.rpartition(":")
+        module = import_target(args.target)
+        module.preload()
+        atexit.register(module.before_exit)
+        # Sin el recargador: volvería a cargar los modelos en un segundo proceso
+        module.app.run(debug=True, use_reloader=False, host=host or "127.0.0.1", port=int(port))
+        return
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        parser.error("el servidor de producción requiere gunicorn (pip install gunicorn); "
+                     "en Windows, o para desarrollar, usar --dev")
+    if args.workers < 1:
+        parser.error("--workers debe ser al menos 1")
+    if args.workers > 1 and args.target == "app" and Config.HUB_BACKEND == "memory":
+        print("⚠️ Con varios workers y DIPIA_HUB_BACKEND=memory cada worker ve solo las "
+              "detecciones que recibió (también los visores en vivo): usar DIPIA_HUB_BACKEND=sqlite")
+
+    metrics_dir = Config.METRICS_DIR or tempfile.mkdtemp(prefix="dipia-metrics-")
+    os.makedirs(metrics_dir, exist_ok=True)
+
+    options = {
+        "bind": [bind],
+        "workers": args.workers,
+        "worker_class": "gthread",
+        "threads": args.threads,
+        "timeout": args.timeout,
+        "graceful_timeout": args.graceful_timeout,
+        "max_requests": args.max_requests,
+        # Que los workers no se reciclen todos a la vez
+        "max_requests_jitter": args.max_requests // 10,
+        "proc_name": f"dipia-{args.target}",
+        "pidfile": args.pid,
+    }
+    build_server(args.target, options, metrics_dir, temporary=not Config.METRICS_DIR).run()
+
+
+if __name__ == "__main__":
+    main()
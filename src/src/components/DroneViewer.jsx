@@ -10,29 +10,30 @@ const DroneViewer = ({ onBack }) => {
   const cameraOptions = [0, 1, 2, 3]; // Puedes modificar/nombre por tu conveniencia
 
   useEffect(() => {
-    let interval;
-    
-    if (isReceiving) {
-      // Get detections every second
-      interval = setInterval(async () => {
-        try {
-          const response = await fetch('/get_latest_detections');
-          const data = await response.json();
-          
-          if (data.detections && data.detections.length > 0) {
-            setDetections(data.detections);
-            setLastUpdate(new Date(data.timestamp * 1000));
-          }
-        } catch (error) {
-          console.error('Error getting detections:', error);
+    if (!isReceiving) return undefined;
+
+    // El servidor envía cada lote de detecciones apenas lo recibe (SSE);
+    // EventSource se reconecta solo si se corta la conexión
+    const source = new EventSource(`/stream_detections?camera=${selectedCamera}`);
+
+    source.addEventListener('detections', (event) => {
+      try {
+        const data = JSON.parse(event.data);
+        if (data.detections && data.detections.length > 0) {
+          setDetections(data.detections);
+          setLastUpdate(new Date(data.timestamp * 1000));
         }
-      }, 1000);
-    }
-    
-    return () => {
-      if (interval) clearInterval(interval);
+      } catch (error) {
+        console.error('Error parsing detections:', error);
+      }
+    });
+
+    source.onerror = () => {
+      console.error('Detection stream interrupted, reconnecting...');
     };
-  }, [isReceiving]);
+
+    return () => source.close();
+  }, [isReceiving, selectedCamera]);
 
   const startReceiving = async () => {
     // Enviar la cámara seleccionada al backend antes de activar la recepción
@@ -12,6 +12,7 @@ const ImageAnalysis = ({ onBack, onNavigateToMaterials }) => {
   const [extraInfoIndex, setExtraInfoIndex] = useState(null);
   const [recommendedMaterials, setRecommendedMaterials] = useState([]);
   const [loadingRecommendations, setLoadingRecommendations] = useState(false);
+  const [tiled, setTiled] = useState(false);
   const { t } = useTranslation();
 
   const getExtraInfo = (label) => {
@@ -118,6 +119,9 @@ const ImageAnalysis = ({ onBack, onNavigateToMaterials }) => {
     try {
       const formData = new FormData();
       formData.append('image', selectedFile);
+      if (tiled) {
+        formData.append('tiled', '1');
+      }
 
       const response = await fetch('/analyze_image', { method: 'POST', body: formData });
       const data = await response.json();
@@ -254,6 +258,11 @@ const ImageAnalysis = ({ onBack, onNavigateToMaterials }) => {
               </div>
             )}
 
+            <label className="tiled-option">
+              <input type="checkbox" checked={tiled} onChange={(e) => setTiled(e.target.checked)} disabled={loading} />
+              {t('image.tiled', 'Alta resolución (por mosaicos): detecta grietas finas en fotos grandes, más lento')}
+            </label>
+
             {error && <div className="error-message">{error}</div>}
 
             <div className="action-buttons">
@@ -148,21 +148,31 @@ const MaterialManagement = ({ onBack, detectedPathologies, analyzedImage }) => {
     fetchMaterials();
   }, []);
 
+  const MATERIALS_PAGE_SIZE = 100;
+
   const fetchMaterials = async () => {
+    // Cargar por páginas: la primera se muestra de inmediato y el resto se agrega después
+    let cursor = null;
+    let loaded = [];
     try {
-      const response = await fetch('/materials');
-      const data = await response.json();
-      if (data.success) {
+      do {
+        const params = new URLSearchParams({ limit: MATERIALS_PAGE_SIZE });
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`/materials?${params}`);
+        const data = await response.json();
+        if (!data.success) break;
+
         // Asegurar que image_url esté presente en todos los materiales
-        const materialsWithImages = data.materials.map(material => ({
+        const page = data.materials.map(material => ({
           ...material,
           image_url: material.image_url || '',
           category: material.category || 'General'
         }));
-        console.log('Materiales cargados:', materialsWithImages);
-        console.log('Materiales de Impermeabilización:', materialsWithImages.filter(m => m.category === 'Impermeabilización'));
-        setMaterials(materialsWithImages);
-      }
+        loaded = loaded.concat(page);
+        setMaterials(loaded);
+        setLoading(false);
+        cursor = data.next_cursor;
+      } while (cursor);
     } catch (error) {
       console.error('Error al cargar materiales:', error);
     } finally {
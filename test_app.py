@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de los endpoints de app.py (base de datos temporal, sin modelo)
+"""
+import io
+
+import cv2
+import numpy as np
+import pytest
+
+import app as dipia_app
+from dipia.cache import ResultCache
+from dipia.hub import DetectionHub
+from dipia.stream import DetectionBroadcaster
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(dipia_app, "DATABASE", str(tmp_path / "dipia.db"))
+    monkeypatch.setattr(dipia_app, "db_pool", None)
+    monkeypatch.setattr(dipia_app, "detection_recorder", None)
+    monkeypatch.setattr(dipia_app, "detection_hub", DetectionHub.from_config("memory"))
+    monkeypatch.setattr(dipia_app, "detection_stream", DetectionBroadcaster())
+    monkeypatch.setattr(dipia_app, "RELAY_FROM_HUB", False)
+    dipia_app.init_database()
+    yield dipia_app
+    if dipia_app.detection_recorder is not None:
+        dipia_app.detection_recorder.flush()
+    dipia_app.db_pool.close()
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+def detection(label="Crack", confidence=0.9):
+    return {"label": label, "confidence": confidence, "bbox": [0, 0, 10, 10]}
+
+
+def history_rows(server):
+    server.get_detection_recorder().flush()
+    with server.get_db_pool().connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM detection_log").fetchone()[0]
+
+
+def test_bulk_with_an_invalid_batch_stores_nothing(server, client):
+    viewer = server.detection_stream.subscribe()
+    batches = [
+        {"device_id": "pc-1", "detections": [detection()]},
+        {"device_id": "pc-1", "detections": [{"label": "Crack"}]},  # sin confidence
+    ]
+    response = client.post("/receive_detections/bulk", json={"batches": batches})
+
+    # 400: el publicador no reintenta, así que nada se guarda dos veces
+    assert response.status_code == 400
+    assert "Lote 1" in response.get_json()["error"]
+    assert server.detection_hub.latest() is None
+    assert viewer.next_batch(0) is None
+    assert history_rows(server) == 0
+
+
+def test_bulk_stores_every_batch_once(server, client):
+    batches = [{"device_id": "pc-1", "detections": [detection()], "timestamp": 10.0 + i} for i in range(3)]
+    response = client.post("/receive_detections/bulk", json={"batches": batches})
+
+    assert response.get_json() == {"success": True, "received": 3}
+    assert [b["seq"] for b in server.detection_hub.since("pc-1", 0)] == [1, 2, 3]
+    assert history_rows(server) == 3
+
+
+def test_single_batch_validation(server, client):
+    assert client.post("/receive_detections", json={"detections": "Crack"}).status_code == 400
+    assert client.post("/receive_detections", json={"camera_index": "x"}).status_code == 400
+    response = client.post("/receive_detections", json={"device_id": "pc-2", "detections": [detection()]})
+    assert response.status_code == 200
+    assert server.detection_hub.latest("pc-2", 0)["seq"] == 1
+
+
+class FakeBatcher:
+    """Detector sin modelo: siempre una grieta"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def submit(self, image):
+        from dipia.engine import Detections
+        self.calls += 1
+        return Detections(np.array([[1, 1, 20, 20]], np.float32), np.array([0.9], np.float32),
+                          np.array([0], np.int32), {0: "Grieta"})
+
+
+def test_cached_analysis_is_not_recorded_twice(server, client, monkeypatch):
+    batcher = FakeBatcher()
+    monkeypatch.setattr(server, "get_detector_batcher", lambda tiled=False: batcher)
+    monkeypatch.setattr(server, "result_cache", ResultCache(max_bytes=1 << 20))
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+    photo = cv2.imencode(".jpg", np.full((64, 64, 3), 128, np.uint8))[1].tobytes()
+
+    responses = [
+        client.post("/analyze_image", data={"image": (io.BytesIO(photo), "foto.jpg")}).get_json()
+        for _ in range(2)
+    ]
+    assert [r["cached"] for r in responses] == [False, True]
+    assert batcher.calls == 1
+    assert history_rows(server) == 1
+
+
+def login(client, user_id=1):
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+
+
+def add_materials(server, rows):
+    """rows: (nombre, created_at, user_id)"""
+    with server.get_db_pool().connection() as conn:
+        conn.executemany(
+            "INSERT INTO materials (name, supplier, price, unit, user_id, created_at) "
+            "VALUES (?, 'Proveedor', 10, 'KG', ?, ?)",
+            [(name, user_id, created_at) for name, created_at, user_id in rows]
+        )
+        conn.commit()
+
+
+def all_pages(client, limit):
+    names, cursor = [], None
+    while True:
+        url = f"/materials?limit={limit}&fields=name" + (f"&cursor={cursor}" if cursor else "")
+        data = client.get(url).get_json()
+        assert len(data["materials"]) <= limit
+        names.extend(m["name"] for m in data["materials"])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            return names
+
+
+def test_materials_pages_cover_everything_once_in_order(server, client):
+    # Varios con el mismo created_at y uno con created_at NULL (va al final)
+    add_materials(server, [
+        ("a", "2024-01-01 10:00:00", 1),
+        ("b", "2024-01-02 10:00:00", 1),
+        ("c", "2024-01-02 10:00:00", 1),
+        ("d", "2024-01-02 10:00:00", 1),
+        ("e", None, 1),
+        ("f", "2024-01-03 10:00:00", 1),
+        ("otro", "2024-01-05 10:00:00", 2),
+    ])
+    login(client)
+    expected = ["f", "d", "c", "b", "a", "e"]
+    for limit in (1, 2, 3, 5, 6, 10):
+        assert all_pages(client, limit) == expected
+
+    first = client.get("/materials?limit=3&fields=name").get_json()
+    assert [m["name"] for m in first["materials"]] == ["f", "d", "c"]
+    assert client.get("/materials?limit=6").get_json()["next_cursor"] is None
+
+
+def test_materials_rejects_an_invalid_cursor_or_limit(server, client):
+    login(client)
+    assert client.get("/materials?cursor=no-es-un-cursor").status_code == 400
+    assert client.get("/materials?limit=0").status_code == 400
+    assert client.get("/materials?fields=secreto").status_code == 400
+
+
+def test_materials_etag_answers_304_until_something_changes(server, client):
+    add_materials(server, [("a", "2024-01-01 10:00:00", 1)])
+    login(client)
+    first = client.get("/materials?limit=10")
+    etag = first.headers["ETag"]
+    again = client.get("/materials?limit=10", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.get_data() == b""
+
+    add_materials(server, [("b", "2024-01-02 10:00:00", 1)])
+    changed = client.get("/materials?limit=10", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert [m["name"] for m in changed.get_json()["materials"]] == ["b", "a"]
+
+
+def test_before_exit_saves_pending_history(server, client):
+    client.post("/receive_detections", json={"device_id": "pc-1", "detections": [detection()]})
+    server.before_exit()
+    with server.get_db_pool().connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM detection_log").fetchone()[0] == 1
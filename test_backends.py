@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de los backends de inferencia (selección, respaldo y paridad ONNX)
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from dipia.cache import model_fingerprint
+from dipia.engine import Detector, ModelRegistry
+from dipia.engine import backends
+from dipia.engine.tiling import box_iou
+
+
+@pytest.fixture
+def runtimes(monkeypatch):
+    """Runtimes instalados a gusto de cada prueba, sin GPU"""
+    installed = {"torch", "onnx", "openvino"}
+    monkeypatch.setattr(backends, "runtime_available", lambda backend: backend in installed)
+    monkeypatch.setattr(backends, "_cuda_available", lambda: False)
+    return installed
+
+
+def touch(path, age=0):
+    if path.endswith("_openvino_model"):
+        os.makedirs(path, exist_ok=True)
+    else:
+        with open(path, "wb") as f:
+            f.write(path.encode())
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_resolve_prefers_current_exports(tmp_path, runtimes):
+    pt = touch(str(tmp_path / "master_model.pt"), age=100)
+    assert backends.resolve_model(pt) == (pt, "torch")
+
+    onnx = touch(str(tmp_path / "master_model.onnx"))
+    assert backends.resolve_model(pt) == (onnx, "onnx")
+
+    openvino = touch(str(tmp_path / "master_model_openvino_model"))
+    assert backends.resolve_model(pt) == (openvino, "openvino")
+    assert backends.resolve_model(pt, "onnx") == (onnx, "onnx")
+    assert backends.resolve_model(pt, "torch") == (pt, "torch")
+
+    int8 = touch(str(tmp_path / "master_model.int8.onnx"))
+    assert backends.resolve_model(pt, "onnx", int8=True) == (int8, "onnx")
+    assert backends.resolve_model(pt, "onnx") == (onnx, "onnx")
+
+    # Un exportado directo se carga con su backend
+    assert backends.resolve_model(onnx, "torch") == (onnx, "onnx")
+
+
+def test_resolve_falls_back_to_torch(tmp_path, runtimes):
+    pt = touch(str(tmp_path / "master_model.pt"))
+    touch(str(tmp_path / "master_model.onnx"), age=100)
+    # Exportado más viejo que el .pt (modelo reentrenado)
+    assert backends.resolve_model(pt) == (pt, "torch")
+
+    touch(str(tmp_path / "master_model.onnx"))
+    runtimes.discard("onnx")
+    assert backends.resolve_model(pt, "onnx") == (pt, "torch")
+    assert backends.resolve_model(pt) == (pt, "torch")
+
+    with pytest.raises(ValueError):
+        backends.resolve_model(pt, "tensorrt")
+
+
+def test_broken_export_loads_the_pt_instead(tmp_path, runtimes):
+    pt = touch(str(tmp_path / "master_model.pt"), age=100)
+    touch(str(tmp_path / "master_model.onnx"))
+
+    def loader(path):
+        if path.endswith(".onnx"):
+            raise RuntimeError("grafo inválido")
+        return "modelo torch"
+
+    assert backends.load_model(pt, loader=loader) == ("modelo torch", pt, "torch")
+
+    registry = ModelRegistry(loader=lambda path: f"modelo {path}")
+    registry.get("detector", pt)
+    stats = registry.stats()["models"]["detector"]
+    assert (stats["backend"], stats["path"]) == ("onnx", str(tmp_path / "master_model.onnx"))
+
+
+def test_fingerprint_of_model_folder(tmp_path):
+    folder = tmp_path / "master_model_openvino_model"
+    folder.mkdir()
+    (folder / "model.xml").write_text("<net/>")
+    (folder / "model.bin").write_bytes(b"\x00" * 16)
+    first = model_fingerprint(str(folder))
+    assert first == model_fingerprint(str(folder))
+    (folder / "model.bin").write_bytes(b"\x01" * 32)
+    assert model_fingerprint(str(folder)) != first
+
+
+@pytest.fixture(scope="module")
+def exported_tiny(tmp_path_factory):
+    """Un YOLO pequeño (pesos aleatorios, sin descargas) exportado a ONNX"""
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    from ultralytics import YOLO
+
+    folder = tmp_path_factory.mktemp("modelo")
+    pt = str(folder / "tiny.pt")
+    YOLO("yolov8n.yaml").save(pt)
+
+    calibration = folder / "calibracion"
+    calibration.mkdir()
+    rng = np.random.default_rng(0)
+    for i in range(4):
+        cv2.imwrite(str(calibration / f"{i}.jpg"), rng.integers(0, 255, (320, 480, 3), dtype=np.uint8))
+
+    exported = backends.export_model(pt, ("onnx",), batch=4)
+    exported_int8 = backends.export_model(pt, ("onnx",), int8=True, batch=4, data=str(calibration))
+    return pt, exported["onnx"], exported_int8["onnx"]
+
+
+def test_onnx_export_matches_pytorch(exported_tiny):
+    import onnxruntime
+    import torch
+
+    pt, onnx_path, _ = exported_tiny
+    torch_model, _, torch_backend = backends.load_model(pt, "torch", task="detect")
+    onnx_model, path, onnx_backend = backends.load_model(pt, "onnx", task="detect")
+    assert (torch_backend, onnx_backend, path) == ("torch", "onnx", onnx_path)
+
+    # Salida cruda de la red para el mismo lote (cajas y puntajes de las 8400 anclas)
+    batch = torch.rand(2, 3, 640, 640, generator=torch.Generator().manual_seed(0))
+    with torch.no_grad():
+        expected = torch_model.model.float().eval()(batch)[0].numpy()
+    session = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+    actual = session.run(None, {session.get_inputs()[0].name: batch.numpy()})[0]
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, rtol=1e-3, atol=1e-3)
+
+    # Y lo mismo a través de Detector (preprocesado, NMS y cajas en la imagen)
+    rng = np.random.default_rng(1)
+    images = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(3)]
+    for want, got in zip(Detector(torch_model, conf=1e-4).predict_batch(images),
+                         Detector(onnx_model, conf=1e-4).predict_batch(images)):
+        assert len(want) == len(got) > 0
+        assert abs(float(want.scores.max()) - float(got.scores.max())) < 1e-5
+        assert box_iou(want.boxes[0], got.boxes).max() > 0.99
+
+
+def test_int8_export_is_selected_and_runs(exported_tiny):
+    pt, _, int8_path = exported_tiny
+    assert int8_path.endswith(".int8.onnx")
+    model, path, backend = backends.load_model(pt, "onnx", int8=True, task="detect")
+    assert (path, backend) == (int8_path, "onnx")
+
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    detections = Detector(model, conf=0.01).predict(image)
+    assert detections.boxes.shape[1] == 4
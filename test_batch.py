@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del análisis por lotes (detector falso, sin modelo)
+"""
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from dipia import batch
+from dipia.engine import Detections
+
+
+class FakeDetector:
+    """Una caja que cubre cada imagen"""
+
+    def predict_batch(self, images):
+        return [
+            Detections(
+                np.array([[0, 0, image.shape[1], image.shape[0]]], dtype=np.float32),
+                np.array([0.9], dtype=np.float32),
+                np.array([0], dtype=np.int32),
+                {0: "Crack"},
+            )
+            for image in images
+        ]
+
+
+def fake_detector():
+    return FakeDetector()
+
+
+@pytest.fixture
+def survey(tmp_path):
+    folder = tmp_path / "vuelo"
+    (folder / "sub").mkdir(parents=True)
+    for i, path in enumerate([folder / "a.jpg", folder / "b.png", folder / "sub" / "c.jpg"]):
+        cv2.imwrite(str(path), np.full((40 + i, 60, 3), 50 * i, dtype=np.uint8))
+    (folder / "notas.txt").write_text("no es imagen")
+
+    video = folder / "grabacion.avi"
+    writer = cv2.VideoWriter(str(video), cv2.VideoWriter_fourcc(*"MJPG"), 10, (32, 24))
+    for i in range(25):
+        writer.write(np.full((24, 32, 3), i * 10, dtype=np.uint8))
+    writer.release()
+    return folder
+
+
+def read_rows(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_discover_and_plan(survey):
+    files = batch.discover([str(survey)])
+    assert [f.rsplit("/", 1)[-1] for f in files] == ["a.jpg", "b.png", "grabacion.avi", "c.jpg"]
+
+    units = batch.plan_units(files, images_per_unit=2, frames_per_unit=10)
+    assert [u[0] for u in units] == ["images", "images", "video", "video", "video"]
+    assert [(u[2], u[3]) for u in units if u[0] == "video"] == [(0, 10), (10, 20), (20, 25)]
+
+
+def test_run_in_process_samples_every_kth_frame(survey, tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    summary = batch.run([str(survey)], output, fake_detector, workers=0, every=5,
+                        images_per_unit=2, frames_per_unit=10)
+
+    rows = read_rows(output)
+    video_frames = sorted(r["frame"] for r in rows if r["source"].endswith(".avi"))
+    assert video_frames == [0, 5, 10, 15, 20]
+    assert summary["frames"] == 3 + 5
+    assert summary["detections"] == len(rows) == 8
+
+    image = next(r for r in rows if r["source"].endswith("c.jpg"))
+    assert (image["x2"], image["y2"]) == (60, 42)
+    assert image["label"] == "Crack" and image["frame"] is None
+    assert next(r for r in rows if r["frame"] == 10)["time_s"] == 1.0
+
+
+def test_resume_skips_done_units_and_drops_uncommitted_rows(survey, tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    batch.run([str(survey)], output, fake_detector, workers=0, images_per_unit=2, frames_per_unit=10)
+    complete = read_rows(output)
+
+    # Simular una corrida cortada: quitar las dos últimas unidades del checkpoint
+    # y dejar filas escritas que nunca se confirmaron
+    checkpoint = output + ".checkpoint"
+    with open(checkpoint) as f:
+        lines = f.readlines()
+    with open(checkpoint, "w") as f:
+        f.writelines(lines[:-2])
+    with open(output, "a") as f:
+        f.write('{"source": "basura"}\n')
+
+    summary = batch.run([str(survey)], output, fake_detector, workers=0, images_per_unit=2, frames_per_unit=10)
+    assert summary["skipped_units"] == 3
+    assert summary["total_frames"] == 3 + 25
+    assert read_rows(output) == complete
+
+
+def test_resume_with_other_options_is_refused(survey, tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    batch.run([str(survey)], output, fake_detector, workers=0)
+    with pytest.raises(batch.CheckpointMismatch):
+        batch.run([str(survey)], output, fake_detector, workers=0, every=2)
+    batch.run([str(survey)], output, fake_detector, workers=0, every=2, restart=True)
+
+    # Otro modelo u otra confianza tampoco se mezclan con lo ya analizado
+    model = {"model": "yolov8n.pt", "conf": 0.25, "backend": "torch"}
+    batch.run([str(survey)], output, fake_detector, workers=0, every=2, restart=True, detector_params=model)
+    with pytest.raises(batch.CheckpointMismatch):
+        batch.run([str(survey)], output, fake_detector, workers=0, every=2,
+                  detector_params=dict(model, conf=0.5))
+
+
+class KeyframeCapture:
+    """VideoCapture que, como muchos códecs, solo salta a keyframes (cada 10)"""
+
+    def __init__(self, frames, keyframe=10):
+        self.frames = frames
+        self.keyframe = keyframe
+        self.position = 0
+
+    def set(self, prop, value):
+        self.position = int(value) // self.keyframe * self.keyframe
+        return True
+
+    def get(self, prop):
+        return self.position
+
+    def grab(self):
+        if self.position >= self.frames:
+            return False
+        self.position += 1
+        return True
+
+
+def test_seek_lands_on_the_exact_frame():
+    capture = KeyframeCapture(25)
+    assert batch._seek(capture, 13)
+    assert capture.position == 13
+    assert batch._seek(capture, 20) and capture.position == 20
+    assert not batch._seek(capture, 27)
+
+    # Si la posición leída se pasa, se recorre desde el principio
+    overshoot = KeyframeCapture(25)
+    overshoot.set = lambda prop, value: setattr(overshoot, "position", 0 if value == 0 else value + 2)
+    assert batch._seek(overshoot, 7) and overshoot.position == 7
+
+
+def test_process_pool_matches_in_process(survey, tmp_path):
+    serial = str(tmp_path / "serial.jsonl")
+    parallel = str(tmp_path / "parallel.jsonl")
+    batch.run([str(survey)], serial, fake_detector, workers=0, every=3, frames_per_unit=10)
+    summary = batch.run([str(survey)], parallel, fake_detector, workers=2, every=3, frames_per_unit=10)
+
+    key = lambda r: (r["source"], r["frame"] or 0)  # noqa: E731
+    assert sorted(read_rows(parallel), key=key) == sorted(read_rows(serial), key=key)
+    assert summary["fps"] > 0
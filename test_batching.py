@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del micro-batching de inferencias
+"""
+import threading
+import time
+
+import pytest
+
+from dipia.engine import MicroBatcher, QueueFullError
+
+
+class Recorder:
+    """predict_batch falso: anota los lotes y devuelve imagen * 10"""
+
+    def __init__(self, delay=0.0, gate=None):
+        self.batches = []
+        self.delay = delay
+        self.gate = gate
+
+    def __call__(self, images):
+        if self.gate is not None:
+            self.gate.wait()
+        time.sleep(self.delay)
+        self.batches.append(list(images))
+        return [image * 10 for image in images]
+
+
+@pytest.fixture
+def batchers():
+    created = []
+    yield lambda *args, **kwargs: created.append(MicroBatcher(*args, **kwargs)) or created[-1]
+    for batcher in created:
+        batcher.stop()
+
+
+def test_concurrent_requests_coalesce_up_to_max_batch_size(batchers):
+    gate = threading.Event()
+    predict = Recorder(gate=gate)
+    batcher = batchers(predict, max_batch_size=4, max_wait_ms=200)
+
+    # El primer lote queda retenido en predict mientras se encolan los demás
+    futures = [batcher.submit_async(i) for i in range(9)]
+    gate.set()
+    assert [f.result(timeout=5) for f in futures] == [i * 10 for i in range(9)]
+    assert all(len(b) <= 4 for b in predict.batches)
+    assert sum(len(b) for b in predict.batches) == 9
+    assert max(len(b) for b in predict.batches) == 4
+    assert batcher.stats()["total_images"] == 9
+
+
+def test_partial_batch_is_flushed_after_max_wait(batchers):
+    predict = Recorder()
+    batcher = batchers(predict, max_batch_size=8, max_wait_ms=20)
+
+    start = time.perf_counter()
+    assert batcher.submit(3, timeout=5) == 30
+    assert time.perf_counter() - start < 2
+    assert predict.batches == [[3]]
+
+
+def test_full_queue_rejects(batchers):
+    gate = threading.Event()
+    batcher = batchers(Recorder(gate=gate), max_batch_size=1, max_queue=2)
+    first = batcher.submit_async(0)
+    # Esperar a que el worker tome la primera y quede bloqueado en predict
+    deadline = time.time() + 5
+    while batcher.stats()["queue_depth"] and time.time() < deadline:
+        time.sleep(0.01)
+    queued = [batcher.submit_async(i) for i in (1, 2)]
+    with pytest.raises(QueueFullError):
+        batcher.submit_async(3)
+    assert batcher.stats()["rejected"] == 1
+
+    gate.set()
+    assert [f.result(timeout=5) for f in [first] + queued] == [0, 10, 20]
+
+
+def test_result_count_mismatch_fails_every_request(batchers):
+    batcher = batchers(lambda images: images[:-1], max_batch_size=2, max_wait_ms=200)
+    futures = [batcher.submit_async(i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="resultados"):
+            future.result(timeout=5)
+    assert batcher.stats()["errors"] >= 1
+
+
+def test_stop_fails_pending_requests_instead_of_hanging():
+    gate = threading.Event()
+    batcher = MicroBatcher(Recorder(gate=gate), max_batch_size=1, max_queue=8)
+    futures = [batcher.submit_async(i) for i in range(4)]
+    deadline = time.time() + 5
+    while batcher.stats()["queue_depth"] == 4 and time.time() < deadline:
+        time.sleep(0.01)
+
+    stopper = threading.Thread(target=batcher.stop)
+    stopper.start()
+    stopper.join(timeout=5)
+    # Los que seguían en la cola fallan enseguida; el que estaba en predict termina
+    pending = futures[1:]
+    for future in pending:
+        with pytest.raises(RuntimeError, match="detenido"):
+            future.result(timeout=1)
+    gate.set()
+    assert futures[0].result(timeout=5) == 0
+    with pytest.raises(RuntimeError):
+        batcher.submit_async(5)
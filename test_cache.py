@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la caché de resultados por contenido
+"""
+import threading
+import time
+
+import pytest
+
+from dipia.cache import ResultCache, model_fingerprint, result_key
+
+
+def test_key_depends_on_content_model_and_params():
+    key = result_key(b"foto", "detect", "v1", 0.5, language="es")
+    assert key == result_key(b"foto", "detect", "v1", 0.5, language="es")
+    assert key != result_key(b"otra", "detect", "v1", 0.5, language="es")
+    assert key != result_key(b"foto", "detect", "v2", 0.5, language="es")
+    assert key != result_key(b"foto", "detect", "v1", 0.25, language="es")
+    assert key != result_key(b"foto", "extended", "v1", 0.5, language="es")
+    assert key != result_key(b"foto", "detect", "v1", 0.5, language="en")
+
+
+def test_model_fingerprint_changes_with_file(tmp_path):
+    path = tmp_path / "model.pt"
+    path.write_bytes(b"pesos v1")
+    first = model_fingerprint(str(path))
+    assert first == model_fingerprint(str(path))
+    path.write_bytes(b"pesos v2, otro entrenamiento")
+    assert model_fingerprint(str(path)) != first
+    assert model_fingerprint(None) == "none"
+
+
+def test_hits_misses_and_copies():
+    cache = ResultCache(max_bytes=1024)
+    assert cache.get("a") is None
+    cache.put("a", {"detections": [{"label": "Crack"}]})
+
+    value = cache.get("a")
+    value["detections"].clear()
+    assert cache.get("a") == {"detections": [{"label": "Crack"}]}
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3, abs=1e-4)
+
+
+def test_lru_eviction_respects_byte_budget():
+    cache = ResultCache(max_bytes=100)
+    payload = {"d": "x" * 30}  # ~40 bytes en JSON
+    cache.put("a", payload)
+    cache.put("b", payload)
+    cache.get("a")  # "b" pasa a ser el menos usado
+    cache.put("c", payload)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == payload and cache.get("c") == payload
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= 100
+
+    # Un resultado más grande que todo el presupuesto no se guarda
+    cache.put("big", {"d": "x" * 200})
+    assert cache.get("big") is None
+
+
+def test_disk_persistence_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResultCache(max_bytes=1024, path=path).put("k", {"detections": [1, 2]})
+
+    restarted = ResultCache(max_bytes=1024, path=path)
+    assert restarted.get("k") == {"detections": [1, 2]}
+    assert restarted.stats()["disk_hits"] == 1
+    # Ya está en memoria
+    restarted.get("k")
+    assert restarted.stats()["hits"] == 1
+
+
+def test_disk_budget_drops_least_recently_used(tmp_path):
+    cache = ResultCache(max_bytes=0, path=str(tmp_path / "cache.db"), max_disk_bytes=100)
+    payload = {"d": "x" * 30}
+    for key in ("a", "b", "c"):
+        cache.put(key, payload)
+        time.sleep(0.01)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == payload and cache.get("c") == payload
+
+
+def test_get_or_compute_runs_once_for_concurrent_requests():
+    cache = ResultCache(max_bytes=1024)
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return {"detections": []}
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+    first.start()
+    started.wait()
+    results.append(cache.get_or_compute("k", compute))
+    first.join()
+
+    assert len(calls) == 1
+    assert sorted(cached for _, cached in results) == [False, True]
+    assert cache.get_or_compute("k", compute) == ({"detections": []}, True)
+
+
+def test_get_or_compute_rechecks_after_the_owner_finishes(monkeypatch):
+    cache = ResultCache(max_bytes=1024)
+    cache.put("k", {"detections": [1]})
+    miss = cache.get
+
+    def late_get(key):
+        # get() corrió justo antes de que el dueño guardara el resultado
+        miss("otra")
+        return None
+
+    monkeypatch.setattr(cache, "get", late_get)
+    calls = []
+    assert cache.get_or_compute("k", lambda: calls.append(1)) == ({"detections": [1]}, True)
+    assert calls == []
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 0
+
+
+def test_get_or_compute_does_not_cache_errors():
+    cache = ResultCache(max_bytes=1024)
+
+    def fail():
+        raise RuntimeError("cola llena")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", fail)
+    assert cache.get_or_compute("k", lambda: {"ok": True}) == ({"ok": True}, False)
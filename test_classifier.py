@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de los recortes y la clasificación por lotes (IA N°2, modelo falso)
+"""
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+from dipia.engine import classify_batch, crop_boxes
+from dipia.engine.classifier import PAD_VALUE, letterbox
+
+
+def test_crop_boxes_clips_to_the_image_and_skips_tiny_boxes():
+    image = np.arange(100 * 80 * 3, dtype=np.uint32).reshape(100, 80, 3).astype(np.uint8)
+    boxes = [
+        [-10, -5, 30, 40],    # sale por arriba a la izquierda
+        [60, 90, 120, 130],   # sale por abajo a la derecha: queda de 20x10
+        [10, 10, 14, 50],     # 4 px de ancho: demasiado chica
+        [50, 50, 40, 60],     # invertida
+        [200, 200, 260, 260], # fuera de la imagen
+    ]
+    crops, valid = crop_boxes(image, boxes, min_size=8)
+
+    assert valid == [0, 1]
+    assert crops[0].shape == (40, 30, 3)
+    assert crops[1].shape == (10, 20, 3)
+    np.testing.assert_array_equal(crops[1], image[90:100, 60:80])
+    assert crop_boxes(image, np.zeros((0, 4)), min_size=8) == ([], [])
+
+
+def test_letterbox_keeps_the_aspect_ratio():
+    canvas = letterbox(np.full((20, 80, 3), 7, np.uint8), 40)
+    assert canvas.shape == (40, 40, 3)
+    assert (canvas[15:25] == 7).all()
+    assert (canvas[:15] == PAD_VALUE).all() and (canvas[25:] == PAD_VALUE).all()
+
+
+class FakeClassifier:
+    """Devuelve como clase el valor de gris de cada recorte"""
+
+    names = {i: f"gris_{i}" for i in range(256)}
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, batch, imgsz, verbose):
+        self.calls.append([image.shape for image in batch])
+        results = []
+        for image in batch:
+            probs = np.zeros(256, np.float32)
+            probs[int(image[imgsz // 2, imgsz // 2, 0])] = 0.75
+            results.append(SimpleNamespace(probs=SimpleNamespace(data=probs), names=self.names))
+        return results
+
+
+def test_classify_batch_is_one_call_in_crop_order():
+    model = FakeClassifier()
+    crops = [np.full((h, w, 3), value, np.uint8) for h, w, value in [(10, 30, 3), (50, 20, 9), (8, 8, 1)]]
+
+    lock = threading.Lock()
+    predictions = classify_batch(model, crops, imgsz=32, lock=lock)
+
+    assert predictions == [("gris_3", 0.75), ("gris_9", 0.75), ("gris_1", 0.75)]
+    assert model.calls == [[(32, 32, 3)] * 3]
+    assert not lock.locked()
+    assert classify_batch(model, [], imgsz=32) == []
+    assert len(model.calls) == 1
+
+
+def test_unknown_classes_use_the_language_prefix():
+    class Unnamed(FakeClassifier):
+        names = None
+
+    crops = [np.full((8, 8, 3), 4, np.uint8)]
+    assert classify_batch(Unnamed(), crops, imgsz=16) == [("Class_4", 0.75)]
+    assert classify_batch(Unnamed(), crops, imgsz=16, language="es") == [("Clase_4", 0.75)]
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del pool de conexiones SQLite
+"""
+import threading
+
+import pytest
+
+from dipia.db import PoolTimeout, SQLitePool
+
+
+def test_pool_never_lends_more_than_size(tmp_path):
+    pool = SQLitePool(str(tmp_path / "pool.db"), size=2, acquire_timeout_ms=50)
+    first, second = pool.acquire(), pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()["in_use"] == 2 and pool.stats()["opened"] == 2
+
+    # El que espera recibe la conexión que se devuelve
+    received = []
+    waiter = threading.Thread(target=lambda: received.append(pool.acquire(timeout_ms=5000)))
+    waiter.start()
+    pool.release(first)
+    waiter.join(timeout=5)
+    assert received == [first]
+    assert pool.stats()["opened"] == 2
+
+    pool.release(second)
+    pool.release(received[0])
+    assert pool.stats()["in_use"] == 0 and pool.stats()["idle"] == 2
+    pool.close()
+
+
+def test_pool_reuses_connections_and_rolls_back(tmp_path):
+    pool = SQLitePool(str(tmp_path / "pool.db"), size=1)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")  # sin commit
+    with pool.connection() as again:
+        assert again is conn
+        assert again.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    assert pool.stats()["opened"] == 1
+    pool.close()
+
+
+def test_size_zero_opens_and_closes_each_time(tmp_path):
+    pool = SQLitePool(str(tmp_path / "pool.db"), size=0)
+    connections = [pool.acquire() for _ in range(3)]
+    for conn in connections:
+        pool.release(conn)
+    assert pool.stats() == {"size": 0, "idle": 0, "in_use": 0, "opened": 3, "wal": True}
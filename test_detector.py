@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del detector compartido (etiquetas, sin modelo real)
+"""
+import numpy as np
+
+from dipia.engine import Detector, Detections
+
+
+class NamelessModel:
+    """Modelo que solo nombra la clase 1"""
+
+    names = {1: "grieta"}
+
+
+def detections_of(detector, class_ids):
+    count = len(class_ids)
+    return Detections(
+        np.zeros((count, 4), dtype=np.float32), np.full(count, 0.9, dtype=np.float32),
+        np.array(class_ids, dtype=np.int32), detector.class_map, detector.label_table,
+    )
+
+
+def test_labels_follow_the_language_including_unknown_classes():
+    spanish = Detector(NamelessModel(), language="es")
+    english = Detector(NamelessModel(), language="en")
+
+    # Clase 0 sin nombre (dentro de la tabla) y 7 fuera de ella
+    assert detections_of(spanish, [1, 0, 7]).labels == ["Crack", "Clase_0", "Clase_7"]
+    assert detections_of(english, [1, 0, 7]).labels == ["Crack", "Class_0", "Class_7"]
+    assert [d["label"] for d in detections_of(spanish, [7]).to_list()] == ["Clase_7"]
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la preparación de frames para Tk
+"""
+import numpy as np
+
+from dipia.display import FrameRenderer, fit_size, ppm_bytes
+
+
+def test_fit_size_never_upscales():
+    assert fit_size(640, 480, 800, 450) == (600, 450)
+    assert fit_size(1920, 1080, 800, 450) == (800, 450)
+    assert fit_size(320, 240, 800, 450) == (320, 240)
+
+
+def test_prepare_reuses_buffers_and_converts_to_rgb():
+    renderer = FrameRenderer(800, 450)
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    frame[..., 0] = 255  # azul en BGR
+
+    outputs = [renderer.prepare(frame) for _ in range(4)]
+    assert outputs[0].shape == (450, 800, 3)
+    assert (outputs[0][0, 0] == [0, 0, 255]).all()
+    # Mientras nadie los devuelva, ningún buffer prestado se vuelve a escribir
+    assert len({id(output) for output in outputs}) == 4
+
+    # Los devueltos se reutilizan (hasta POOL_SIZE)
+    for output in outputs:
+        renderer.release(output)
+    again = [renderer.prepare(frame) for _ in range(4)]
+    assert sum(any(a is o for o in outputs) for a in again) == FrameRenderer.POOL_SIZE
+
+    # Nuevo tamaño de ventana: se recalcula la salida
+    renderer.set_bounds(400, 400)
+    assert renderer.prepare(frame).shape == (225, 400, 3)
+
+
+def test_ppm_header():
+    data = ppm_bytes(np.zeros((2, 3, 3), dtype=np.uint8))
+    assert data.startswith(b"P6 3 2 255\n")
+    assert len(data) == len(b"P6 3 2 255\n") + 18
+
+
+class FakeLabel:
+    def config(self, **kwargs):
+        pass
+
+
+def test_show_returns_the_buffer_only_after_copying(monkeypatch):
+    from dipia import display
+
+    renderer = FrameRenderer(64, 64, use_pil=False)
+    frame = np.zeros((32, 32, 3), dtype=np.uint8)
+    shown = renderer.prepare(frame)
+    pending = renderer.prepare(frame)
+
+    copied = []
+
+    class FakePhoto:
+        def __init__(self, data, format):
+            # Durante la copia el render no puede recibir el buffer que se muestra
+            assert renderer.prepare(frame) is not shown
+            copied.append(data)
+
+    monkeypatch.setattr(display.tk, "PhotoImage", FakePhoto)
+    renderer.show(FakeLabel(), shown)
+    assert copied and renderer.prepare(frame) is shown
+    assert renderer.prepare(frame) is not pending
+
+
+def test_drop_oldest_queue_returns_the_discarded_item():
+    from dipia.pipeline import DropOldestQueue
+
+    queue = DropOldestQueue(1)
+    assert queue.put("a") is None
+    assert queue.put("b") == "a"
+    assert queue.get(timeout=0) == "b" and queue.dropped == 1
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del historial de detecciones y de sus agregados
+"""
+import sqlite3
+
+from dipia.db import SQLitePool
+from dipia.history import (
+    DetectionRecorder, bucket_counts, confidence_histogram, label_trends, rows_from_batch, write_rows
+)
+from dipia.migrations import migrate
+
+DAY = 86400
+NOW = 100 * DAY + 3600 * 12  # mediodía de un día cualquiera
+
+
+def make_db(tmp_path):
+    conn = sqlite3.connect(tmp_path / "history.db")
+    migrate(conn)
+    return conn
+
+
+def det(label, confidence, **extra):
+    return {"label": label, "confidence": confidence, "bbox": [1, 2, 3, 4], "class_id": 0, **extra}
+
+
+def test_rollups_match_raw_log(tmp_path):
+    conn = make_db(tmp_path)
+    rows = []
+    for i in range(120):
+        batch = {"timestamp": NOW + i * 30, "device_id": "pc", "camera_index": i % 2,
+                 "detections": [det("Crack", 0.95), det("Humidity", 0.42)]}
+        rows += rows_from_batch(batch)
+    # Dos lotes: el segundo suma sobre los agregados existentes
+    write_rows(conn, rows[:100])
+    write_rows(conn, rows[100:])
+
+    assert conn.execute("SELECT COUNT(*) FROM detection_log").fetchone()[0] == 240
+    hourly = bucket_counts(conn, [0], NOW, NOW + 3600, "hour")
+    assert hourly == [
+        {"bucket": NOW, "label": "Crack", "count": 120, "avg_confidence": 0.95},
+        {"bucket": NOW, "label": "Humidity", "count": 120, "avg_confidence": 0.42},
+    ]
+    by_minute = bucket_counts(conn, [0], NOW, NOW + 600, "minute", label="Crack", camera_index=0)
+    assert [c["count"] for c in by_minute] == [1] * 10
+
+    histograms = confidence_histogram(conn, [0], NOW, NOW + 3600)
+    assert histograms["Crack"][9] == 120
+    assert histograms["Humidity"][4] == 120
+    conn.close()
+
+
+def test_users_are_isolated(tmp_path):
+    conn = make_db(tmp_path)
+    write_rows(conn, rows_from_batch({"timestamp": NOW, "detections": [det("Crack", 0.9)]}, user_id=7))
+    write_rows(conn, rows_from_batch({"timestamp": NOW, "detections": [det("Crack", 0.9)]}, user_id=8))
+    write_rows(conn, rows_from_batch({"timestamp": NOW, "detections": [det("Crack", 0.9)]}))
+    assert bucket_counts(conn, [0, 7], NOW, NOW + 1, "day")[0]["count"] == 2
+    conn.close()
+
+
+def test_tracked_batches_log_each_object_once():
+    tracked = {"timestamp": NOW, "detections": [det("Crack", 0.8, track_id=3)], "events": []}
+    assert rows_from_batch(tracked) == []
+    appeared = dict(tracked, events=[det("Crack", 0.9, track_id=3, event="appeared")])
+    (row,) = rows_from_batch(appeared)
+    assert row[5:7] == ("Crack", 0.9)
+    assert row[-1] == 3
+
+
+def test_trends(tmp_path):
+    conn = make_db(tmp_path)
+    rows = []
+    for day in range(14):
+        count = 2 if day < 7 else 3
+        for _ in range(count):
+            rows += rows_from_batch({"timestamp": NOW - day * DAY, "detections": [det("Crack", 0.9)]})
+    write_rows(conn, rows)
+
+    (trend,) = label_trends(conn, [0], days=7, now=NOW)
+    assert trend["count"] == 14
+    assert trend["previous"] == 21
+    assert trend["change"] == round((14 - 21) / 21, 4)
+    assert [d["count"] for d in trend["daily"]] == [2] * 7
+    conn.close()
+
+
+def test_recorder_batches_writes(tmp_path):
+    path = str(tmp_path / "recorder.db")
+    pool = SQLitePool(path)
+    with pool.connection() as conn:
+        migrate(conn)
+    recorder = DetectionRecorder(pool, max_pending=5)
+    recorder.record(rows_from_batch({"timestamp": NOW, "detections": [det("Crack", 0.9)] * 4}))
+    recorder.record(rows_from_batch({"timestamp": NOW, "detections": [det("Crack", 0.9)] * 4}))
+    assert recorder.flush() == 5
+    assert recorder.stats() == {"written": 5, "pending": 0, "dropped": 3, "flushes": 1}
+    with pool.connection() as conn:
+        assert conn.execute("SELECT SUM(count) FROM detection_rollup WHERE resolution = 60").fetchone()[0] == 5
+
+
+def test_stop_writes_what_is_pending(tmp_path):
+    pool = SQLitePool(str(tmp_path / "recorder.db"))
+    with pool.connection() as conn:
+        migrate(conn)
+    recorder = DetectionRecorder(pool, flush_interval=60).start()
+    recorder.record(rows_from_batch({"timestamp": NOW, "detections": [det("Crack", 0.9)] * 3}))
+
+    # El hilo espera 60 s: sin stop() estas filas se perderían al salir
+    assert recorder.stop() == 3
+    assert recorder._thread is None
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM detection_log").fetchone()[0] == 3
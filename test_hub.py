@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del concentrador de detecciones por dispositivo/cámara
+"""
+import pytest
+
+from dipia.hub import DetectionHub, MemoryHubBackend, SQLiteHubBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def hub(request, tmp_path):
+    if request.param == "memory":
+        return DetectionHub(MemoryHubBackend(capacity=3))
+    return DetectionHub(SQLiteHubBackend(str(tmp_path / "hub.db"), capacity=3))
+
+
+def batch(device, camera, label="Crack", timestamp=1.0):
+    return {"device_id": device, "camera_index": camera, "timestamp": timestamp,
+            "detections": [{"label": label}], "events": []}
+
+
+def test_streams_do_not_overwrite_each_other(hub):
+    hub.publish(batch("pc-1", 0, "Crack"))
+    hub.publish(batch("pc-2", 0, "Humidity"))
+    hub.publish(batch("pc-1", 1, "Person"))
+
+    assert hub.latest("pc-1", 0)["detections"] == [{"label": "Crack"}]
+    assert hub.latest("pc-2", 0)["detections"] == [{"label": "Humidity"}]
+    # Sin filtro: el último lote recibido de cualquier stream
+    assert hub.latest()["detections"] == [{"label": "Person"}]
+    assert hub.latest(camera_index=0)["device_id"] in ("pc-1", "pc-2")
+
+
+def test_since_reads_and_ring_buffer(hub):
+    seqs = [hub.publish(batch("pc-1", 0, timestamp=i))["seq"] for i in range(5)]
+    assert seqs == [1, 2, 3, 4, 5]
+
+    # Capacidad 3: solo quedan los últimos
+    assert [b["seq"] for b in hub.since("pc-1", 0)] == [3, 4, 5]
+    assert [b["seq"] for b in hub.since("pc-1", 0, since=4)] == [5]
+    assert [b["seq"] for b in hub.since("pc-1", 0, since=2, limit=2)] == [3, 4]
+    assert hub.since("pc-9", 0) == []
+
+    (stream,) = hub.stats()["streams"]
+    assert stream["last_seq"] == 5
+    assert stream["buffered"] == 3
+    assert stream["detections"] == 5
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "hub.db")
+    worker_a = DetectionHub(SQLiteHubBackend(path))
+    worker_b = DetectionHub(SQLiteHubBackend(path))
+    worker_a.publish(batch("pc-1", 0))
+    assert worker_b.publish(batch("pc-1", 0))["seq"] == 2
+    assert [b["seq"] for b in worker_a.since("pc-1", 0)] == [1, 2]
+
+
+def test_missing_device_uses_default():
+    hub = DetectionHub(MemoryHubBackend())
+    published = hub.publish({"detections": [], "camera_index": 2})
+    assert (published["device_id"], published["camera_index"], published["seq"]) == ("default", 2, 1)
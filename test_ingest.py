@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la lectura y decodificación de imágenes subidas
+"""
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from dipia.engine import Detections
+from dipia.ingest import (
+    ImageTooLarge, InvalidImage, decode_image, image_dimensions, read_upload, reduction_factor,
+)
+
+
+def encode(width, height, ext=".jpg"):
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[:, : width // 2] = (0, 0, 255)
+    ok, buffer = cv2.imencode(ext, image)
+    assert ok
+    return buffer.tobytes()
+
+
+def test_read_upload_stops_at_limit():
+    assert read_upload(io.BytesIO(b"x" * 1000), max_bytes=1000, chunk_size=64) == b"x" * 1000
+    with pytest.raises(ImageTooLarge):
+        read_upload(io.BytesIO(b"x" * 1001), max_bytes=1000, chunk_size=64)
+
+
+def test_reduction_factor_keeps_long_side_above_target():
+    assert reduction_factor(640, 480, 1280) == 1
+    assert reduction_factor(2560, 1440, 1280) == 2
+    assert reduction_factor(7680, 5120, 1280) == 4
+    assert reduction_factor(20000, 10000, 1280) == 8
+    assert reduction_factor(7680, 5120, 0) == 1
+
+
+def test_small_image_is_decoded_full_size():
+    decoded = decode_image(encode(320, 200), target_size=1280)
+    assert decoded.image.shape == (200, 320, 3)
+    assert decoded.original_size == (320, 200)
+    assert decoded.scale == 1.0
+
+
+def test_large_jpeg_is_decoded_reduced_and_boxes_map_back():
+    decoded = decode_image(encode(4000, 3000), target_size=1000)
+    assert decoded.image.shape == (750, 1000, 3)
+    assert decoded.original_size == (4000, 3000)
+    assert decoded.scale == pytest.approx(0.25)
+
+    # Caja detectada en la imagen reducida → píxeles de la original
+    detections = Detections(
+        np.array([[100, 50, 1000, 750]], dtype=np.float32),
+        np.array([0.9], dtype=np.float32),
+        np.array([0], dtype=np.int32),
+        {0: "Crack"},
+    )
+    bbox = decoded.to_original(detections).to_list()[0]["bbox"]
+    assert bbox == [400, 200, 4000, 3000]
+
+
+def test_png_with_alpha_and_gif_decode_to_bgr():
+    for mode, fmt in (("RGBA", "PNG"), ("L", "GIF")):
+        buffer = io.BytesIO()
+        Image.new(mode, (40, 30)).save(buffer, fmt)
+        assert decode_image(buffer.getvalue()).image.shape == (30, 40, 3)
+
+
+def test_exif_rotation_swaps_original_size():
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = 6  # girar 90°
+    Image.new("RGB", (64, 32)).save(buffer, "JPEG", exif=exif)
+    assert image_dimensions(buffer.getvalue()) == (32, 64)
+
+    decoded = decode_image(buffer.getvalue())
+    assert decoded.image.shape[:2] == (64, 32)
+    assert decoded.original_size == (32, 64)
+
+
+def test_rejects_too_many_pixels_before_decoding():
+    with pytest.raises(ImageTooLarge) as error:
+        decode_image(encode(2000, 1000), max_pixels=1_000_000)
+    assert error.value.status == 413
+
+
+def test_rejects_garbage():
+    for data in (b"", b"not an image"):
+        with pytest.raises(InvalidImage) as error:
+            decode_image(data)
+        assert error.value.status == 400
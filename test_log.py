@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del logging estructurado (muestreo e IDs de correlación)
+"""
+import json
+import logging
+
+from dipia.log import ContextFilter, JsonFormatter, SamplingFilter, frame_id_var, request_id_var
+
+
+def make_record(msg="evento", **extra):
+    record = logging.LogRecord("dipia.test", logging.INFO, __file__, 1, msg, (), None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_sampling_only_affects_marked_records():
+    sampler = SamplingFilter(every=10)
+    passed = [sampler.filter(make_record(sample="frame")) for _ in range(30)]
+    assert sum(passed) == 3
+    assert all(sampler.filter(make_record()) for _ in range(5))
+
+
+def test_json_carries_correlation_ids():
+    request_token = request_id_var.set("abc123")
+    frame_token = frame_id_var.set("sess-42")
+    try:
+        record = make_record(count=3)
+        ContextFilter().filter(record)
+    finally:
+        request_id_var.reset(request_token)
+        frame_id_var.reset(frame_token)
+
+    event = json.loads(JsonFormatter().format(record))
+    assert event["msg"] == "evento"
+    assert event["level"] == "INFO"
+    assert event["request_id"] == "abc123"
+    assert event["frame_id"] == "sess-42"
+    assert event["count"] == 3
+
+
+def test_explicit_frame_id_wins_over_context():
+    record = make_record(frame_id="client-7")
+    ContextFilter().filter(record)
+    assert record.frame_id == "client-7"
+    assert "request_id" not in json.loads(JsonFormatter().format(record))
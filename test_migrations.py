@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de las migraciones del esquema y de los índices de materials
+"""
+import os
+import shutil
+import sqlite3
+
+from dipia.migrations import MIGRATIONS, current_version, migrate
+
+
+def query_plan(conn, sql, params=()):
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+def test_fresh_database(tmp_path):
+    """Una base nueva queda en la última versión"""
+    conn = sqlite3.connect(tmp_path / "fresh.db")
+    assert migrate(conn) == [version for version, _ in MIGRATIONS]
+    assert current_version(conn) == MIGRATIONS[-1][0]
+    # Volver a migrar no aplica nada
+    assert migrate(conn) == []
+    conn.close()
+
+
+def test_legacy_database_gets_missing_columns(tmp_path):
+    """Una base anterior a las migraciones recibe las columnas que le faltan"""
+    conn = sqlite3.connect(tmp_path / "legacy.db")
+    conn.execute('''
+        CREATE TABLE materials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL, supplier TEXT NOT NULL, price REAL NOT NULL,
+            unit TEXT NOT NULL, user_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    migrate(conn)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(materials)")]
+    for column in ("category", "pathology_related", "image_url", "is_favorite", "usage_count"):
+        assert column in columns
+    conn.close()
+
+
+def test_project_database_migrates(tmp_path):
+    """La base de datos del repositorio se puede migrar sin errores"""
+    path = tmp_path / "dipia.db"
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "dipia.db"), path)
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    assert current_version(conn) == MIGRATIONS[-1][0]
+    conn.close()
+
+
+def test_materials_queries_use_indexes(tmp_path):
+    """EXPLAIN QUERY PLAN: las consultas por usuario usan los índices compuestos"""
+    conn = sqlite3.connect(tmp_path / "plan.db")
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO materials (name, supplier, price, unit, category, user_id) VALUES (?, ?, ?, ?, ?, ?)",
+        [(f"m{i}", "s", 1.0, "KG", f"c{i % 7}", i % 50) for i in range(2000)]
+    )
+    conn.execute("ANALYZE")
+
+    plan = query_plan(conn, "SELECT * FROM materials WHERE user_id = ? ORDER BY created_at DESC", (1,))
+    assert "idx_materials_user_created" in plan
+    assert "TEMP B-TREE" not in plan
+
+    plan = query_plan(conn, "SELECT * FROM materials WHERE user_id = ? AND category = ?", (1, "c1"))
+    assert "idx_materials_user_category" in plan
+
+    plan = query_plan(
+        conn,
+        "SELECT name, COUNT(*) FROM materials WHERE user_id = ? GROUP BY name",
+        (1,)
+    )
+    assert "idx_materials_user_name" in plan
+    assert "TEMP B-TREE" not in plan
+    conn.close()
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de las colas y contadores del pipeline de video
+"""
+import threading
+
+from dipia.pipeline import DropOldestQueue, StageStats
+
+
+def test_queue_drops_oldest_when_full():
+    q = DropOldestQueue(2)
+    for i in range(5):
+        q.put(i)
+    assert q.dropped == 3
+    assert [q.get(timeout=0), q.get(timeout=0)] == [3, 4]
+    assert q.get(timeout=0) is None
+
+
+def test_get_wakes_up_on_put():
+    q = DropOldestQueue(1)
+    threading.Timer(0.05, q.put, args=("frame",)).start()
+    assert q.get(timeout=2) == "frame"
+
+
+def test_stage_stats():
+    stats = StageStats("inference")
+    for i in range(11):
+        stats.record(latency_ms=10 + i, now=i * 0.1)
+    assert round(stats.fps(now=1.0), 1) == 10.0
+    assert stats.latency_ms() == 15
+    # Sin frames recientes la etapa está detenida
+    assert stats.fps(now=10.0) == 0.0
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del publicador de detecciones de la app de escritorio
+"""
+import threading
+import time
+
+import requests
+
+from dipia.publisher import DetectionPublisher
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeSession:
+    """Sesión HTTP que responde con los códigos indicados, en orden"""
+
+    def __init__(self, statuses=(), delay=0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.posts = []
+        self.started = threading.Event()
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        self.started.set()
+        time.sleep(self.delay)
+        self.posts.append(json)
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status is None:
+            raise requests.ConnectionError("sin conexión")
+        return FakeResponse(status)
+
+    def close(self):
+        pass
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_batches_are_coalesced_into_one_post():
+    session = FakeSession()
+    publisher = DetectionPublisher("http://test/bulk", linger_ms=100, session=session)
+    for i in range(5):
+        publisher.submit({"frame_id": f"s-{i}"})
+    wait_for(lambda: publisher.stats()["sent"] == 5)
+    publisher.stop()
+
+    assert len(session.posts) == 1
+    assert [b["frame_id"] for b in session.posts[0]["batches"]] == [f"s-{i}" for i in range(5)]
+    assert publisher.stats()["requests"] == 1
+
+
+def test_retries_with_backoff_then_succeeds():
+    session = FakeSession([None, 503, 200])
+    publisher = DetectionPublisher("http://test/bulk", linger_ms=0, backoff=0.01, session=session)
+    publisher.submit({"frame_id": "s-1"})
+    wait_for(lambda: publisher.stats()["sent"] == 1)
+    publisher.stop()
+
+    stats = publisher.stats()
+    assert stats["retries"] == 2
+    assert stats["failed"] == 0
+    assert len(session.posts) == 3
+
+
+def test_client_errors_are_not_retried():
+    session = FakeSession([400])
+    publisher = DetectionPublisher("http://test/bulk", linger_ms=0, backoff=0.01, session=session)
+    publisher.submit({"frame_id": "s-1"})
+    wait_for(lambda: publisher.stats()["failed"] == 1)
+    publisher.stop()
+    assert publisher.stats()["retries"] == 0
+    assert publisher.last_error == "HTTP 400"
+
+
+def test_full_queue_drops_oldest_without_blocking():
+    session = FakeSession(delay=0.2)
+    publisher = DetectionPublisher("http://test/bulk", max_queue=2, linger_ms=0, session=session)
+    publisher.submit({"frame_id": "s-0"})
+    session.started.wait(1)
+    start = time.perf_counter()
+    for i in range(1, 6):
+        publisher.submit({"frame_id": f"s-{i}"})
+    assert time.perf_counter() - start < 0.05
+    wait_for(lambda: publisher.stats()["sent"] == 3)
+    publisher.stop()
+
+    assert publisher.stats()["dropped"] == 3
+    assert [b["frame_id"] for b in session.posts[1]["batches"]] == ["s-4", "s-5"]
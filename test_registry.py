@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del registro de modelos (cargador falso, sin pesos reales)
+"""
+import threading
+import time
+
+import pytest
+
+from dipia.engine import ModelRegistry
+
+
+class FakeModel:
+    def __init__(self, path):
+        self.path = path
+        self.predictions = []
+
+    def predict(self, image, verbose=False):
+        self.predictions.append(image.shape)
+        return []
+
+
+class SlowLoader:
+    """Cargador que tarda, para que los hilos se pisen"""
+
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.loaded = []
+        self._lock = threading.Lock()
+
+    def __call__(self, path):
+        time.sleep(self.delay)
+        with self._lock:
+            self.loaded.append(path)
+        return FakeModel(path)
+
+
+@pytest.fixture
+def weights(tmp_path):
+    paths = {}
+    for name in ("detector", "clasificador"):
+        path = tmp_path / f"{name}.pt"
+        path.write_bytes(b"")
+        paths[name] = str(path)
+    return paths
+
+
+def test_concurrent_first_requests_load_once(weights):
+    loader = SlowLoader()
+    registry = ModelRegistry(loader=loader, backend="torch")
+    start = threading.Barrier(8)
+    models = []
+
+    def request():
+        start.wait()
+        models.append(registry.get("detector", weights["detector"]))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert loader.loaded == [weights["detector"]]
+    assert len(models) == 8 and all(model is models[0] for model in models)
+    assert registry.is_loaded("detector") and not registry.is_loaded("clasificador")
+
+
+def test_each_model_has_its_own_inference_lock(weights):
+    registry = ModelRegistry(loader=FakeModel, backend="torch")
+    for name, path in weights.items():
+        registry.get(name, path)
+
+    detector_lock = registry.inference_lock("detector")
+    assert registry.inference_lock("detector") is detector_lock
+    with detector_lock:
+        # Inferir con otro modelo no espera al detector
+        assert registry.inference_lock("clasificador").acquire(timeout=0.1)
+        registry.inference_lock("clasificador").release()
+    with pytest.raises(KeyError):
+        registry.inference_lock("no_cargado")
+
+
+def test_warmup_runs_one_prediction_under_the_lock(weights):
+    registry = ModelRegistry(loader=FakeModel, backend="torch")
+    assert registry.warmup("detector") is None  # sin cargar: no hace nada
+
+    model = registry.get("detector", weights["detector"])
+    assert registry.warmup("detector", imgsz=64) >= 0
+    assert model.predictions == [(64, 64, 3)]
+    assert not registry.inference_lock("detector").locked()
+    assert registry.stats()["models"]["detector"]["warmup_ms"] is not None
+
+    assert registry.preload("clasificador", weights["clasificador"], warmup=False)
+    assert registry.stats()["models"]["clasificador"]["warmup_ms"] is None
+
+
+def test_stats_report_loads_and_errors(weights, tmp_path):
+    def broken(path):
+        raise RuntimeError("pesos corruptos")
+
+    registry = ModelRegistry(loader=FakeModel, backend="torch")
+    registry.get("detector", weights["detector"])
+    assert not registry.preload("faltante", str(tmp_path / "no_existe.pt"))
+
+    stats = registry.stats()["models"]
+    assert stats["detector"]["loaded"] and stats["detector"]["backend"] == "torch"
+    assert stats["detector"]["path"] == weights["detector"]
+    assert stats["detector"]["load_time_ms"] >= 0
+    assert stats["faltante"] == {"loaded": False, "error": f"{tmp_path / 'no_existe.pt'} no encontrado"}
+
+    # Un fallo de carga queda registrado y no deja un modelo a medias
+    failing = ModelRegistry(loader=broken, backend="torch")
+    with pytest.raises(RuntimeError):
+        failing.get("detector", weights["detector"])
+    assert failing.stats()["models"]["detector"] == {"loaded": False, "error": "pesos corruptos"}
+    assert not failing.is_loaded("detector")
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del planificador adaptativo de inferencia
+"""
+import numpy as np
+
+from dipia.scheduler import InferenceScheduler
+
+
+def noise_frame(seed):
+    return np.random.default_rng(seed).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+
+
+def test_interval_follows_latency():
+    scheduler = InferenceScheduler(target_fps=30, max_busy=0.5, smoothing=1.0)
+    scheduler.record_inference(10)
+    assert scheduler.interval == 1
+    # 100 ms a 30 FPS con la mitad del tiempo para IA → cada 6 frames
+    scheduler.record_inference(100)
+    assert scheduler.interval == 6
+    scheduler.record_inference(5000)
+    assert scheduler.interval == scheduler.max_interval
+
+
+def test_slow_display_backs_off():
+    scheduler = InferenceScheduler(target_fps=30, max_busy=0.5, smoothing=1.0)
+    scheduler.record_inference(100)
+    before = scheduler.interval
+    for _ in range(5):
+        scheduler.observe_display_fps(15)
+    assert scheduler.interval > before
+    for _ in range(50):
+        scheduler.observe_display_fps(30)
+    assert scheduler.interval == before
+
+
+def test_skips_until_interval_and_static_frames():
+    scheduler = InferenceScheduler(max_interval=10, diff_threshold=2.0, smoothing=1.0)
+    scheduler.record_inference(100)  # intervalo de 6 frames
+    frame = noise_frame(0)
+    assert scheduler.should_infer(frame)
+    decisions = [scheduler.should_infer(frame) for _ in range(9)]
+    # Frame idéntico: no se repite hasta el intervalo máximo
+    assert not any(decisions)
+    assert scheduler.skipped_static == 4
+    assert scheduler.should_infer(frame)
+
+    # Un frame distinto se analiza apenas se cumple el intervalo
+    for _ in range(5):
+        assert not scheduler.should_infer(noise_frame(1))
+    assert scheduler.should_infer(noise_frame(2))
+
+
+def test_dropped_frames_count_towards_interval():
+    scheduler = InferenceScheduler(smoothing=1.0, diff_threshold=0)
+    scheduler.record_inference(100)
+    assert scheduler.should_infer(noise_frame(0))
+    assert scheduler.should_infer(noise_frame(1), frames_elapsed=6)
+
+
+def test_camera_limited_source_does_not_starve_inference():
+    # Objetivo 30 FPS, cámara que entrega 25, IA de 40 ms: hay CPU de sobra
+    scheduler = InferenceScheduler(target_fps=30, max_busy=0.5, smoothing=1.0, diff_threshold=0)
+    now = 0.0
+    for i in range(60):
+        now = i / 25
+        if scheduler.should_infer(noise_frame(i % 2), now=now):
+            scheduler.record_inference(40, now=now)
+        scheduler.observe_display_fps(25, now=now)
+
+    assert abs(scheduler.capture_fps(now) - 25) < 0.5
+    assert scheduler.busy == scheduler.max_busy
+    # 40 ms a 25 FPS con la mitad del tiempo para IA → cada 2 frames
+    assert scheduler.interval == 2
+
+    # Si la pantalla sí se queda atrás de lo que entrega la cámara, se cede tiempo
+    for _ in range(5):
+        scheduler.observe_display_fps(15, now=now)
+    assert scheduler.busy < scheduler.max_busy
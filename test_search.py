@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de las recomendaciones de materiales sobre el índice FTS5
+"""
+import sqlite3
+
+from dipia.migrations import migrate
+from dipia.search import expand_terms, match_expression, recommend_materials
+
+
+def make_db(tmp_path):
+    conn = sqlite3.connect(tmp_path / "search.db")
+    migrate(conn)
+    materials = [
+        # name, price, category, pathology_related, is_favorite, usage_count, user_id
+        ("Sellador de fisuras", 80, "Reparación", "Fisura", 0, 0, 1),
+        ("Mortero epóxico", 300, "Reparación", "Grieta, Crack", 1, 25, 1),
+        ("Membrana asfáltica", 700, "Impermeabilización", "Humedad", 0, 0, 1),
+        ("Pintura", 50, "Acabados", "", 0, 0, 1),
+        ("Mortero de otro usuario", 10, "Reparación", "Grieta", 0, 0, 2),
+    ]
+    conn.executemany(
+        "INSERT INTO materials (name, supplier, price, unit, category, pathology_related, "
+        "is_favorite, usage_count, user_id) VALUES (?, 'S', ?, 'KG', ?, ?, ?, ?, ?)",
+        materials
+    )
+    conn.commit()
+    return conn
+
+
+def test_synonyms_come_from_dictionary():
+    terms = expand_terms("Crack")
+    assert {"crack", "grieta", "fisura", "rajadura"} <= set(terms)
+    assert "infiltración de agua" in expand_terms("Humedad")
+
+
+def test_single_ranked_query(tmp_path):
+    conn = make_db(tmp_path)
+    results = recommend_materials(conn, 1, ["Crack", "Humedad"])
+    names = [r["name"] for r in results]
+
+    # Solo materiales del usuario, con sinónimos (Fisura) y sin duplicados
+    assert names == ["Mortero epóxico", "Sellador de fisuras", "Membrana asfáltica"]
+    assert results[0]["score"] == 50 + 60 + 10
+    assert results[0]["match_reason"] == "Crack"
+    assert results[2]["match_reason"] == "Humedad"
+    conn.close()
+
+
+def test_index_follows_updates_and_deletes(tmp_path):
+    conn = make_db(tmp_path)
+    conn.execute("UPDATE materials SET pathology_related = 'Humedad' WHERE name = 'Pintura'")
+    conn.execute("DELETE FROM materials WHERE name = 'Membrana asfáltica'")
+    conn.commit()
+
+    names = [r["name"] for r in recommend_materials(conn, 1, ["humedad"])]
+    assert names == ["Pintura"]
+    conn.close()
+
+
+def test_search_only_reads_the_users_rows(tmp_path):
+    conn = make_db(tmp_path)
+    # El filtro por usuario es parte del MATCH (token indexado), no un filtro posterior
+    assert match_expression(["grieta"], 2) == 'owner : "u2" AND {name category pathology_related} : ("grieta"*)'
+    rows = conn.execute("SELECT rowid FROM materials_fts WHERE materials_fts MATCH ?",
+                        (match_expression(["grieta"], 2),)).fetchall()
+    assert rows == [(5,)]
+    assert [r["name"] for r in recommend_materials(conn, 2, ["Crack"])] == ["Mortero de otro usuario"]
+    assert recommend_materials(conn, 3, ["Crack"]) == []
+    # Un término de búsqueda no coincide con el token del dueño
+    assert recommend_materials(conn, 1, ["u1"]) == []
+
+    conn.execute("UPDATE materials SET user_id = 3 WHERE id = 5")
+    conn.commit()
+    assert recommend_materials(conn, 2, ["Crack"]) == []
+    assert [r["id"] for r in recommend_materials(conn, 3, ["Crack"])] == [5]
+    conn.close()
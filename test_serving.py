@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de las métricas por worker y del servidor pre-fork (serve.py)
+"""
+import json
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from dipia import serving
+from dipia.engine import ModelRegistry
+from serve import free_index
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+
+    @app.route("/ok")
+    def ok():
+        return "ok"
+
+    @app.route("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    return app
+
+
+def test_metrics_count_requests_errors_and_latency(app, tmp_path):
+    metrics = serving.WorkerMetrics(str(tmp_path), index=1, extra=lambda: {"queue": 3}).install(app)
+    client = app.test_client()
+    for _ in range(3):
+        assert client.get("/ok").status_code == 200
+    assert client.get("/boom").status_code == 500
+    assert client.get("/missing").status_code == 404
+
+    snapshot = metrics.snapshot()
+    assert snapshot["requests"] == 5
+    assert snapshot["errors"] == 1
+    assert snapshot["in_flight"] == 0
+    assert snapshot["latency_ms_p50"] is not None
+    assert snapshot["index"] == 1
+    assert snapshot["queue"] == 3
+    assert snapshot["memory"]["rss_mb"] > 0
+
+
+def test_collect_reads_live_workers_and_drops_dead_ones(tmp_path):
+    metrics = serving.WorkerMetrics(str(tmp_path), index=0).start()
+    try:
+        # Archivo de un worker que ya no existe
+        dead = subprocess.Popen([sys.executable, "-c", "pass"])
+        dead.wait()
+        (tmp_path / f"{dead.pid}.json").write_text(json.dumps({"pid": dead.pid, "index": 1}))
+
+        workers = serving.collect(str(tmp_path))
+        assert [w["pid"] for w in workers] == [metrics.pid]
+        assert not (tmp_path / f"{dead.pid}.json").exists()
+    finally:
+        metrics.stop()
+    assert serving.collect(str(tmp_path)) == []
+
+
+def test_workers_report(app, tmp_path):
+    assert serving.workers_report()["server"] == "dev"
+
+    metrics = serving.start_worker_metrics(app, str(tmp_path), index=0, interval=60)
+    try:
+        app.test_client().get("/ok")
+        report = serving.workers_report()
+        assert report["server"] == "prefork"
+        assert report["totals"]["workers"] == 1
+        assert report["totals"]["requests"] == 1
+        assert report["workers"][0]["pid"] == metrics.pid
+    finally:
+        serving.stop_worker_metrics()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_free_index_reuses_the_lowest_slot():
+    workers = [SimpleNamespace(dipia_index=i) for i in (0, 2)]
+    assert free_index(workers) == 1
+    assert free_index(workers + [SimpleNamespace(dipia_index=1)]) == 3
+    assert free_index([]) == 0
+
+
+def test_registry_resolve_does_not_load(tmp_path):
+    path = tmp_path / "modelo.pt"
+    path.write_bytes(b"")
+    loads = []
+    registry = ModelRegistry(loader=loads.append, backend="torch")
+
+    assert registry.resolve("detector", str(path)) == (str(path), "torch")
+    assert registry.resolve("detector", str(tmp_path / "no_existe.pt")) is None
+    assert loads == [] and not registry.is_loaded("detector")
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la difusión de detecciones en vivo
+"""
+import json
+
+import pytest
+
+from dipia.hub import DetectionHub, SQLiteHubBackend
+from dipia.stream import DetectionBroadcaster, HubRelay, TooManySubscribers, sse_events
+
+
+def batch(camera=0, label="Crack", events=()):
+    return {"detections": [{"label": label}], "events": list(events),
+            "timestamp": 1.0, "camera_index": camera}
+
+
+def test_fan_out_and_camera_filter():
+    hub = DetectionBroadcaster()
+    everything = hub.subscribe()
+    camera_one = hub.subscribe(camera=1)
+
+    hub.publish(batch(camera=0))
+    hub.publish(batch(camera=1))
+
+    assert [everything.next_batch(0)["event_id"], everything.next_batch(0)["event_id"]] == [1, 2]
+    assert camera_one.next_batch(0)["event_id"] == 2
+    assert camera_one.next_batch(0) is None
+
+
+def test_slow_subscriber_drops_oldest():
+    hub = DetectionBroadcaster(queue_size=2)
+    slow = hub.subscribe()
+    for _ in range(5):
+        hub.publish(batch())
+    assert slow.dropped == 3
+    assert slow.next_batch(0)["event_id"] == 4
+    assert hub.stats() == {"subscribers": 1, "published": 5, "dropped": 3}
+
+
+def test_throttle_coalesces_keeping_events():
+    hub = DetectionBroadcaster()
+    viewer = hub.subscribe(min_interval=0.01)
+    hub.publish(batch(events=[{"event": "appeared", "track_id": 1}]))
+    hub.publish(batch(label="Humidity", events=[{"event": "appeared", "track_id": 2}]))
+
+    merged = viewer.next_batch(0)
+    assert merged["event_id"] == 2
+    assert merged["detections"] == [{"label": "Humidity"}]
+    assert [e["track_id"] for e in merged["events"]] == [1, 2]
+
+
+def test_subscriber_limit_and_sse_cleanup():
+    hub = DetectionBroadcaster(max_subscribers=1)
+    viewer = hub.subscribe()
+    with pytest.raises(TooManySubscribers):
+        hub.subscribe()
+
+    stream = sse_events(viewer, heartbeat=0)
+    assert next(stream).startswith("retry:")
+    assert next(stream) == ": keep-alive\n\n"
+    hub.publish(batch())
+    message = next(stream)
+    assert message.startswith("id: 1\nevent: detections\n")
+    assert json.loads(message.split("data: ", 1)[1])["dropped"] == 0
+
+    stream.close()
+    assert hub.stats()["subscribers"] == 0
+
+
+def test_hub_relay_reaches_viewers_of_other_workers(tmp_path):
+    # Dos workers: cada uno con su conexión al mismo concentrador y su broadcaster
+    path = str(tmp_path / "hub.db")
+    hub_a, hub_b = DetectionHub(SQLiteHubBackend(path)), DetectionHub(SQLiteHubBackend(path))
+    hub_a.publish(dict(batch(), device_id="pc-1"))  # anterior al arranque: no se reenvía
+
+    viewers_b = DetectionBroadcaster()
+    relay = HubRelay(hub_b, viewers_b)
+    viewer = viewers_b.subscribe()
+
+    hub_a.publish(dict(batch(label="Humidity"), device_id="pc-1"))
+    hub_a.publish(dict(batch(camera=1), device_id="pc-2"))
+    assert relay.poll() == 2
+    received = [viewer.next_batch(0), viewer.next_batch(0)]
+    assert sorted((b["device_id"], b["seq"]) for b in received) == [("pc-1", 2), ("pc-2", 1)]
+
+    # Sin lotes nuevos no se repite nada
+    assert relay.poll() == 0
+    assert viewer.next_batch(0) is None
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del reparto de hilos y núcleos entre workers de inferencia
+"""
+import os
+
+import cv2
+import pytest
+import torch
+
+from dipia import threads
+
+
+def test_core_groups_split_without_overlap():
+    assert threads.core_groups(1, range(8)) == [list(range(8))]
+    assert threads.core_groups(3, range(8)) == [[0, 1, 2], [3, 4, 5], [6, 7]]
+    # Más workers que núcleos: se reparten de a uno, en ronda
+    assert threads.core_groups(3, [4, 5]) == [[4], [5], [4]]
+
+
+def test_threads_per_worker_never_oversubscribes():
+    assert threads.threads_per_worker(1, cores=8) == 8
+    assert threads.threads_per_worker(3, cores=8) == 2
+    assert threads.threads_per_worker(16, cores=8) == 1
+
+
+@pytest.fixture
+def restore():
+    torch_threads, opencv_threads = torch.get_num_threads(), cv2.getNumThreads()
+    affinity = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else None
+    yield
+    torch.set_num_threads(torch_threads)
+    cv2.setNumThreads(opencv_threads)
+    if affinity is not None:
+        threads.pin_to_cores(affinity)
+
+
+def test_configure_applies_thread_counts(restore):
+    applied = threads.configure(workers=1, threads=2, opencv_threads=3)
+    assert torch.get_num_threads() == 2
+    assert cv2.getNumThreads() == 3
+    assert applied["cores"] is None
+    assert threads.settings() == applied
+
+    applied = threads.configure(workers=len(threads.available_cores()) * 4)
+    assert applied["threads"] == torch.get_num_threads() == 1
+
+
+def test_configure_survives_ultralytics_device_selection(restore):
+    from ultralytics.utils import torch_utils
+    original = torch_utils.NUM_THREADS
+    try:
+        threads.configure(workers=1, threads=3)
+        # Lo que hace cada predictor nuevo de ultralytics en CPU
+        torch_utils.select_device("cpu", verbose=False)
+        assert torch.get_num_threads() == 3
+    finally:
+        torch_utils.NUM_THREADS = original
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="afinidad solo en Linux")
+def test_configure_pins_worker_to_its_group(restore):
+    cores = threads.available_cores()
+    workers = min(2, len(cores))
+    index = workers - 1
+    applied = threads.configure(workers=workers, index=index, pin=True)
+
+    group = threads.core_groups(workers)[index]
+    assert applied["cores"] == group
+    assert applied["threads"] == len(group)
+    assert sorted(os.sched_getaffinity(0)) == group
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la inferencia por mosaicos (modelo falso, sin master_model.pt)
+"""
+import numpy as np
+
+from dipia.engine import Detector, TiledDetector, nms, tile_grid
+
+
+class _Boxes:
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+
+class _Result:
+    def __init__(self, data):
+        self.boxes = _Boxes(data)
+
+
+class DarkSpotModel:
+    """Una caja por imagen alrededor de los píxeles oscuros; registra cada entrada"""
+
+    names = {0: "person", 1: "crack"}
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, images, verbose=False, **kwargs):
+        self.calls.append([image.shape[:2] for image in images])
+        results = []
+        for image in images:
+            ys, xs = np.nonzero(image[:, :, 0] < 50)
+            if len(xs) == 0:
+                results.append(_Result(np.zeros((0, 6), dtype=np.float32)))
+                continue
+            box = [xs.min(), ys.min(), xs.max() + 1, ys.max() + 1, 0.9, 1]
+            results.append(_Result(np.array([box], dtype=np.float32)))
+        return results
+
+
+def test_tile_grid_covers_the_image_within_the_budget():
+    assert tile_grid(600, 400) == [(0, 0, 600, 400)]
+
+    for width, height, max_tiles in [(1920, 1080, 16), (4000, 3000, 16), (8000, 6000, 9), (5000, 700, 4)]:
+        tiles = tile_grid(width, height, tile_size=640, overlap=0.2, max_tiles=max_tiles)
+        assert 1 < len(tiles) <= max_tiles
+        covered = np.zeros((height, width), dtype=bool)
+        for x, y, w, h in tiles:
+            assert x >= 0 and y >= 0 and x + w <= width and y + h <= height
+            covered[y:y + h, x:x + w] = True
+        assert covered.all()
+
+    assert tile_grid(4000, 3000, max_tiles=1) == [(0, 0, 4000, 3000)]
+
+
+def test_nms_is_per_class():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [0, 0, 10, 10], [50, 50, 60, 60]], dtype=np.float32)
+    scores = np.array([0.8, 0.9, 0.7, 0.5], dtype=np.float32)
+    class_ids = np.array([1, 1, 0, 1], dtype=np.int32)
+    assert nms(boxes, scores, class_ids, iou_threshold=0.5).tolist() == [1, 2, 3]
+    assert len(nms(boxes[:0], scores[:0], class_ids[:0])) == 0
+
+
+def test_tiled_detector_maps_boxes_and_removes_duplicates():
+    image = np.full((1080, 1920, 3), 255, dtype=np.uint8)
+    # Mancha dentro de la zona superpuesta de dos ventanas vecinas
+    image[300:310, 600:620] = 0
+
+    model = DarkSpotModel()
+    tiled = TiledDetector(Detector(model), tile_size=640, overlap=0.2, max_tiles=16, batch_size=4)
+    tiles = tiled.tiles(image)
+    assert tiles[-1] == (0, 0, 1920, 1080)
+
+    detections = tiled.predict(image)
+    assert detections.boxes.tolist() == [[600, 300, 620, 310]]
+    assert detections.labels == ["Crack"]
+
+    # Todas las ventanas (más la imagen completa) en lotes de batch_size
+    shapes = [shape for call in model.calls for shape in call]
+    assert len(shapes) == len(tiles)
+    assert max(len(call) for call in model.calls) == 4
+
+
+def test_tiled_detector_batches_several_images():
+    small = np.full((200, 300, 3), 255, dtype=np.uint8)
+    small[10:20, 10:20] = 0
+    large = np.full((1500, 2000, 3), 255, dtype=np.uint8)
+    large[1400:1410, 1900:1950] = 0
+
+    model = DarkSpotModel()
+    tiled = TiledDetector(Detector(model), tile_size=640, include_full=False)
+    small_result, large_result = tiled.predict_batch([small, large])
+
+    assert small_result.boxes.tolist() == [[10, 10, 20, 20]]
+    assert large_result.boxes.tolist() == [[1900, 1400, 1950, 1410]]
+    assert sum(len(call) for call in model.calls) == 1 + len(tiled.tiles(large))
+    assert tiled.params()["decode"] == tiled.decode_size == 640 * 4
+
+
+def test_tiles_of_one_photo_go_in_a_single_batch():
+    model = DarkSpotModel()
+    tiled = TiledDetector(Detector(model), tile_size=640, max_tiles=16, include_full=True)
+    image = np.full((2560, 2560, 3), 255, dtype=np.uint8)
+    assert len(tiled.tiles(image)) == 17
+
+    tiled.predict(image)
+    assert [len(call) for call in model.calls] == [17]
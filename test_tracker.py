@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas del seguimiento de objetos entre inferencias
+"""
+from dipia.tracker import Tracker, iou_matrix
+
+
+def det(x, y, size=40, label="Crack", class_id=1, confidence=0.8):
+    return {"label": label, "class_id": class_id, "confidence": confidence,
+            "bbox": [x, y, x + size, y + size]}
+
+
+def test_iou_matrix():
+    iou = iou_matrix([[0, 0, 10, 10]], [[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]])
+    assert iou.shape == (1, 3)
+    assert iou[0, 0] == 1.0
+    assert abs(iou[0, 1] - 1 / 3) < 1e-6
+    assert iou[0, 2] == 0.0
+
+
+def test_stable_ids_and_extrapolation():
+    tracker = Tracker()
+    # Objeto moviéndose 5 px por frame, con IA cada 5 frames (IoU < 0.3: asocia por centro)
+    for frame in range(0, 30, 5):
+        tracker.update([det(100 + 5 * frame, 100), det(400, 300, label="Humidity", class_id=2)], frame)
+    ids = {t["label"]: t["track_id"] for t in tracker.tracks_at(25)}
+    assert len(ids) == 2
+
+    # Entre inferencias la caja sigue al objeto
+    moving = next(t for t in tracker.tracks_at(28) if t["label"] == "Crack")
+    assert moving["track_id"] == ids["Crack"]
+    assert abs(moving["bbox"][0] - (100 + 5 * 28)) <= 5
+
+
+def test_events_once_per_track():
+    tracker = Tracker(max_age=2)
+    for frame in range(5):
+        tracker.update([det(100, 100)], frame)
+    events = tracker.pop_events()
+    assert [e["event"] for e in events] == ["appeared"]
+
+    for frame in range(5, 9):
+        tracker.update([], frame)
+    events = tracker.pop_events()
+    assert [e["event"] for e in events] == ["ended"]
+    assert events[0]["track_id"] == 1
+    assert events[0]["frames"] == 5
+    assert tracker.tracks_at(9) == []
+
+
+def test_classes_are_not_mixed():
+    tracker = Tracker()
+    tracker.update([det(100, 100)], 0)
+    tracker.update([det(100, 100, label="Humidity", class_id=2)], 1)
+    assert sorted(t["track_id"] for t in tracker.tracks_at(1)) == [1, 2]